@@ -1,6 +1,34 @@
 import argparse
-from nes_core.cpu import CPU
-from nes_core.bus import Bus
+import logging
+import time
+import numpy as np
+from nes_core.audio import SampleBuffer, WaveSink
+from nes_core.cartridge import Cartridge
+from nes_core.console import Console
+from nes_core.ppu import NES_PALETTE
+from nes_core.savestate import save_state
+from nes_core.trace import LoggingTraceSink
+
+
+def write_ppm(path, framebuffer):
+    """Writes a framebuffer (NES colour indices) as a binary PPM image"""
+    rgb = NES_PALETTE[framebuffer].astype(np.uint8)
+    with open(path, 'wb') as image:
+        image.write(b'P6 %d %d 255\n' % (rgb.shape[1], rgb.shape[0]))
+        image.write(rgb.tobytes())
+
+
+def run_frames(console, frames, render_every=1, on_render=None):
+    """Runs `frames` frames, drawing every `render_every`th one (0 draws none) and calling on_render(console) after
+    each drawn frame. Frames in between only keep the PPU timing (VBlank, sprite 0 hit) exact, their framebuffer is
+    left as it was"""
+    ppu = console.ppu
+    for frame in range(frames):
+        ppu.draw = render_every > 0 and frame % render_every == render_every - 1
+        console.run_frame()
+        if ppu.draw and on_render is not None:
+            on_render(console)
+    ppu.draw = True
 
 
 def main():
@@ -10,20 +38,68 @@ def main():
                         metavar='R',
                         type=str,
                         help='path to nes rom')
+    parser.add_argument('--trace',
+                        action='store_true',
+                        help='log every executed instruction (slow)')
+    parser.add_argument('--frames',
+                        type=int,
+                        default=60,
+                        help='number of frames to run')
+    parser.add_argument('--fast-forward',
+                        action='store_true',
+                        help='skip drawing and audio, only the final state matters')
+    parser.add_argument('--render-every',
+                        type=int,
+                        metavar='N',
+                        help='draw every Nth frame (default every frame, none when fast-forwarding)')
+    parser.add_argument('--preview',
+                        help='PPM file showing the last drawn frame, rewritten after each one')
+    parser.add_argument('--wav',
+                        help='record the audio to this WAV file (not when fast-forwarding)')
+    parser.add_argument('--save-state',
+                        help='write a save state of the final state to this file (without the framebuffer when '
+                             'fast-forwarding)')
     args = parser.parse_args()
 
+    if args.trace:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
     # TODO: validate rom path is correct
     print(args.rom_path)
 
     # load rom
-    with open(args.rom_path, 'rb') as rom_file:
-        lines = rom_file.readlines()
+    cartridge = Cartridge.from_file(args.rom_path)
+
+    console = Console()
+    console.insert_cartridge(cartridge)
+    if args.trace:
+        console.cpu.set_trace_sink(LoggingTraceSink())
+
+    render_every = args.render_every
+    if render_every is None:
+        render_every = 0 if args.fast_forward else 1
+    sink = None
+    if args.wav and not args.fast_forward:
+        sink = WaveSink(args.wav)
+        console.apu.output = SampleBuffer(sink=sink)  # otherwise None, the APU skips synthesis
+    def write_preview(console):
+        write_ppm(args.preview, console.ppu.framebuffer)
 
-    bus = Bus()
-    cpu = CPU()
-    cpu.connect_bus(bus)
+    start = time.perf_counter()
+    try:
+        run_frames(console, args.frames, render_every, write_preview if args.preview else None)
+    finally:
+        if sink is not None:
+            console.apu.output.flush()
+            sink.close()
+    elapsed = time.perf_counter() - start
+    print(f'{args.frames} frames, {console.cpu.total_cycles:,} cycles, {elapsed:.3f}s, '
+          f'{args.frames / elapsed if elapsed else 0:.1f} fps')
 
-    cpu.process_instruction(lines[0][0:3])
+    if args.save_state:
+        # fast-forwarded frames leave the framebuffer stale, the state leaves it out and the next frame redraws it
+        with open(args.save_state, 'wb') as state:
+            state.write(save_state(console, framebuffer=not args.fast_forward))
 
 
 if __name__ == '__main__':
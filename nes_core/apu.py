@@ -0,0 +1,657 @@
+"""2A03 audio processing unit: two pulse channels, a triangle, noise and the DMC, at $4000-$4017.
+
+Like the PPU the APU runs behind the CPU and is only brought up to date when it has to be, but it never runs a cycle
+at a time: register writes are stamped with the CPU cycle they happen on and queued, and run_until() renders the
+stretch between two events (a queued write or a frame sequencer step) as one NumPy block per channel, one level per
+CPU cycle. Mixing and downsampling to the output's sample rate happen a block at a time too, normally a frame's
+worth from Console.run_frame().
+
+Whatever the CPU can observe stays exact: reading $4015 syncs the APU first, writes that move an IRQ ($4010, $4015,
+$4017) are applied at once, and `irq_deadline` tells the scheduler the earliest cycle the frame counter or the DMC
+could pull the IRQ line, whatever the CPU writes meanwhile, so both IRQs arrive on the cycle they would in lockstep.
+DMC sample fetches don't steal CPU cycles."""
+from collections import deque
+import numpy as np
+from .cpu import IRQ_APU_FRAME, IRQ_DMC
+
+CPU_CLOCK_RATE = 1789773  # NTSC, Hz
+MAX_BLOCK_CYCLES = 32768  # Longest stretch rendered in one go, a little over a frame
+MAX_EVENTS = 4096  # Queued writes that force a sync, for callers that never end a frame
+
+DMC_CONTROL = 0x4010
+STATUS = 0x4015
+FRAME_COUNTER = 0x4017
+EAGER_REGISTERS = (DMC_CONTROL, STATUS, FRAME_COUNTER)  # Writes that can move an IRQ, applied without queueing
+
+# Frame sequencer steps, (CPU cycles since the sequence started, what the step clocks) for the 4 and 5 step modes.
+# Each sequence starts over on the cycle after its last step.
+QUARTER_FRAME = 1 << 0  # Envelopes and the triangle's linear counter
+HALF_FRAME = 1 << 1  # Length counters and sweeps
+FRAME_IRQ = 1 << 2
+FRAME_SEQUENCES = {
+    False: ((7457, QUARTER_FRAME), (14913, QUARTER_FRAME | HALF_FRAME), (22371, QUARTER_FRAME),
+            (29829, QUARTER_FRAME | HALF_FRAME | FRAME_IRQ)),
+    True: ((7457, QUARTER_FRAME), (14913, QUARTER_FRAME | HALF_FRAME), (22371, QUARTER_FRAME),
+           (37281, QUARTER_FRAME | HALF_FRAME)),
+}
+
+LENGTH_TABLE = (10, 254, 20, 2, 40, 4, 80, 6, 160, 8, 60, 10, 14, 12, 26, 14,
+                12, 16, 24, 18, 48, 20, 96, 22, 192, 24, 72, 26, 16, 28, 32, 30)
+DUTY_CYCLES = np.array([(0, 1, 0, 0, 0, 0, 0, 0), (0, 1, 1, 0, 0, 0, 0, 0),
+                        (0, 1, 1, 1, 1, 0, 0, 0), (1, 0, 0, 1, 1, 1, 1, 1)], dtype=np.uint8)
+TRIANGLE_SEQUENCE = np.array(list(range(15, -1, -1)) + list(range(16)), dtype=np.uint8)
+NOISE_PERIODS = (4, 8, 16, 32, 64, 96, 128, 160, 202, 254, 380, 508, 762, 1016, 2034, 4068)  # CPU cycles
+DMC_RATES = (428, 380, 340, 320, 286, 254, 226, 214, 190, 160, 142, 128, 106, 84, 72, 54)  # CPU cycles
+# Fewest cycles from a $4015 write starting a sample until its IRQ, for samples longer than the one byte that ends
+# (and raises the IRQ) on the write itself: 17 bytes at the fastest rate. A $4017 write is further from its IRQ
+DMC_START_NOTICE = 8 * 15 * DMC_RATES[-1]
+
+# Non-linear mixer, indexed by pulse1 + pulse2 and by 3 * triangle + 2 * noise + dmc
+PULSE_MIX = np.array([0.0] + [95.52 / (8128.0 / n + 100.0) for n in range(1, 31)], dtype=np.float32)
+TND_MIX = np.array([0.0] + [163.67 / (24329.0 / n + 100.0) for n in range(1, 203)], dtype=np.float32)
+
+_CYCLES = np.arange(MAX_BLOCK_CYCLES, dtype=np.int64)
+
+
+def _clock_counts(n: int, delay: int, period: int):
+    """Clocks a timer has given by each of the next `n` cycles, when it next clocks `delay` cycles from now and
+    every `period` cycles after that"""
+    return np.maximum(_CYCLES[:n] - delay + period, 0) // period
+
+
+def _clock_total(n: int, delay: int, period: int):
+    """Clocks a timer gives over the next `n` cycles, see _clock_counts()"""
+    return max(n - 1 - delay + period, 0) // period
+
+
+# The noise shift register never leaves the cycle of states it is on, so it is rendered by indexing into that cycle
+_noise_cycles = {}  # (mode, state) -> (states of the cycle in order, position of state), filled in as visited
+
+
+def _noise_cycle(mode: int, state: int):
+    found = _noise_cycles.get((mode, state))
+    if found is None:
+        tap = 6 if mode else 1
+        states = []
+        current = state
+        while True:
+            states.append(current)
+            current = (current >> 1) | (((current ^ (current >> tap)) & 1) << 14)
+            if current == state:
+                break
+        sequence = np.array(states, dtype=np.uint16)
+        for position, visited in enumerate(states):
+            _noise_cycles[(mode, visited)] = (sequence, position)
+        found = _noise_cycles[(mode, state)]
+    return found
+
+
+class Channel:
+    """Base class for the tone channels: a length counter, and the state helpers"""
+    state_fields = ('enabled', 'halt', 'length')
+
+    def reset(self):
+        self.enabled = False
+        self.halt = False  # Length counter halt, doubles as the envelope loop or the linear counter control flag
+        self.length = 0
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+        if not enabled:
+            self.length = 0
+
+    def load_length(self, index: int):
+        if self.enabled:
+            self.length = LENGTH_TABLE[index]
+
+    def quarter_frame(self):
+        pass
+
+    def half_frame(self):
+        if self.length and not self.halt:
+            self.length -= 1
+
+    # Save states
+    def get_state(self):
+        return [int(getattr(self, name)) for name in self.state_fields]
+
+    def set_state(self, state):
+        for name, value in zip(self.state_fields, state):
+            setattr(self, name, value)
+
+
+class EnvelopeChannel(Channel):
+    """Channel with a volume envelope, or a constant volume"""
+    state_fields = Channel.state_fields + ('constant', 'volume', 'envelope_start', 'envelope_divider', 'decay')
+
+    def reset(self):
+        super().reset()
+        self.constant = False
+        self.volume = 0  # Constant volume, or the envelope's divider period
+        self.envelope_start = False
+        self.envelope_divider = 0
+        self.decay = 0
+
+    def write_envelope(self, data: int):
+        self.halt = bool(data & 0x20)
+        self.constant = bool(data & 0x10)
+        self.volume = data & 0x0F
+
+    def quarter_frame(self):
+        if self.envelope_start:
+            self.envelope_start = False
+            self.decay = 15
+            self.envelope_divider = self.volume
+        elif self.envelope_divider:
+            self.envelope_divider -= 1
+        else:
+            self.envelope_divider = self.volume
+            if self.decay:
+                self.decay -= 1
+            elif self.halt:
+                self.decay = 15
+
+    def envelope_level(self):
+        return self.volume if self.constant else self.decay
+
+
+class Pulse(EnvelopeChannel):
+    state_fields = EnvelopeChannel.state_fields + (
+        'duty', 'timer', 'step', 'delay',
+        'sweep_enabled', 'sweep_period', 'sweep_negate', 'sweep_shift', 'sweep_reload', 'sweep_divider')
+
+    def __init__(self, ones_complement: int):
+        self.ones_complement = ones_complement  # Pulse 1 negates its sweep with one's complement, pulse 2 with two's
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.duty = 0
+        self.timer = 0  # 11 bit period, in APU cycles (2 CPU cycles) less one
+        self.step = 0  # Position in the duty cycle
+        self.delay = 0  # CPU cycles until the timer next clocks the duty cycle
+        self.sweep_enabled = False
+        self.sweep_period = 0
+        self.sweep_negate = False
+        self.sweep_shift = 0
+        self.sweep_reload = False
+        self.sweep_divider = 0
+
+    def write(self, register: int, data: int):
+        if register == 0:
+            self.duty = data >> 6
+            self.write_envelope(data)
+        elif register == 1:
+            self.sweep_enabled = bool(data & 0x80)
+            self.sweep_period = (data >> 4) & 0x07
+            self.sweep_negate = bool(data & 0x08)
+            self.sweep_shift = data & 0x07
+            self.sweep_reload = True
+        elif register == 2:
+            self.timer = (self.timer & 0x700) | data
+        else:
+            self.timer = (self.timer & 0xFF) | ((data & 0x07) << 8)
+            self.load_length(data >> 3)
+            self.envelope_start = True
+            self.step = 0
+
+    def sweep_target(self):
+        change = self.timer >> self.sweep_shift
+        if self.sweep_negate:
+            return self.timer - change - self.ones_complement
+        return self.timer + change
+
+    def muted(self):
+        return self.timer < 8 or self.sweep_target() > 0x7FF
+
+    def half_frame(self):
+        super().half_frame()
+        if not self.sweep_divider and self.sweep_enabled and self.sweep_shift and not self.muted():
+            self.timer = max(self.sweep_target(), 0)
+        if not self.sweep_divider or self.sweep_reload:
+            self.sweep_divider = self.sweep_period
+            self.sweep_reload = False
+        else:
+            self.sweep_divider -= 1
+
+    def render(self, out):
+        n = len(out)
+        period = 2 * (self.timer + 1)
+        level = 0 if not self.length or self.muted() else self.envelope_level()
+        if level:
+            out[:] = DUTY_CYCLES[self.duty][(self.step + _clock_counts(n, self.delay, period)) & 7] * level
+        else:
+            out[:] = 0
+        total = _clock_total(n, self.delay, period)
+        self.step = (self.step + total) & 7
+        self.delay += total * period - n
+
+
+class Triangle(Channel):
+    state_fields = Channel.state_fields + ('timer', 'step', 'delay', 'linear', 'linear_period', 'linear_reload')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.timer = 0  # 11 bit period, in CPU cycles less one
+        self.step = 0
+        self.delay = 0
+        self.linear = 0
+        self.linear_period = 0
+        self.linear_reload = False
+
+    def write(self, register: int, data: int):
+        if register == 0:
+            self.halt = bool(data & 0x80)
+            self.linear_period = data & 0x7F
+        elif register == 2:
+            self.timer = (self.timer & 0x700) | data
+        elif register == 3:
+            self.timer = (self.timer & 0xFF) | ((data & 0x07) << 8)
+            self.load_length(data >> 3)
+            self.linear_reload = True
+
+    def quarter_frame(self):
+        if self.linear_reload:
+            self.linear = self.linear_period
+        elif self.linear:
+            self.linear -= 1
+        if not self.halt:
+            self.linear_reload = False
+
+    def render(self, out):
+        n = len(out)
+        period = self.timer + 1
+        total = _clock_total(n, self.delay, period)
+        if self.length and self.linear and self.timer >= 2:  # ultrasonic periods are held instead of played
+            out[:] = TRIANGLE_SEQUENCE[(self.step + _clock_counts(n, self.delay, period)) & 31]
+            self.step = (self.step + total) & 31
+        else:
+            out[:] = TRIANGLE_SEQUENCE[self.step]
+        self.delay += total * period - n
+
+
+class Noise(EnvelopeChannel):
+    state_fields = EnvelopeChannel.state_fields + ('mode', 'period', 'shift', 'delay')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.mode = 0
+        self.period = 0  # Index into NOISE_PERIODS
+        self.shift = 1  # 15 bit linear feedback shift register
+        self.delay = 0
+
+    def write(self, register: int, data: int):
+        if register == 0:
+            self.write_envelope(data)
+        elif register == 2:
+            self.mode = data >> 7
+            self.period = data & 0x0F
+        elif register == 3:
+            self.load_length(data >> 3)
+            self.envelope_start = True
+
+    def render(self, out):
+        n = len(out)
+        period = NOISE_PERIODS[self.period]
+        total = _clock_total(n, self.delay, period)
+        sequence, position = _noise_cycle(self.mode, self.shift)
+        level = self.envelope_level() if self.length else 0
+        if level:
+            states = sequence[(position + _clock_counts(n, self.delay, period)) % len(sequence)]
+            out[:] = np.where(states & 1, 0, level)
+        else:
+            out[:] = 0
+        self.shift = int(sequence[(position + total) % len(sequence)])
+        self.delay += total * period - n
+
+
+class DMC(Channel):
+    """Delta modulation channel, playing 1-bit deltas read from CPU memory.
+    Its output unit is bit serial, so the bits of a block are stepped through in Python (at most one per 54 cycles)
+    and only spread out over the block's cycles with NumPy"""
+    state_fields = ('irq_enabled', 'loop', 'rate', 'level', 'sample_address', 'sample_length', 'address',
+                    'bytes_remaining', 'buffer', 'shift', 'bits_remaining', 'silence', 'delay', 'irq')
+
+    def __init__(self):
+        self.read_memory = None  # Called as read_memory(address) for sample bytes
+        self.reset()
+
+    def reset(self):
+        self.irq_enabled = False
+        self.loop = False
+        self.rate = 0  # Index into DMC_RATES
+        self.level = 0  # 7 bit output level
+        self.sample_address = 0xC000
+        self.sample_length = 1
+        self.address = 0xC000  # Next sample byte to fetch
+        self.bytes_remaining = 0
+        self.buffer = -1  # Sample byte fetched ahead, -1 while empty. Empty only once the sample is done
+        self.shift = 0
+        self.bits_remaining = 8
+        self.silence = True
+        self.delay = 0
+        self.irq = False
+
+    def write(self, register: int, data: int):
+        if register == 0:
+            self.irq_enabled = bool(data & 0x80)
+            self.loop = bool(data & 0x40)
+            self.rate = data & 0x0F
+            if not self.irq_enabled:
+                self.irq = False
+        elif register == 1:
+            self.level = data & 0x7F
+        elif register == 2:
+            self.sample_address = 0xC000 | (data << 6)
+        else:
+            self.sample_length = (data << 4) | 1
+
+    def set_enabled(self, enabled: bool):
+        if not enabled:
+            self.bytes_remaining = 0
+        elif not self.bytes_remaining:
+            self.restart()
+            self.fetch()
+
+    def restart(self):
+        self.address = self.sample_address
+        self.bytes_remaining = self.sample_length
+
+    def fetch(self):
+        if self.buffer < 0 and self.bytes_remaining:
+            self.buffer = self.read_memory(self.address)
+            self.address = ((self.address + 1) & 0xFFFF) or 0x8000
+            self.bytes_remaining -= 1
+            if not self.bytes_remaining:
+                if self.loop:
+                    self.restart()
+                elif self.irq_enabled:
+                    self.irq = True
+
+    def half_frame(self):
+        pass
+
+    def clock(self):
+        if not self.silence:
+            if self.shift & 1:
+                if self.level <= 125:
+                    self.level += 2
+            elif self.level >= 2:
+                self.level -= 2
+            self.shift >>= 1
+        self.bits_remaining -= 1
+        if not self.bits_remaining:
+            self.bits_remaining = 8
+            if self.buffer < 0:
+                self.silence = True
+            else:
+                self.silence = False
+                self.shift = self.buffer
+                self.buffer = -1
+                self.fetch()
+
+    def run(self, n: int, out=None):
+        """Runs `n` cycles, writing the output level of each into `out` if given"""
+        period = DMC_RATES[self.rate]
+        total = _clock_total(n, self.delay, period)
+        if total and (self.buffer >= 0 or not self.silence):
+            levels = [self.level]
+            for _ in range(total):
+                self.clock()
+                levels.append(self.level)
+            if out is not None:
+                out[:] = np.array(levels, dtype=np.uint8)[_clock_counts(n, self.delay, period)]
+        else:  # idle: only the bit counter moves
+            self.bits_remaining = (self.bits_remaining - total - 1) % 8 + 1
+            if out is not None:
+                out[:] = self.level
+        self.delay += total * period - n
+
+    def irq_delay(self):
+        """Fewest cycles until the clock that fetches the sample's last byte and may raise the IRQ, whatever $4010
+        is set to meanwhile. None while no sample plays"""
+        if self.irq or not self.bytes_remaining:
+            return None
+        clocks = self.bits_remaining + 8 * (self.bytes_remaining - 1)
+        return self.delay + (clocks - 1) * DMC_RATES[-1]
+
+
+class APU:
+    def __init__(self):
+        self.pulse1 = Pulse(ones_complement=1)
+        self.pulse2 = Pulse(ones_complement=0)
+        self.triangle = Triangle()
+        self.noise = Noise()
+        self.dmc = DMC()
+        self.dmc.read_memory = self.read_memory
+        self.channels = (self.pulse1, self.pulse2, self.triangle, self.noise, self.dmc)  # $4000, $4004, ... $4010
+        self.bus = None
+        self.cpu = None
+        self.output = None  # SampleBuffer (see nes_core.audio) receiving the audio, None skips synthesis
+        self.events = deque()  # (CPU cycle, address, data) of the register writes still to apply
+        self.block = np.zeros((len(self.channels), MAX_BLOCK_CYCLES), dtype=np.uint8)  # Channel level per cycle
+        self.cycle = 0  # CPU cycle the APU has run up to
+        self.reset()
+
+    def attach(self, bus):
+        """Maps the APU registers into the CPU address space of `bus`, DMC samples are read from it too"""
+        self.bus = bus
+        bus.map_io(0x4000, 0x4013, self.cpu_read, self.cpu_write)
+        bus.map_io(STATUS, STATUS, self.cpu_read, self.cpu_write)
+        bus.map_io(FRAME_COUNTER, FRAME_COUNTER, write_handler=self.cpu_write)  # reads are the second controller
+
+    def connect_cpu(self, cpu):
+        """`cpu` timestamps register writes and takes the APU's IRQs"""
+        self.cpu = cpu
+        self.reset()
+
+    def reset(self):
+        for channel in self.channels:
+            channel.reset()
+        self.events.clear()
+        self.cycle = self.now()
+        self.sequence_start = self.cycle  # CPU cycle the current frame sequence started on
+        self.step_index = 0  # Next step of the frame sequence
+        self.five_step = False
+        self.irq_inhibit = False
+        self.frame_irq = False
+        self.set_irq(False, IRQ_APU_FRAME | IRQ_DMC)
+        self._sample_sum = 0.0  # Mixer output towards the next sample, carried over between blocks
+        self._sample_count = 0
+        self.update_deadline()
+
+    def now(self):
+        return self.cpu.total_cycles if self.cpu is not None else self.cycle
+
+    def set_irq(self, level: bool, source: int):
+        if self.cpu is not None:
+            self.cpu.irq(level, source)
+
+    def read_memory(self, address: int):
+        """DMC sample fetch, straight from the page table so it never goes back through a scheduler"""
+        page = self.bus.read_pages[address >> 8] if self.bus is not None else None
+        return page[address & 0xFF] if page is not None else 0
+
+    # CPU side
+    def cpu_read(self, address: int):
+        if address != STATUS:
+            return 0
+        self.sync()
+        status = (bool(self.pulse1.length) | bool(self.pulse2.length) << 1 | bool(self.triangle.length) << 2
+                  | bool(self.noise.length) << 3 | bool(self.dmc.bytes_remaining) << 4
+                  | self.frame_irq << 6 | self.dmc.irq << 7)
+        if self.frame_irq:  # reading acknowledges the frame IRQ
+            self.frame_irq = False
+            self.set_irq(False, IRQ_APU_FRAME)
+            self.update_deadline()
+        return status
+
+    def cpu_write(self, address: int, data: int):
+        cycle = self.now()
+        if address in EAGER_REGISTERS:
+            self.sync()
+            self.apply(address, data)
+            self.update_deadline()
+        else:
+            self.events.append((cycle, address, data))
+            if len(self.events) >= MAX_EVENTS:
+                self.run_until(cycle)
+
+    def apply(self, address: int, data: int):
+        """Applies a register write at the current cycle"""
+        if address < 0x4014:
+            self.channels[(address - 0x4000) >> 2].write(address & 0x03, data)
+        elif address == STATUS:
+            self.dmc.irq = False
+            self.set_irq(False, IRQ_DMC)
+            for bit, channel in enumerate(self.channels):
+                channel.set_enabled(bool(data >> bit & 1))
+        elif address == FRAME_COUNTER:
+            self.five_step = bool(data & 0x80)
+            self.irq_inhibit = bool(data & 0x40)
+            if self.irq_inhibit:
+                self.frame_irq = False
+                self.set_irq(False, IRQ_APU_FRAME)
+            self.sequence_start = self.cycle
+            self.step_index = 0
+            if self.five_step:
+                self.clock_frame(QUARTER_FRAME | HALF_FRAME)
+        if address == DMC_CONTROL:
+            self.set_irq(self.dmc.irq, IRQ_DMC)
+        elif self.dmc.irq:  # a one byte sample started by $4015 ends at once
+            self.set_irq(True, IRQ_DMC)
+
+    def clock_frame(self, clocks: int):
+        if clocks & QUARTER_FRAME:
+            for channel in self.channels:
+                channel.quarter_frame()
+        if clocks & HALF_FRAME:
+            for channel in self.channels:
+                channel.half_frame()
+        if clocks & FRAME_IRQ and not self.irq_inhibit:
+            self.frame_irq = True
+            self.set_irq(True, IRQ_APU_FRAME)
+
+    def update_deadline(self):
+        """Works out `irq_deadline`: the first CPU cycle by which the APU must have been run for an IRQ it raises to
+        reach the CPU on time. It can only be early, never late, whatever the CPU writes before it"""
+        deadline = self.cycle + DMC_START_NOTICE
+        if not self.five_step and not self.irq_inhibit and not self.frame_irq:
+            deadline = min(deadline, self.sequence_start + FRAME_SEQUENCES[False][-1][0] + 1)
+        delay = self.dmc.irq_delay()
+        if delay is not None:
+            deadline = min(deadline, self.cycle + delay + 1)
+        self.irq_deadline = deadline
+
+    # Synthesis
+    def run_until(self, cycle: int):
+        """Brings the APU up to CPU cycle `cycle`, applying the writes queued before it and rendering the audio"""
+        while self.cycle < cycle:
+            self.run_block(min(cycle, self.cycle + MAX_BLOCK_CYCLES))
+        self.update_deadline()
+
+    def sync(self):
+        """Catches up with the CPU, writes made on its current cycle included"""
+        self.run_until(self.now())
+        events = self.events
+        while events:  # whatever is left was written on this very cycle
+            _, address, data = events.popleft()
+            self.apply(address, data)
+        self.update_deadline()
+
+    def end_frame(self):
+        """Renders everything up to the CPU's current cycle, handing the samples to the output"""
+        self.sync()
+
+    def run_block(self, stop: int):
+        start = self.cycle
+        block = self.block if self.output is not None else None
+        events = self.events
+        while True:
+            steps = FRAME_SEQUENCES[self.five_step]
+            offset, clocks = steps[self.step_index]
+            step_cycle = self.sequence_start + offset
+            is_event = bool(events) and events[0][0] <= step_cycle
+            next_cycle = max(events[0][0], self.cycle) if is_event else step_cycle
+            if next_cycle >= stop:
+                self.render(start, stop, block)
+                break
+            self.render(start, next_cycle, block)
+            if is_event:
+                _, address, data = events.popleft()
+                self.apply(address, data)
+            else:
+                self.clock_frame(clocks)
+                self.step_index += 1
+                if self.step_index == len(steps):
+                    self.step_index = 0
+                    self.sequence_start = step_cycle + 1
+        if block is not None:
+            self.mix(block[:, :stop - start], start)
+
+    def render(self, start: int, stop: int, block):
+        """Renders the cycles from the current one up to `stop` into `block`, which starts at cycle `start`"""
+        first, last = self.cycle - start, stop - start
+        if last <= first:
+            return
+        if block is None:  # nothing to listen to, but the DMC is visible to the CPU
+            self.dmc.run(last - first)
+        else:
+            self.pulse1.render(block[0, first:last])
+            self.pulse2.render(block[1, first:last])
+            self.triangle.render(block[2, first:last])
+            self.noise.render(block[3, first:last])
+            self.dmc.run(last - first, block[4, first:last])
+        if self.dmc.irq:
+            self.set_irq(True, IRQ_DMC)
+        self.cycle = stop
+
+    def mix(self, block, start: int):
+        """Mixes a block of channel levels starting at cycle `start` and downsamples it into the output, averaging
+        the cycles of each sample"""
+        mixed = PULSE_MIX[block[0] + block[1]] + TND_MIX[3 * block[2].astype(np.intp) + 2 * block[3] + block[4]]
+        sums = np.cumsum(mixed, dtype=np.float64)
+        rate = self.output.sample_rate
+        stop = start + len(mixed)
+        first = -(-(start + 1) * rate // CPU_CLOCK_RATE)  # samples ending within the block
+        last = ((stop + 1) * rate - 1) // CPU_CLOCK_RATE
+        if last < first:
+            self._sample_sum += sums[-1]
+            self._sample_count += len(mixed)
+            return
+        edges = np.arange(first, last + 1, dtype=np.int64) * CPU_CLOCK_RATE // rate - start
+        totals = np.diff(sums[edges - 1], prepend=0.0)
+        counts = np.diff(edges, prepend=0)
+        totals[0] += self._sample_sum
+        counts[0] += self._sample_count
+        self.output.write(totals / counts)
+        tail = int(edges[-1])
+        self._sample_sum = sums[-1] - sums[tail - 1]
+        self._sample_count = len(mixed) - tail
+
+    # Save states
+    def get_state(self):
+        """Frame counter and channel state as a list of ints. Only complete after a sync(), which leaves no writes
+        queued"""
+        state = [self.cycle, self.sequence_start, self.step_index, self.five_step, self.irq_inhibit, self.frame_irq]
+        for channel in self.channels:
+            state.extend(channel.get_state())
+        return [int(value) for value in state]
+
+    def set_state(self, state):
+        (self.cycle, self.sequence_start, self.step_index, self.five_step, self.irq_inhibit,
+         self.frame_irq) = state[:6]
+        position = 6
+        for channel in self.channels:
+            channel.set_state(state[position:position + len(channel.state_fields)])
+            position += len(channel.state_fields)
+        self.events.clear()
+        self._sample_sum = 0.0
+        self._sample_count = 0
+        self.update_deadline()
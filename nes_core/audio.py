@@ -0,0 +1,88 @@
+"""Audio output: a bounded sample buffer between the APU and whatever plays or stores its samples."""
+import wave
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CAPACITY = 16384  # Samples, about a third of a second at 44.1 kHz
+DEFAULT_BLOCK_SIZE = 1024
+
+
+class SampleBuffer:
+    """Bounded FIFO of float32 samples in [0, 1], the APU's mixer output downsampled to `sample_rate`.
+    With a `sink` (any callable taking a NumPy array) the samples are pushed to it in blocks of `block_size` as they
+    come in; a WaveSink streams them to a file. Without one a consumer pulls them with read(), e.g. from an audio
+    device callback, and once `capacity` samples are waiting the oldest are dropped, so a consumer that falls behind
+    never holds up the emulator or grows the buffer."""
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, capacity: int = DEFAULT_CAPACITY, sink=None,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        if block_size > capacity:
+            raise ValueError("block_size can't be larger than capacity")
+        self.sample_rate = sample_rate
+        self.sink = sink
+        self.block_size = block_size
+        self.samples = np.zeros(capacity, dtype=np.float32)  # Ring buffer
+        self.start = 0  # Index of the oldest sample
+        self.size = 0
+        self.dropped = 0  # Samples lost to overflow
+
+    def __len__(self):
+        return self.size
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        capacity = len(self.samples)
+        if self.sink is not None:
+            while len(samples):
+                room = capacity - self.size
+                self._append(samples[:room])
+                samples = samples[room:]
+                while self.size >= self.block_size:
+                    self.sink(self.read(self.block_size))
+            return
+        if len(samples) > capacity:
+            self.dropped += len(samples) - capacity
+            samples = samples[-capacity:]
+        overflow = self.size + len(samples) - capacity
+        if overflow > 0:
+            self.dropped += overflow
+            self.start = (self.start + overflow) % capacity
+            self.size -= overflow
+        self._append(samples)
+
+    def _append(self, samples):
+        """Adds samples that fit"""
+        capacity = len(self.samples)
+        end = (self.start + self.size) % capacity
+        first = min(len(samples), capacity - end)
+        self.samples[end:end + first] = samples[:first]
+        self.samples[:len(samples) - first] = samples[first:]
+        self.size += len(samples)
+
+    def read(self, count: int = None) -> np.ndarray:
+        """Removes and returns up to `count` of the oldest samples (all of them by default)"""
+        count = self.size if count is None else min(count, self.size)
+        indices = (self.start + np.arange(count)) % len(self.samples)
+        self.start = (self.start + count) % len(self.samples)
+        self.size -= count
+        return self.samples[indices]
+
+    def flush(self):
+        """Hands whatever is left to the sink, for the end of a stream"""
+        if self.sink is not None and self.size:
+            self.sink(self.read())
+
+
+class WaveSink:
+    """Sample sink writing a mono 16-bit WAV file"""
+    def __init__(self, path: str, sample_rate: int = DEFAULT_SAMPLE_RATE):
+        self.file = wave.open(path, 'wb')
+        self.file.setnchannels(1)
+        self.file.setsampwidth(2)
+        self.file.setframerate(sample_rate)
+
+    def __call__(self, samples):
+        pcm = np.clip(samples * 2.0 - 1.0, -1.0, 1.0) * 32767.0
+        self.file.writeframes(pcm.astype('<i2').tobytes())
+
+    def close(self):
+        self.file.close()
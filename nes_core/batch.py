@@ -0,0 +1,146 @@
+"""Headless batch runs of ROM corpora.
+
+Every ROM is emulated in a worker of a process pool, so throughput scales with the cores available. Results are
+streamed as JSON lines in the order the ROMs finish, each line carrying the ROM's index in the batch:
+    python -m nes_core.batch test_roms/ --frames 600 --workers 8 --output results.jsonl"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .cartridge import Cartridge
+from .console import Console
+from .ppu import FRAME_DOTS
+
+DEFAULT_FRAMES = 60
+ROM_EXTENSIONS = ('.nes',)
+CYCLES_PER_FRAME = FRAME_DOTS // 3 + 1  # upper bound on the CPU cycles of one frame
+
+Job = namedtuple('Job', ['index', 'path', 'frames', 'cycles'])
+
+
+def find_roms(source: str):
+    """ROM paths of a directory (searched recursively, sorted) or of a manifest.
+    A manifest is either a text file with one path per line ('#' starts a comment) or a JSON list of paths or of
+    {"path": ..., "frames": ..., "cycles": ...} objects overriding the budgets of single ROMs. Relative paths are
+    relative to the manifest. Yields (path, frames, cycles) with None for budgets the manifest doesn't set"""
+    if os.path.isdir(source):
+        for directory, _, names in sorted(os.walk(source)):
+            for name in sorted(names):
+                if name.lower().endswith(ROM_EXTENSIONS):
+                    yield os.path.join(directory, name), None, None
+        return
+
+    base = os.path.dirname(source)
+    with open(source) as manifest:
+        if source.lower().endswith('.json'):
+            entries = json.load(manifest)
+        else:
+            entries = [line.split('#', 1)[0].strip() for line in manifest]
+            entries = [entry for entry in entries if entry]
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        yield os.path.join(base, entry['path']), entry.get('frames'), entry.get('cycles')
+
+
+def make_jobs(source: str, frames: int = None, cycles: int = None):
+    """Jobs for every ROM of `source`, with `frames` and `cycles` as the default budgets"""
+    if frames is None and cycles is None:
+        frames = DEFAULT_FRAMES
+    return [Job(index, path,
+                frames if rom_frames is None else rom_frames,
+                cycles if rom_cycles is None else rom_cycles)
+            for index, (path, rom_frames, rom_cycles) in enumerate(find_roms(source))]
+
+
+def emulate(console, frames: int = None, cycles: int = None):
+    """Runs `console` for `frames` frames or `cycles` CPU cycles, whichever runs out first (None is no limit)"""
+    if frames is None and cycles is None:
+        raise ValueError("emulate() needs a frames or a cycles budget")
+    cpu = console.cpu
+    end = None if cycles is None else cpu.total_cycles + cycles
+    frame = 0
+    while frames is None or frame < frames:
+        if end is not None:
+            left = end - cpu.total_cycles
+            if left <= 0:
+                break
+            if left <= CYCLES_PER_FRAME:  # the budget may run out within this frame
+                console.run(left)
+                break
+        console.run_frame()
+        frame += 1
+
+
+def digest(data) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def run_job(job: Job):
+    """Emulates a single ROM, headless. Returns its JSON result, with an 'error' instead of the hashes if the ROM
+    couldn't be loaded or crashed the emulator"""
+    result = {'index': job.index, 'rom': job.path}
+    start = time.perf_counter()
+    try:
+        with Cartridge.from_file(job.path) as cartridge:  # closed here, pool workers live for many jobs
+            console = Console()
+            console.insert_cartridge(cartridge)
+            try:
+                emulate(console, job.frames, job.cycles)
+                bus = console.bus
+                result.update({
+                    'mapper': bus.mapper.mapper_id,
+                    'frames': console.ppu.frame,
+                    'cycles': console.cpu.total_cycles,
+                    'ram_sha1': digest(bus.dump(0x0000, 0x0800)),
+                    'prg_ram_sha1': digest(bus.cartridge.prg_ram),
+                    'framebuffer_sha1': digest(console.ppu.framebuffer),
+                })
+            finally:
+                console.remove_cartridge()  # the mapper holds views of the ROM file's mmap
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['wall_time'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def run_batch(jobs, workers: int = None):
+    """Runs `jobs` on a pool of `workers` processes (one per core by default) and yields their results as they
+    finish"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs a directory or manifest of ROMs headless, in parallel")
+    parser.add_argument('source', help="directory of .nes files, or a text or JSON manifest")
+    parser.add_argument('--frames', type=int, help=f"frames to run each ROM for (default {DEFAULT_FRAMES})")
+    parser.add_argument('--cycles', type=int, help="CPU cycles to run each ROM for at most")
+    parser.add_argument('--workers', type=int, help="worker processes, one per core by default")
+    parser.add_argument('--output', default='-', help="JSON lines file to write, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.source, args.frames, args.cycles)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    failures = 0
+    start = time.perf_counter()
+    try:
+        for result in run_batch(jobs, args.workers):
+            failures += 'error' in result
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f'{len(jobs)} ROMs, {failures} failed, {time.perf_counter() - start:.3f}s', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
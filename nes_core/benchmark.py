@@ -0,0 +1,247 @@
+"""Benchmark suite for the CPU and Bus hot paths.
+
+Micro benchmarks cover Bus.read/Bus.write and each of the 12 addressing modes, macro benchmarks run branch heavy
+and memory heavy 6502 programs (interpreted, with the decode cache and with the block compiler) and whole frames of
+a ROM on the full console (CPU, PPU, APU and scheduler). Results are written as JSON and can be compared against a
+stored baseline:
+
+    python -m nes_core.benchmark --json results.json --baseline benchmarks/baseline.json
+    python -m nes_core.benchmark --save-baseline benchmarks/baseline.json
+
+Every result is a rate (operations per second), higher is better. Timings are noisy, so results that fall below
+the baseline are measured again (`--retries` more runs, keeping each benchmark's best) before they count as
+regressions.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from .bus import Bus
+from .cartridge import Cartridge
+from .console import Console
+from .cpu import CPU
+from .decode import DecodeCache
+from .jit import BlockEngine
+from .nestest import NESTEST_PATH
+
+BASELINE_PATH = 'benchmarks/baseline.json'
+DEFAULT_TOLERANCE = 0.25  # a result more than 25% below its baseline counts as a regression
+DEFAULT_RETRIES = 2
+PROGRAM_START = 0x8000
+ENGINES = ('interpreter', 'decode', 'jit')
+
+# One representative instruction per addressing mode, repeated to fill a page and looped with JMP $8000.
+# Operands point at zero page/RAM that setup_memory() fills so indirect modes stay inside RAM.
+MODE_INSTRUCTIONS = {
+    'IMP': bytes([0xEA]),              # NOP
+    'IMM': bytes([0xA9, 0x42]),        # LDA #$42
+    'ZP0': bytes([0xA5, 0x10]),        # LDA $10
+    'ZPX': bytes([0xB5, 0x10]),        # LDA $10,X
+    'ZPY': bytes([0xB6, 0x10]),        # LDX $10,Y
+    'REL': bytes([0xD0, 0x00]),        # BNE +0, always taken
+    'ABS': bytes([0xAD, 0x00, 0x03]),  # LDA $0300
+    'ABX': bytes([0xBD, 0xFF, 0x02]),  # LDA $02FF,X  crosses a page
+    'ABY': bytes([0xB9, 0x00, 0x03]),  # LDA $0300,Y
+    'IND': None,                       # JMP ($0400), a loop of its own
+    'IZX': bytes([0xA1, 0x20]),        # LDA ($20,X)
+    'IZY': bytes([0xB1, 0x20]),        # LDA ($20),Y
+}
+
+# Nested countdown loops, almost every other instruction is a taken branch
+BRANCH_PROGRAM = bytes([
+    0xA0, 0x00,        # 8000 LDY #$00
+    0xA2, 0x00,        # 8002 LDX #$00
+    0xCA,              # 8004 DEX
+    0xD0, 0xFD,        # 8005 BNE $8004
+    0x88,              # 8007 DEY
+    0xD0, 0xF8,        # 8008 BNE $8002
+    0x4C, 0x00, 0x80,  # 800A JMP $8000
+])
+
+# Copies page $03 to page $05 through pointers in zero page, over and over
+MEMORY_PROGRAM = bytes([
+    0xA0, 0x00,        # 8000 LDY #$00
+    0xB1, 0x20,        # 8002 LDA ($20),Y
+    0x91, 0x22,        # 8004 STA ($22),Y
+    0x99, 0x00, 0x06,  # 8006 STA $0600,Y
+    0xE6, 0x30,        # 8009 INC $30
+    0xC8,              # 800B INY
+    0xD0, 0xF4,        # 800C BNE $8002
+    0x4C, 0x00, 0x80,  # 800E JMP $8000
+])
+
+
+def mode_program(mode: str) -> bytes:
+    instruction = MODE_INSTRUCTIONS[mode]
+    if instruction is None:
+        return bytes([0x6C, 0x00, 0x04])
+    count = (0x100 - 3) // len(instruction)
+    return instruction * count + bytes([0x4C, 0x00, 0x80])
+
+
+def setup_memory(bus: Bus):
+    """Zero page pointers and data used by the benchmark programs"""
+    bus.load(0x0020, bytes([0x00, 0x03, 0x00, 0x05]))  # ($20) -> $0300, ($22) -> $0500
+    bus.load(0x0300, bytes(range(1, 256)) + b'\x01')  # non-zero, keeps BNE loops taken
+    bus.load(0x0400, bytes([0x00, 0x80]))  # JMP ($0400) -> $8000
+
+
+def make_cpu(program: bytes):
+    bus = Bus()
+    setup_memory(bus)
+    bus.load(PROGRAM_START, program)
+    cpu = CPU()
+    cpu.connect_bus(bus)
+    cpu.pc = PROGRAM_START
+    cpu.x_reg = 0x01
+    return cpu
+
+
+def best_rate(function, operations: int, repeat: int):
+    """Runs `function` `repeat` times and returns the best rate in operations per second"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return operations / best if best > 0 else float('inf')
+
+
+def bench_bus(iterations: int, repeat: int):
+    bus = Bus()
+    read = bus.read
+    write = bus.write
+    addresses = [address & 0x1FFF for address in range(iterations)]
+
+    def reads():
+        for address in addresses:
+            read(address)
+
+    def writes():
+        for address in addresses:
+            write(address, 0x42)
+
+    return {'bus.read': best_rate(reads, iterations, repeat), 'bus.write': best_rate(writes, iterations, repeat)}
+
+
+def run_program(program: bytes, engine: str, instructions: int):
+    """Returns a function running `program` for about `instructions` instructions (`cycles` for the jit)"""
+    cpu = make_cpu(program)
+    if engine == 'decode':
+        cpu.set_decode_cache(DecodeCache(cpu.bus))
+    if engine == 'jit':
+        block_engine = BlockEngine(cpu)
+        # blocks can't be stopped after a given number of instructions, run the cycles the interpreter would take
+        reference = make_cpu(program)
+        cycles = reference.run_instructions(instructions)
+        return lambda: block_engine.run(cycles)
+    return lambda: cpu.run_instructions(instructions)
+
+
+def bench_modes(instructions: int, repeat: int):
+    return {f'mode.{mode}': best_rate(run_program(mode_program(mode), 'interpreter', instructions),
+                                      instructions, repeat)
+            for mode in MODE_INSTRUCTIONS}
+
+
+def bench_programs(instructions: int, repeat: int):
+    results = {}
+    for name, program in (('branch', BRANCH_PROGRAM), ('memory', MEMORY_PROGRAM)):
+        for engine in ENGINES:
+            results[f'program.{name}.{engine}'] = best_rate(run_program(program, engine, instructions),
+                                                            instructions, repeat)
+    return results
+
+
+def bench_rom(rom_path: str, frames: int, repeat: int):
+    """Frames per second of a whole ROM on the console, started from its reset vector"""
+    def run():
+        with Cartridge.from_file(rom_path) as cartridge:
+            console = Console()
+            console.insert_cartridge(cartridge)
+            for _ in range(frames):
+                console.run_frame()
+            console.remove_cartridge()
+
+    return {'rom.fps': best_rate(run, frames, repeat)}
+
+
+def run_suite(iterations: int = 100000, frames: int = 5, repeat: int = 3, rom_path: str = NESTEST_PATH):
+    """Runs every benchmark and returns the machine readable report"""
+    results = {}
+    results.update(bench_bus(iterations, repeat))
+    results.update(bench_modes(iterations // 4, repeat))
+    results.update(bench_programs(iterations // 4, repeat))
+    results.update(bench_rom(rom_path, frames, repeat))
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def merge_best(report: dict, other: dict):
+    """Keeps the better rate of each benchmark in `report`"""
+    for name, rate in other['results'].items():
+        report['results'][name] = max(report['results'].get(name, 0.0), rate)
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE):
+    """Returns (name, baseline rate, current rate) for every result more than `tolerance` below its baseline.
+    Benchmarks missing from either side are ignored"""
+    regressions = []
+    for name, expected in baseline['results'].items():
+        actual = report['results'].get(name)
+        if actual is not None and actual < expected * (1 - tolerance):
+            regressions.append((name, expected, actual))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU and Bus benchmarks")
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--frames', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rom', default=NESTEST_PATH)
+    parser.add_argument('--json', help="write the results to this file, '-' for stdout")
+    parser.add_argument('--baseline', help="compare against this baseline, exit with 1 on regressions")
+    parser.add_argument('--save-baseline', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help="runs of the suite to repeat while results are below the baseline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    report = run_suite(args.iterations, args.frames, args.repeat, args.rom)
+    for _ in range(args.retries if baseline is not None else 0):
+        if not compare(report, baseline, args.tolerance):
+            break
+        merge_best(report, run_suite(args.iterations, args.frames, args.repeat, args.rom))
+    for name, rate in report['results'].items():
+        print(f'{name:32} {rate:>16,.0f}/s', file=sys.stderr)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+    elif args.json:
+        with open(args.json, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for name, expected, actual in regressions:
+            print(f'REGRESSION {name}: {actual:,.0f}/s, baseline {expected:,.0f}/s', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,31 +1,196 @@
 from __future__ import annotations
-from numpy import uint16, uint8
 from typing import TYPE_CHECKING
 from .exceptions import AddressOutOfBoundsError
+from .mappers import create_mapper
 if TYPE_CHECKING:
     from cpu import CPU
 
+RAM_SIZE = 64 * 1024
+INTERNAL_RAM_SIZE = 2 * 1024  # $0000-$07FF, mirrored up to $1FFF
+IO_START = 0x4000  # APU and I/O registers, $4000-$401F
+IO_END = 0x401F
+CARTRIDGE_START = 0x4020  # Cartridge space spans $4020-$FFFF
+EXPANSION_END = 0x40FF  # The cartridge's part of the I/O page
+PAGE_SIZE = 0x100
+PAGE_COUNT = RAM_SIZE // PAGE_SIZE
+
+
+def _open_bus_read(address: int):
+    return 0
+
+
+def _ignore_write(address: int, data: int):
+    pass
+
 
 class Bus:
+    """CPU address space.
+    Every 256-byte page has an entry in a page table: either a memoryview of the page, which is read or written
+    directly, or None, in which case the page's device handler is called. Mapping a device or switching a bank only
+    rewrites page table entries, so every access costs the same no matter what is mapped where."""
     def __init__(self):
-        self.ram = [uint8(0)] * (64 * 1024)
-        self.first_address = uint16(0x0000)
-        self.last_address = uint16(0xFFFF)
+        self.ram = bytearray(RAM_SIZE)  # Backing memory for every page no device has claimed
+        self.memory = memoryview(self.ram)  # Zero-copy view for bulk loads and dumps
+        self.first_address = 0x0000
+        self.last_address = RAM_SIZE - 1
+        self.cartridge = None
+        self.mapper = None
+        self.page_listeners = []  # Called as listener(first_page, last_page) when pages are remapped or reloaded
+        # Called before every access that reaches a device handler, lets a scheduler bring chips running behind
+        # the CPU up to date before they are observed. None costs a single check on the device path only
+        self.device_hook = None
+
+        self.read_pages = [None] * PAGE_COUNT
+        self.write_pages = [None] * PAGE_COUNT
+        self.read_handlers = [_open_bus_read] * PAGE_COUNT
+        self.write_handlers = [_ignore_write] * PAGE_COUNT
+        # The I/O page is split: a handler per register for $4000-$401F, the cartridge's handlers for the rest
+        self.io_read_handlers = [_open_bus_read] * (IO_END - IO_START + 1)
+        self.io_write_handlers = [_ignore_write] * (IO_END - IO_START + 1)
+        self.expansion_read = _open_bus_read
+        self.expansion_write = _ignore_write
+        self.unmap(0x0000, 0xFFFF)
+        # Internal RAM is mirrored every 2 KiB up to $1FFF
+        self.map_memory(0x0000, 0x1FFF, self.memory[:INTERNAL_RAM_SIZE])
+        self.map_device(IO_START, EXPANSION_END, self.io_read, self.io_write)
 
-    def address_in_range(self, address: uint16):
+    def address_in_range(self, address: int):
         if self.first_address > address or address > self.last_address:
             return False
         else:
             return True
 
-    def write(self, address: uint16, data: uint8):
-        if self.address_in_range(address):
-            if isinstance(data, uint8):
-                self.ram[address] = data
-            else:
-                raise TypeError("uint8 must be passed to the bus")
+    # Page table
+    def map_memory(self, start: int, end: int, buffer, writable=True, write_handler=_ignore_write):
+        """Maps `buffer` over the pages from `start` to `end` (inclusive), repeating it if it is smaller.
+        Read-only mappings send writes to `write_handler` instead, e.g. mapper registers over PRG ROM"""
+        buffer = memoryview(buffer)
+        size = len(buffer)
+        if size < PAGE_SIZE or size % PAGE_SIZE:
+            raise ValueError("mapped memory must be a whole number of pages")
+        writable = writable and not buffer.readonly
+        first_page = start >> 8
+        for page in range(first_page, (end >> 8) + 1):
+            offset = ((page - first_page) * PAGE_SIZE) % size
+            view = buffer[offset:offset + PAGE_SIZE]
+            self.read_pages[page] = view
+            self.write_pages[page] = view if writable else None
+            self.read_handlers[page] = _open_bus_read
+            self.write_handlers[page] = _ignore_write if writable else write_handler
+        self.pages_changed(first_page, end >> 8)
+
+    def map_device(self, start: int, end: int, read_handler, write_handler):
+        """Routes every access to the pages from `start` to `end` (inclusive) through the given handlers,
+        called as read_handler(address) and write_handler(address, data)"""
+        for page in range(start >> 8, (end >> 8) + 1):
+            self.read_pages[page] = None
+            self.write_pages[page] = None
+            self.read_handlers[page] = read_handler
+            self.write_handlers[page] = write_handler
+        self.pages_changed(start >> 8, end >> 8)
+
+    def map_io(self, start: int, end: int, read_handler=None, write_handler=None):
+        """Routes the I/O registers from `start` to `end` (inclusive, within $4000-$401F) through the given
+        handlers, None leaves a direction as it is"""
+        for address in range(start, end + 1):
+            if read_handler is not None:
+                self.io_read_handlers[address - IO_START] = read_handler
+            if write_handler is not None:
+                self.io_write_handlers[address - IO_START] = write_handler
+
+    def map_expansion(self, read_handler=_open_bus_read, write_handler=_ignore_write):
+        """Routes $4020-$40FF, the cartridge's part of the I/O page, through the given handlers"""
+        self.expansion_read = read_handler
+        self.expansion_write = write_handler
+
+    def io_read(self, address: int):
+        if address <= IO_END:
+            return self.io_read_handlers[address - IO_START](address)
+        return self.expansion_read(address)
+
+    def io_write(self, address: int, data: int):
+        if address <= IO_END:
+            self.io_write_handlers[address - IO_START](address, data)
         else:
+            self.expansion_write(address, data)
+
+    def unmap(self, start: int, end: int):
+        """Gives the pages from `start` to `end` (inclusive) back to the backing ram"""
+        for page in range(start >> 8, (end >> 8) + 1):
+            view = self.memory[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+            self.read_pages[page] = view
+            self.write_pages[page] = view
+            self.read_handlers[page] = _open_bus_read
+            self.write_handlers[page] = _ignore_write
+        self.pages_changed(start >> 8, end >> 8)
+
+    def pages_changed(self, first_page: int, last_page: int):
+        """Tells page listeners (e.g. a decode cache) that what the given pages hold is no longer what it was"""
+        for listener in self.page_listeners:
+            listener(first_page, last_page)
+
+    # Cartridge
+    def insert_cartridge(self, cartridge):
+        """Maps the cartridge over $4020-$FFFF through the mapper its header asks for"""
+        if self.mapper is not None:
+            self.remove_cartridge()
+        self.cartridge = cartridge
+        self.mapper = create_mapper(cartridge)
+        self.mapper.attach(self)
+
+    def remove_cartridge(self):
+        self.map_expansion()
+        self.unmap(EXPANSION_END + 1, 0xFFFF)
+        self.cartridge = None
+        self.mapper = None
+
+    # Access
+    def write(self, address: int, data: int):
+        if address < 0:
             raise AddressOutOfBoundsError(address)
+        try:
+            page = self.write_pages[address >> 8]
+        except IndexError:
+            raise AddressOutOfBoundsError(address) from None
+        if page is not None:
+            page[address & 0xFF] = data
+        else:
+            if self.device_hook is not None:
+                self.device_hook()
+            self.write_handlers[address >> 8](address, data)
 
-    def read(self, address: uint16, b_read_only=False):
-        return self.ram[address]
+    def read(self, address: int, b_read_only=False):
+        page = self.read_pages[address >> 8]
+        if page is not None:
+            return page[address & 0xFF]
+        if self.device_hook is not None:
+            self.device_hook()
+        return self.read_handlers[address >> 8](address)
+
+    def read_page(self, page: int):
+        """The 256 bytes the CPU would read from page `page`, for DMA. Mapped memory is returned as a zero-copy view
+        of the page; a device page is read a byte at a time through its handler"""
+        view = self.read_pages[page]
+        if view is not None:
+            return view
+        if self.device_hook is not None:
+            self.device_hook()
+        handler = self.read_handlers[page]
+        base = page << 8
+        return bytes([handler(base + offset) for offset in range(PAGE_SIZE)])
+
+    def load(self, address: int, data):
+        """Copies a bytes-like object into the backing ram starting at `address` with a single slice assignment"""
+        end = address + len(data)
+        if address < 0 or end > RAM_SIZE:
+            raise AddressOutOfBoundsError(address)
+        self.memory[address:end] = data
+        if end > address:
+            self.pages_changed(address >> 8, (end - 1) >> 8)
+
+    def dump(self, address: int = 0x0000, length: int = RAM_SIZE):
+        """Returns a read-only, zero-copy view of `length` bytes of the backing ram starting at `address`"""
+        end = address + length
+        if address < 0 or end > RAM_SIZE:
+            raise AddressOutOfBoundsError(address)
+        return self.memory[address:end].toreadonly()
@@ -0,0 +1,115 @@
+import logging
+import mmap
+from .exceptions import InvalidRomError
+
+logger = logging.getLogger(__name__)
+
+HEADER_SIZE = 16
+TRAINER_SIZE = 512
+PRG_BANK_SIZE = 16 * 1024
+CHR_BANK_SIZE = 8 * 1024
+PRG_RAM_SIZE = 8 * 1024
+MAGIC = b'NES\x1a'
+
+MIRROR_HORIZONTAL = 'horizontal'
+MIRROR_VERTICAL = 'vertical'
+MIRROR_FOUR_SCREEN = 'four_screen'
+MIRROR_SINGLE_LOWER = 'single_lower'  # Single screen mirroring, only selectable by some mappers
+MIRROR_SINGLE_UPPER = 'single_upper'
+
+
+def _nes2_rom_size(lsb: int, msb: int, unit: int) -> int:
+    """NES 2.0 ROM sizes are either a 12-bit bank count or, when the MSB nibble is 0xF,
+    an exponent-multiplier pair (2^E * (MM*2+1) bytes)"""
+    if msb == 0x0F:
+        return (1 << (lsb >> 2)) * ((lsb & 0x03) * 2 + 1)
+    return ((msb << 8) | lsb) * unit
+
+
+def _nes2_ram_size(shifts: int) -> int:
+    """NES 2.0 RAM sizes: volatile RAM in the low nibble, battery-backed NVRAM in the high one, each 64 << n bytes
+    (0 for none)"""
+    return sum(64 << shift for shift in (shifts & 0x0F, shifts >> 4) if shift)
+
+
+class Cartridge:
+    """iNES / NES 2.0 cartridge image.
+    PRG and CHR ROM are read-only memoryview slices of the image (an mmap when loaded from a file),
+    so nothing is copied no matter how large the ROM is"""
+    def __init__(self, data):
+        self._mmap = data if isinstance(data, mmap.mmap) else None
+        self._view = memoryview(data).toreadonly()
+        header = bytes(self._view[:HEADER_SIZE])
+        if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+            raise InvalidRomError("missing iNES header")
+
+        flags6, flags7 = header[6], header[7]
+        self.nes2 = (flags7 & 0x0C) == 0x08
+        self.has_trainer = bool(flags6 & 0x04)
+        self.has_battery = bool(flags6 & 0x02)
+        if flags6 & 0x08:
+            self.mirroring = MIRROR_FOUR_SCREEN
+        elif flags6 & 0x01:
+            self.mirroring = MIRROR_VERTICAL
+        else:
+            self.mirroring = MIRROR_HORIZONTAL
+
+        self.mapper_id = (flags6 >> 4) | (flags7 & 0xF0)
+        self.submapper = 0
+        if self.nes2:
+            self.mapper_id |= (header[8] & 0x0F) << 8
+            self.submapper = header[8] >> 4
+            prg_size = _nes2_rom_size(header[4], header[9] & 0x0F, PRG_BANK_SIZE)
+            chr_size = _nes2_rom_size(header[5], header[9] >> 4, CHR_BANK_SIZE)
+            prg_ram_size = _nes2_ram_size(header[10])
+            chr_ram_size = _nes2_ram_size(header[11])
+        else:
+            prg_size = header[4] * PRG_BANK_SIZE
+            chr_size = header[5] * CHR_BANK_SIZE
+            prg_ram_size = (header[8] or 1) * PRG_RAM_SIZE
+            chr_ram_size = 0 if chr_size else CHR_BANK_SIZE
+
+        prg_start = HEADER_SIZE + (TRAINER_SIZE if self.has_trainer else 0)
+        chr_start = prg_start + prg_size
+        if prg_size == 0 or chr_start + chr_size > len(self._view):
+            raise InvalidRomError("ROM image is shorter than its header declares")
+
+        self.trainer = self._view[HEADER_SIZE:prg_start]
+        self.prg_rom = self._view[prg_start:chr_start]
+        self.chr_rom = self._view[chr_start:chr_start + chr_size]
+        self.prg_ram = bytearray(prg_ram_size)
+        self.chr_ram = bytearray(chr_ram_size)
+        # Pattern memory seen by the PPU, CHR RAM when the board has no CHR ROM
+        self.chr = self.chr_rom if chr_size else memoryview(self.chr_ram)
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Maps the ROM file into memory instead of reading it"""
+        with open(path, 'rb') as rom_file:
+            try:
+                data = mmap.mmap(rom_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # an empty file can't be mapped
+                raise InvalidRomError("missing iNES header") from None
+        return cls(data)
+
+    def close(self):
+        """Releases the image and unmaps the ROM file. Remove the cartridge from its bus first, the mapper and the
+        bus's page tables hold slices of it"""
+        try:
+            for view in (self.trainer, self.prg_rom, self.chr_rom, self._view):
+                view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            logger.warning("mapper %d cartridge is still in use, its ROM file stays mapped until that goes",
+                           self.mapper_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return (f'Cartridge(mapper={self.mapper_id}, prg_rom={len(self.prg_rom)}, chr_rom={len(self.chr_rom)}, '
+                f'mirroring={self.mirroring}, nes2={self.nes2})')
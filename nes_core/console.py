@@ -0,0 +1,144 @@
+from . import savestate
+from .apu import APU
+from .bus import Bus
+from .cpu import CPU, IRQ_MAPPER
+from .ppu import PPU, DOTS_PER_SCANLINE, FRAME_DOTS
+
+PPU_DOTS_PER_CPU_CYCLE = 3
+OAM_DMA = 0x4014
+OAM_DMA_CYCLES = 513  # Plus one to line up with a read cycle when the write lands on an odd cycle
+
+
+class Console:
+    """The whole machine: a bus with a CPU, a PPU and an APU attached, clocked from one master clock.
+    The PPU runs three dots for every CPU cycle, the CPU cycle coming first. NMIs raised by the PPU and the
+    cartridge and APU IRQ lines go straight to the CPU, which takes them on its next interrupt poll.
+
+    clock() steps everything in lockstep, one master tick at a time. run() and run_frame() give bit-identical
+    results with a catch-up scheduler instead: the CPU runs ahead in batches and the PPU is only brought up to date
+    when something could observe it, either the CPU touching a device (PPU registers, mapper registers; through the
+    bus device hook) or the next dot at which the PPU could raise an NMI or clock a scanline counting mapper.
+    The APU syncs itself on register accesses; the scheduler only stops at its `irq_deadline`, and run_frame() has
+    it render each frame's audio."""
+    def __init__(self):
+        self.bus = Bus()
+        self.cpu = CPU()
+        self.cpu.connect_bus(self.bus)
+        self.ppu = PPU()
+        self.ppu.attach(self.bus)
+        self.ppu.nmi_handler = self.deliver_nmi
+        self.apu = APU()
+        self.apu.attach(self.bus)
+        self.apu.connect_cpu(self.cpu)
+        self.bus.map_io(OAM_DMA, OAM_DMA, write_handler=self.oam_dma)
+        self.system_clock = 0  # Master clock ticks, one per PPU dot
+        self.ppu_clock = 0  # Ticks the PPU has run, behind system_clock while the scheduler lets the CPU run ahead
+        self._tick_base = 0  # Tick of CPU cycle 0 while run() is going
+        self.syncs = 0  # Times the scheduler had to bring the PPU up to date
+
+    def insert_cartridge(self, cartridge):
+        self.bus.insert_cartridge(cartridge)
+        self.bus.mapper.irq_handler = self.deliver_irq
+        self.reset()
+
+    def remove_cartridge(self):
+        """Unplugs the cartridge, dropping every view of its memory so it can be closed"""
+        self.bus.remove_cartridge()
+
+    def reset(self):
+        self.ppu.reset()
+        self.apu.reset()
+        self.cpu.reset()
+
+    def deliver_nmi(self):
+        self.ppu.nmi = False
+        self.cpu.nmi()
+
+    def deliver_irq(self, level: bool):
+        self.cpu.irq(level, IRQ_MAPPER)
+
+    def oam_dma(self, address: int, data: int):
+        """$4014: copies CPU page `data` into OAM in one go and stalls the CPU for the cycles the DMA takes. The
+        PPU has been synced by the bus device hook, so it sees the whole page land at the write"""
+        cpu = self.cpu
+        self.ppu.load_oam(self.bus.read_page(data))
+        write_cycle = cpu.total_cycles + cpu.cycles - 1  # The write is the last cycle of the instruction
+        cpu.stall(OAM_DMA_CYCLES + (write_cycle & 1))
+
+    def clock(self):
+        """Advances everything by one master tick, in lockstep"""
+        if self.system_clock % PPU_DOTS_PER_CPU_CYCLE == 0:
+            if self.cpu.total_cycles >= self.apu.irq_deadline:
+                self.apu.run_until(self.cpu.total_cycles)
+            self.cpu.clock()
+        self.ppu.clock()
+        self.system_clock += 1
+        self.ppu_clock = self.system_clock
+
+    # Save states, see nes_core.savestate
+    def snapshot(self, base=None):
+        """In-memory snapshot, sharing the pages that haven't changed since snapshot `base`"""
+        return savestate.take_snapshot(self, base)
+
+    def restore(self, snapshot):
+        savestate.restore_snapshot(self, snapshot)
+
+    def save_state(self, compress=True) -> bytes:
+        return savestate.save_state(self, compress)
+
+    def load_state(self, data):
+        savestate.load_state(self, data)
+
+    # Catch-up scheduling
+    def sync_ppu(self, tick: int):
+        """Runs the PPU up to (not including) master tick `tick`"""
+        if tick > self.ppu_clock:
+            self.ppu.run(tick - self.ppu_clock)
+            self.ppu_clock = tick
+            self.syncs += 1
+
+    def sync_devices(self):
+        """Bus device hook: the CPU is about to touch a device in the instruction starting at its current cycle"""
+        self.sync_ppu(self._tick_base + PPU_DOTS_PER_CPU_CYCLE * self.cpu.total_cycles)
+
+    def run(self, cycles: int):
+        """Runs `cycles` CPU cycles worth of master ticks, with exactly the same result as calling clock() for each"""
+        ticks = PPU_DOTS_PER_CPU_CYCLE * cycles
+        while self.system_clock % PPU_DOTS_PER_CPU_CYCLE and ticks > 0:  # get to the start of a CPU cycle
+            self.clock()
+            ticks -= 1
+        whole_cycles, ticks = divmod(ticks, PPU_DOTS_PER_CPU_CYCLE)
+        if whole_cycles:
+            self.run_cycles(whole_cycles)
+        for _ in range(ticks):
+            self.clock()
+
+    def run_cycles(self, cycles: int):
+        cpu = self.cpu
+        ppu = self.ppu
+        apu = self.apu
+        mapper = self.bus.mapper
+        scanline_ticks = mapper is not None and mapper.counts_scanlines
+        base = self._tick_base = self.system_clock - PPU_DOTS_PER_CPU_CYCLE * cpu.total_cycles
+        end = cpu.total_cycles + cycles
+        self.bus.device_hook = self.sync_devices
+        try:
+            while cpu.total_cycles < end:
+                event = self.ppu_clock + ppu.dots_until_event(scanline_ticks)
+                # the first instruction that has to see the event starts on the first CPU cycle after it
+                first_affected = (event - base) // PPU_DOTS_PER_CPU_CYCLE + 1
+                cpu.run(min(end, first_affected, apu.irq_deadline) - cpu.total_cycles)
+                self.sync_ppu(base + PPU_DOTS_PER_CPU_CYCLE * cpu.total_cycles)
+                if cpu.total_cycles >= apu.irq_deadline:
+                    apu.run_until(cpu.total_cycles)
+        finally:
+            self.bus.device_hook = None
+        self.system_clock = self.ppu_clock
+
+    def run_frame(self):
+        """Runs whole CPU cycles until the PPU has started its next frame"""
+        frame = self.ppu.frame
+        while self.ppu.frame == frame:
+            position = self.ppu.scanline * DOTS_PER_SCANLINE + self.ppu.dot
+            self.run(max((FRAME_DOTS - 1 - position) // PPU_DOTS_PER_CPU_CYCLE, 1))
+        self.apu.end_frame()
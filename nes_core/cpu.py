@@ -1,137 +1,162 @@
-from numpy import uint8, uint16
 from collections import namedtuple
-import logging
+import numpy as np
 from .exceptions import NoBusConnectedError
 from .bus import Bus
-
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from .trace import TraceRecord
 
 ins = namedtuple('Instruction', ['mnemonic', 'operation', 'addr_mode', 'cycles'])
 
+# Status register bits
+FLAG_C = 1 << 0  # Carry bit
+FLAG_Z = 1 << 1  # Zero
+FLAG_I = 1 << 2  # Disable Interrupts
+FLAG_D = 1 << 3  # Decimal Mode (Unsupported)
+FLAG_B = 1 << 4  # Break
+FLAG_U = 1 << 5  # Unused
+FLAG_V = 1 << 6  # Overflow
+FLAG_N = 1 << 7  # Negative
+
+# Flag lookup tables, so an operation updates the status register with one lookup and mask. They are computed
+# with NumPy over every combination of inputs at once, then kept as bytes, which index faster from plain ints
+_VALUES = np.arange(256)
+_NZ = np.where(_VALUES, _VALUES & FLAG_N, FLAG_Z)
+NZ_FLAGS = _NZ.astype(np.uint8).tobytes()  # Indexed by an 8-bit result
+# The status bits an operation keeps, the rest come from a table
+NOT_NZ = ~(FLAG_N | FLAG_Z) & 0xFF
+NOT_NZC = ~(FLAG_N | FLAG_Z | FLAG_C) & 0xFF
+NOT_NVZ = ~(FLAG_N | FLAG_V | FLAG_Z) & 0xFF
+NOT_NVZC = ~(FLAG_N | FLAG_V | FLAG_Z | FLAG_C) & 0xFF
+
+# Broadcasting axes: the first operand (a register) down, the second across, and carry last
+_A, _M, _CARRY = _VALUES[:, None], _VALUES[None, :], np.arange(2)
+_TOTAL = _A[..., None] + _M[..., None] + _CARRY
+# C, V, N and Z of a + operand + carry, indexed by a << 9 | operand << 1 | carry. SBC is an ADC of the inverted
+# operand, so it shares the table
+ADC_FLAGS = ((_TOTAL >> 8) | ((~(_A ^ _M)[..., None] & (_A[..., None] ^ _TOTAL) & 0x80) >> 1) | _NZ[_TOTAL & 0xFF]) \
+    .astype(np.uint8).tobytes()
+# C, N and Z of comparing register with operand, indexed by register << 8 | operand
+COMPARE_FLAGS = ((_A >= _M) | _NZ[(_A - _M) & 0xFF]).astype(np.uint8).tobytes()
+# Z, V and N of BIT, indexed by a << 8 | operand
+BIT_FLAGS = ((_M & (FLAG_V | FLAG_N)) | np.where(_A & _M, 0, FLAG_Z)).astype(np.uint8).tobytes()
+# C, N and Z of shifting value one bit left (ASL, ROL) or right (LSR, ROR) with carry shifted in, indexed by
+# value << 1 | carry
+SHIFT_LEFT_FLAGS = ((_A >> 7) | _NZ[((_A << 1) | _CARRY) & 0xFF]).astype(np.uint8).tobytes()
+SHIFT_RIGHT_FLAGS = ((_A & 0x01) | _NZ[(_CARRY << 7) | (_A >> 1)]).astype(np.uint8).tobytes()
+
+STACK_PAGE = 0x0100  # The stack lives in $0100-$01FF, stkp is the offset into it
+# Zero page and stack are always internal RAM, so the CPU accesses them directly instead of through the bus
+DIRECT_RAM_END = 0x0200
+
+# Interrupt vectors
+NMI_VECTOR = 0xFFFA
+RESET_VECTOR = 0xFFFC
+IRQ_VECTOR = 0xFFFE  # Shared by BRK
+INTERRUPT_CYCLES = 7
+
+# Bits of CPU.interrupts: a latched NMI edge, and one bit for each device that can hold the IRQ line down
+INTERRUPT_NMI = 1 << 0
+IRQ_MAPPER = 1 << 1
+IRQ_APU_FRAME = 1 << 2
+IRQ_DMC = 1 << 3
+IRQ_LINES = IRQ_MAPPER | IRQ_APU_FRAME | IRQ_DMC
+
+
+class _NoRam:
+    """Stands in for CPU.ram until a bus is connected, so the direct RAM accesses fail like bus accesses do"""
+    def __getitem__(self, address):
+        raise NoBusConnectedError
+
+    def __setitem__(self, address, data):
+        raise NoBusConnectedError
+
+
+_NO_RAM = _NoRam()
+
 
 class CPU:
+    # Registers are plain Python ints kept in range by masking (& 0xFF / & 0xFFFF) wherever they change.
+    # The underscored slots are used internally, the public names are properties that mask on assignment.
+    __slots__ = (
+        'opcode', 'cycles', 'total_cycles', 'addr_abs', 'addr_rel', 'fetched',
+        '_acc', '_x', '_y', '_stkp', '_pc', '_status',
+        'bus', 'ram', 'trace_sink', 'decode_cache', 'interrupts', 'nmi_cycle', 'irq_cycle', 'stall_cycles',
+        'interrupts_taken',
+    )
+
+    status_map = {'C': FLAG_C, 'Z': FLAG_Z, 'I': FLAG_I, 'D': FLAG_D,
+                  'B': FLAG_B, 'U': FLAG_U, 'V': FLAG_V, 'N': FLAG_N}
+
     def __init__(self):
-        self.opcode = uint8(0x00)  # Currently processed opcode
+        self.opcode = 0x00  # Currently processed opcode
         self.cycles = 0  # Cycles left for current opcode
-        self.addr_abs = uint16(0x0000)  # Address where instruction was called
-        self.addr_rel = uint8(0x00)  # Relative address for jumps
-        self.fetched = uint8(0x00)  # Data fetched for operation
-        self.acc_reg = uint8(0x00)  # Accumulator register
-        self.x_reg = uint8(0x00)  # X register
-        self.y_reg = uint8(0x00)  # Y register
-        self.stkp = uint8(0x00)  # Stack Pointer
-        self.pc = uint16(0x0000)  # Program Counter
-        self.status_reg = uint8(0x00)  # Status Register
+        self.total_cycles = 0  # Cycles run since power up
+        self.addr_abs = 0x0000  # Address where instruction was called
+        self.addr_rel = 0x0000  # Relative address for jumps, sign extended to 16 bits
+        self.fetched = 0x00  # Data fetched for operation
+        self._acc = 0x00  # Accumulator register
+        self._x = 0x00  # X register
+        self._y = 0x00  # Y register
+        self._stkp = 0x00  # Stack Pointer
+        self._pc = 0x0000  # Program Counter
+        self._status = 0x00  # Status Register
         self.bus = None
-        self.status_map = {
-            'C': 1 << 0,  # Carry bit
-            'Z': 1 << 1,  # Zero
-            'I': 1 << 2,  # Disable Interrupts
-            'D': 1 << 3,  # Decimal Mode (Unsupported)
-            'B': 1 << 4,  # Break
-            'U': 1 << 5,  # Unused
-            'V': 1 << 6,  # Overflow
-            'N': 1 << 7   # Negative
-        }
-
-        self.instructions_lookup = (
-            ins("BRK", self.BRK, self.IMM, 7), ins("ORA", self.ORA, self.IZX, 6), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 3), ins("ORA", self.ORA, self.ZP0, 3),
-            ins("ASL", self.ASL, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("PHP", self.PHP, self.IMP, 3),
-            ins("ORA", self.ORA, self.IMM, 2), ins("ASL", self.ASL, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.NOP, self.IMP, 4), ins("ORA", self.ORA, self.ABS, 4), ins("ASL", self.ASL, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BPL", self.BPL, self.REL, 2), ins("ORA", self.ORA, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("ORA", self.ORA, self.ZPX, 4),
-            ins("ASL", self.ASL, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("CLC", self.CLC, self.IMP, 2),
-            ins("ORA", self.ORA, self.ABY, 4), ins("???", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("ORA", self.ORA, self.ABX, 4), ins("ASL", self.ASL, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-            ins("JSR", self.JSR, self.ABS, 6), ins("AND", self.AND, self.IZX, 6), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("BIT", self.BIT, self.ZP0, 3), ins("AND", self.AND, self.ZP0, 3),
-            ins("ROL", self.ROL, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("PLP", self.PLP, self.IMP, 4),
-            ins("AND", self.AND, self.IMM, 2), ins("ROL", self.ROL, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("BIT", self.BIT, self.ABS, 4), ins("AND", self.AND, self.ABS, 4), ins("ROL", self.ROL, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BMI", self.BMI, self.REL, 2), ins("AND", self.AND, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("AND", self.AND, self.ZPX, 4),
-            ins("ROL", self.ROL, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("SEC", self.SEC, self.IMP, 2),
-            ins("AND", self.AND, self.ABY, 4), ins("???", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("AND", self.AND, self.ABX, 4), ins("ROL", self.ROL, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-            ins("RTI", self.RTI, self.IMP, 6), ins("EOR", self.EOR, self.IZX, 6), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 3), ins("EOR", self.EOR, self.ZP0, 3),
-            ins("LSR", self.LSR, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("PHA", self.PHA, self.IMP, 3),
-            ins("EOR", self.EOR, self.IMM, 2), ins("LSR", self.LSR, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("JMP", self.JMP, self.ABS, 3), ins("EOR", self.EOR, self.ABS, 4), ins("LSR", self.LSR, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BVC", self.BVC, self.REL, 2), ins("EOR", self.EOR, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("EOR", self.EOR, self.ZPX, 4),
-            ins("LSR", self.LSR, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("CLI", self.CLI, self.IMP, 2),
-            ins("EOR", self.EOR, self.ABY, 4), ins("???", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("EOR", self.EOR, self.ABX, 4), ins("LSR", self.LSR, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-            ins("RTS", self.RTS, self.IMP, 6), ins("ADC", self.ADC, self.IZX, 6), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 3), ins("ADC", self.ADC, self.ZP0, 3),
-            ins("ROR", self.ROR, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("PLA", self.PLA, self.IMP, 4),
-            ins("ADC", self.ADC, self.IMM, 2), ins("ROR", self.ROR, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("JMP", self.JMP, self.IND, 5), ins("ADC", self.ADC, self.ABS, 4), ins("ROR", self.ROR, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BVS", self.BVS, self.REL, 2), ins("ADC", self.ADC, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("ADC", self.ADC, self.ZPX, 4),
-            ins("ROR", self.ROR, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("SEI", self.SEI, self.IMP, 2),
-            ins("ADC", self.ADC, self.ABY, 4), ins("???", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("ADC", self.ADC, self.ABX, 4), ins("ROR", self.ROR, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 2), ins("STA", self.STA, self.IZX, 6), ins("???", self.NOP, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 6), ins("STY", self.STY, self.ZP0, 3), ins("STA", self.STA, self.ZP0, 3),
-            ins("STX", self.STX, self.ZP0, 3), ins("???", self.XXX, self.IMP, 3), ins("DEY", self.DEY, self.IMP, 2),
-            ins("???", self.NOP, self.IMP, 2), ins("TXA", self.TXA, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("STY", self.STY, self.ABS, 4), ins("STA", self.STA, self.ABS, 4), ins("STX", self.STX, self.ABS, 4),
-            ins("???", self.XXX, self.IMP, 4),
-            ins("BCC", self.BCC, self.REL, 2), ins("STA", self.STA, self.IZY, 6), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 6), ins("STY", self.STY, self.ZPX, 4), ins("STA", self.STA, self.ZPX, 4),
-            ins("STX", self.STX, self.ZPY, 4), ins("???", self.XXX, self.IMP, 4), ins("TYA", self.TYA, self.IMP, 2),
-            ins("STA", self.STA, self.ABY, 5), ins("TXS", self.TXS, self.IMP, 2), ins("???", self.XXX, self.IMP, 5),
-            ins("???", self.NOP, self.IMP, 5), ins("STA", self.STA, self.ABX, 5), ins("???", self.XXX, self.IMP, 5),
-            ins("???", self.XXX, self.IMP, 5),
-            ins("LDY", self.LDY, self.IMM, 2), ins("LDA", self.LDA, self.IZX, 6), ins("LDX", self.LDX, self.IMM, 2),
-            ins("???", self.XXX, self.IMP, 6), ins("LDY", self.LDY, self.ZP0, 3), ins("LDA", self.LDA, self.ZP0, 3),
-            ins("LDX", self.LDX, self.ZP0, 3), ins("???", self.XXX, self.IMP, 3), ins("TAY", self.TAY, self.IMP, 2),
-            ins("LDA", self.LDA, self.IMM, 2), ins("TAX", self.TAX, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("LDY", self.LDY, self.ABS, 4), ins("LDA", self.LDA, self.ABS, 4), ins("LDX", self.LDX, self.ABS, 4),
-            ins("???", self.XXX, self.IMP, 4),
-            ins("BCS", self.BCS, self.REL, 2), ins("LDA", self.LDA, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 5), ins("LDY", self.LDY, self.ZPX, 4), ins("LDA", self.LDA, self.ZPX, 4),
-            ins("LDX", self.LDX, self.ZPY, 4), ins("???", self.XXX, self.IMP, 4), ins("CLV", self.CLV, self.IMP, 2),
-            ins("LDA", self.LDA, self.ABY, 4), ins("TSX", self.TSX, self.IMP, 2), ins("???", self.XXX, self.IMP, 4),
-            ins("LDY", self.LDY, self.ABX, 4), ins("LDA", self.LDA, self.ABX, 4), ins("LDX", self.LDX, self.ABY, 4),
-            ins("???", self.XXX, self.IMP, 4),
-            ins("CPY", self.CPY, self.IMM, 2), ins("CMP", self.CMP, self.IZX, 6), ins("???", self.NOP, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("CPY", self.CPY, self.ZP0, 3), ins("CMP", self.CMP, self.ZP0, 3),
-            ins("DEC", self.DEC, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("INY", self.INY, self.IMP, 2),
-            ins("CMP", self.CMP, self.IMM, 2), ins("DEX", self.DEX, self.IMP, 2), ins("???", self.XXX, self.IMP, 2),
-            ins("CPY", self.CPY, self.ABS, 4), ins("CMP", self.CMP, self.ABS, 4), ins("DEC", self.DEC, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BNE", self.BNE, self.REL, 2), ins("CMP", self.CMP, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("CMP", self.CMP, self.ZPX, 4),
-            ins("DEC", self.DEC, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("CLD", self.CLD, self.IMP, 2),
-            ins("CMP", self.CMP, self.ABY, 4), ins("NOP", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("CMP", self.CMP, self.ABX, 4), ins("DEC", self.DEC, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-            ins("CPX", self.CPX, self.IMM, 2), ins("SBC", self.SBC, self.IZX, 6), ins("???", self.NOP, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("CPX", self.CPX, self.ZP0, 3), ins("SBC", self.SBC, self.ZP0, 3),
-            ins("INC", self.INC, self.ZP0, 5), ins("???", self.XXX, self.IMP, 5), ins("INX", self.INX, self.IMP, 2),
-            ins("SBC", self.SBC, self.IMM, 2), ins("NOP", self.NOP, self.IMP, 2), ins("???", self.SBC, self.IMP, 2),
-            ins("CPX", self.CPX, self.ABS, 4), ins("SBC", self.SBC, self.ABS, 4), ins("INC", self.INC, self.ABS, 6),
-            ins("???", self.XXX, self.IMP, 6),
-            ins("BEQ", self.BEQ, self.REL, 2), ins("SBC", self.SBC, self.IZY, 5), ins("???", self.XXX, self.IMP, 2),
-            ins("???", self.XXX, self.IMP, 8), ins("???", self.NOP, self.IMP, 4), ins("SBC", self.SBC, self.ZPX, 4),
-            ins("INC", self.INC, self.ZPX, 6), ins("???", self.XXX, self.IMP, 6), ins("SED", self.SED, self.IMP, 2),
-            ins("SBC", self.SBC, self.ABY, 4), ins("NOP", self.NOP, self.IMP, 2), ins("???", self.XXX, self.IMP, 7),
-            ins("???", self.NOP, self.IMP, 4), ins("SBC", self.SBC, self.ABX, 4), ins("INC", self.INC, self.ABX, 7),
-            ins("???", self.XXX, self.IMP, 7),
-        )
+        self.ram = _NO_RAM  # The bus's backing memory, internal RAM comes first
+        self.trace_sink = None  # Callable receiving a TraceRecord per instruction, None disables tracing
+        self.decode_cache = None  # DecodeCache for hot code, None decodes every instruction
+        self.interrupts = 0  # Pending NMI and asserted IRQ lines (INTERRUPT_NMI | IRQ_*), 0 is the fast path
+        self.nmi_cycle = 0  # Value of total_cycles when the NMI edge arrived
+        self.irq_cycle = 0  # Value of total_cycles when the IRQ line went down
+        self.stall_cycles = 0  # Cycles spent halted for DMA since power up
+        self.interrupts_taken = 0  # NMIs and IRQs entered since power up
+
+    # Register accessors, values are masked to the register width on assignment
+    @property
+    def acc_reg(self):
+        return self._acc
+
+    @acc_reg.setter
+    def acc_reg(self, value):
+        self._acc = int(value) & 0xFF
+
+    @property
+    def x_reg(self):
+        return self._x
+
+    @x_reg.setter
+    def x_reg(self, value):
+        self._x = int(value) & 0xFF
+
+    @property
+    def y_reg(self):
+        return self._y
+
+    @y_reg.setter
+    def y_reg(self, value):
+        self._y = int(value) & 0xFF
+
+    @property
+    def stkp(self):
+        return self._stkp
+
+    @stkp.setter
+    def stkp(self, value):
+        self._stkp = int(value) & 0xFF
+
+    @property
+    def pc(self):
+        return self._pc
+
+    @pc.setter
+    def pc(self, value):
+        self._pc = int(value) & 0xFFFF
+
+    @property
+    def status_reg(self):
+        return self._status
+
+    @status_reg.setter
+    def status_reg(self, value):
+        self._status = int(value) & 0xFF
 
     # 12 Addressing modes
     # Each addressing mode function returns an int indicating
@@ -140,72 +165,60 @@ class CPU:
         """IMP - Implied Addressing Mode
         Instruction doesn't operate on data, so no data is provided
         It might use accumulator register so that is fetched just in case"""
-        logging.debug("IMP addressing mode activated")
-        self.fetched = self.acc_reg  # consider moving into fetch method
+        self.fetched = self._acc  # consider moving into fetch method
         return 0
 
     def IMM(self):
         """IMM - Immediate Mode Addressing
         Data is supplied as a part of the instruction
         """
-        logging.debug("IMM addressing mode activated")
-        self.pc += 1
-        self.addr_abs = self.pc
+        self.addr_abs = self._pc
+        self._pc = (self._pc + 1) & 0xFFFF
         return 0
 
     def ZP0(self):
         """ZP0 - Zero Page Addressing"""
-        logging.debug("ZP0 addressing mode activated")
-        self.addr_abs = self.read_from_bus(self.pc)
-        self.pc += 1
-        self.addr_abs &= 0x00FF
+        self.addr_abs = self.read_from_bus(self._pc) & 0x00FF
+        self._pc = (self._pc + 1) & 0xFFFF
         return 0
 
     def ZPX(self):
         """ZPX - Zero Page Addressing with X Register Offset"""
-        logging.debug("ZPX addressing mode activated")
-        self.addr_abs = (self.read_from_bus(self.pc) + self.x_reg)
-        self.pc += 1
-        self.addr_abs &= 0x00FF
+        self.addr_abs = (self.read_from_bus(self._pc) + self._x) & 0x00FF
+        self._pc = (self._pc + 1) & 0xFFFF
         return 0
 
     def ZPY(self):
         """ZPY - Zero Page Addressing with Y Register Offset"""
-        logging.debug("ZPY addressing mode activated")
-        self.addr_abs = (self.read_from_bus(self.pc) + self.y_reg)
-        self.pc += 1
-        self.addr_abs &= 0x00FF
+        self.addr_abs = (self.read_from_bus(self._pc) + self._y) & 0x00FF
+        self._pc = (self._pc + 1) & 0xFFFF
         return 0
 
     def REL(self):
-        logging.debug("CPU.REL() - Relative addressing mode activated")
-        self.addr_rel = self.read_from_bus(self.pc)
-        self.pc += 1
+        """REL - Relative Addressing Mode (branches only)
+        The signed 8-bit offset is sign extended to 16 bits so it can be added to pc"""
+        self.addr_rel = self.read_from_bus(self._pc)
+        self._pc = (self._pc + 1) & 0xFFFF
         if self.addr_rel & 0x80:
             self.addr_rel |= 0xFF00
         return 0
 
     def ABS(self):
         """ABS - Absolute Addressing Mode"""
-        logging.debug("ABS addressing mode activated")
-        lo = self.read_from_bus(self.pc)
-        self.pc += 1
-        hi = self.read_from_bus(self.pc)
-        self.pc += 1
+        lo = self.read_from_bus(self._pc)
+        hi = self.read_from_bus((self._pc + 1) & 0xFFFF)
+        self._pc = (self._pc + 2) & 0xFFFF
 
         self.addr_abs = (hi << 8) | lo
         return 0
 
     def ABX(self):
         """ABX - Absolute Addressing with X Register Offset"""
-        logging.debug("ABX addressing mode activated")
-        lo = self.read_from_bus(self.pc)
-        self.pc += 1
-        hi = self.read_from_bus(self.pc)
-        self.pc += 1
+        lo = self.read_from_bus(self._pc)
+        hi = self.read_from_bus((self._pc + 1) & 0xFFFF)
+        self._pc = (self._pc + 2) & 0xFFFF
 
-        self.addr_abs = (hi << 8) | lo
-        self.addr_abs += self.x_reg
+        self.addr_abs = (((hi << 8) | lo) + self._x) & 0xFFFF
 
         if (self.addr_abs & 0xFF00) != (hi << 8):
             return 1
@@ -214,14 +227,11 @@ class CPU:
 
     def ABY(self):
         """ABY - Absolute Addressing with Y Register Offset"""
-        logging.debug("ABY addressing mode activated")
-        lo = self.read_from_bus(self.pc)
-        self.pc += 1
-        hi = self.read_from_bus(self.pc)
-        self.pc += 1
+        lo = self.read_from_bus(self._pc)
+        hi = self.read_from_bus((self._pc + 1) & 0xFFFF)
+        self._pc = (self._pc + 2) & 0xFFFF
 
-        self.addr_abs = (hi << 8) | lo
-        self.addr_abs += self.y_reg
+        self.addr_abs = (((hi << 8) | lo) + self._y) & 0xFFFF
 
         if (self.addr_abs & 0xFF00) != (hi << 8):
             return 1
@@ -230,28 +240,25 @@ class CPU:
 
     def IND(self):
         """IND - Indirect Addressing Mode"""
-        logging.debug("IND addressing mode activated")
-        ptr_lo = self.read_from_bus(self.pc)
-        self.pc += 1
-        ptr_hi = self.read_from_bus(self.pc)
-        self.pc += 1
+        ptr_lo = self.read_from_bus(self._pc)
+        ptr_hi = self.read_from_bus((self._pc + 1) & 0xFFFF)
+        self._pc = (self._pc + 2) & 0xFFFF
         ptr = (ptr_hi << 8) | ptr_lo
 
         if ptr_lo == 0x00FF:  # Simulate page boundary hardware bug
-            self.addr_abs = (self.read_from_bus(ptr & 0xFF00) << 8) | self.read_from_bus(ptr + 0)
+            self.addr_abs = (self.read_from_bus(ptr & 0xFF00) << 8) | self.read_from_bus(ptr)
         else:  # Behave normally
-            self.addr_abs = (self.read_from_bus(ptr + 1) << 8) | self.read_from_bus(ptr + 0)
+            self.addr_abs = (self.read_from_bus(ptr + 1) << 8) | self.read_from_bus(ptr)
 
         return 0
 
     def IZX(self):
         """IZX - Indirect Addressing of the Zero page with X Register Offset"""
-        logging.debug("IZX addressing mode activated")
-        t = self.read_from_bus(self.pc)
-        self.pc += 1
+        t = self.read_from_bus(self._pc)
+        self._pc = (self._pc + 1) & 0xFFFF
 
-        lo = self.read_from_bus(uint16(t + uint16(self.x_reg)) & 0x00FF)
-        hi = self.read_from_bus(uint16(t + uint16(self.x_reg) + 1) & 0x00FF)
+        lo = self.ram[(t + self._x) & 0x00FF]
+        hi = self.ram[(t + self._x + 1) & 0x00FF]
 
         self.addr_abs = (hi << 8) | lo
 
@@ -259,319 +266,578 @@ class CPU:
 
     def IZY(self):
         """IZY - Indirect Addressing of the Zero page with Y Register Offset"""
-        logging.debug("IZY addressing mode activated")
-        t = self.read_from_bus(self.pc)
-        self.pc += 1
+        t = self.read_from_bus(self._pc)
+        self._pc = (self._pc + 1) & 0xFFFF
 
-        lo = self.read_from_bus(t & 0x00FF)
-        hi = self.read_from_bus((t + 1) & 0x00FF)
+        lo = self.ram[t]
+        hi = self.ram[(t + 1) & 0x00FF]
 
-        self.addr_abs = (hi << 8) | lo
-        self.addr_abs += self.y_reg
+        self.addr_abs = (((hi << 8) | lo) + self._y) & 0xFFFF
 
         if (self.addr_abs & 0xFF00) != (hi << 8):
             return 1
         else:
             return 0
 
+    # Addressing modes for pre-decoded instructions (see nes_core.decode)
+    # They take the operand bytes already read and combined, instead of reading them through the bus.
+    # REL operands are stored sign extended, IMM operands are the address of the immediate byte
+    def resolve_IMP(self, operand):
+        self.fetched = self._acc
+        return 0
+
+    def resolve_IMM(self, operand):
+        self.addr_abs = operand
+        return 0
+
+    resolve_ZP0 = resolve_IMM
+    resolve_ABS = resolve_IMM
+
+    def resolve_ZPX(self, operand):
+        self.addr_abs = (operand + self._x) & 0x00FF
+        return 0
+
+    def resolve_ZPY(self, operand):
+        self.addr_abs = (operand + self._y) & 0x00FF
+        return 0
+
+    def resolve_REL(self, operand):
+        self.addr_rel = operand
         return 0
 
+    def resolve_ABX(self, operand):
+        self.addr_abs = (operand + self._x) & 0xFFFF
+        if (self.addr_abs & 0xFF00) != (operand & 0xFF00):
+            return 1
+        else:
+            return 0
+
+    def resolve_ABY(self, operand):
+        self.addr_abs = (operand + self._y) & 0xFFFF
+        if (self.addr_abs & 0xFF00) != (operand & 0xFF00):
+            return 1
+        else:
+            return 0
+
+    def resolve_IND(self, operand):
+        if operand & 0x00FF == 0x00FF:  # Simulate page boundary hardware bug
+            self.addr_abs = (self.read_from_bus(operand & 0xFF00) << 8) | self.read_from_bus(operand)
+        else:  # Behave normally
+            self.addr_abs = (self.read_from_bus(operand + 1) << 8) | self.read_from_bus(operand)
+        return 0
+
+    def resolve_IZX(self, operand):
+        lo = self.ram[(operand + self._x) & 0x00FF]
+        hi = self.ram[(operand + self._x + 1) & 0x00FF]
+        self.addr_abs = (hi << 8) | lo
+        return 0
+
+    def resolve_IZY(self, operand):
+        lo = self.ram[operand & 0x00FF]
+        hi = self.ram[(operand + 1) & 0x00FF]
+        self.addr_abs = (((hi << 8) | lo) + self._y) & 0xFFFF
+        if (self.addr_abs & 0xFF00) != (hi << 8):
+            return 1
+        else:
+            return 0
+
+    # Helpers shared by the operations
+    def set_zn(self, value: int):
+        """Sets Z and N from an 8-bit result"""
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[value]
+
+    def compare(self, register: int):
+        self._status = (self._status & NOT_NZC) | COMPARE_FLAGS[register << 8 | self.fetched]
+
+    def store_result(self, value: int):
+        """Writes the result of a shift or rotate back to the accumulator (implied mode) or to memory"""
+        if self.mode_lookup[self.opcode] == MODE_IMP:
+            self._acc = value
+        else:
+            self.write_memory(self.addr_abs, value)
+
+    def write_memory(self, address: int, data: int):
+        """Writes an operand, straight into internal RAM for zero page and stack addresses"""
+        if address < DIRECT_RAM_END:
+            self.ram[address] = data
+        else:
+            self.write_to_bus(address, data)
+
+    def push(self, data: int):
+        self.ram[STACK_PAGE + self._stkp] = data
+        self._stkp = (self._stkp - 1) & 0xFF
+
+    def pull(self):
+        self._stkp = (self._stkp + 1) & 0xFF
+        return self.ram[STACK_PAGE + self._stkp]
+
     # OPERATIONS
     def XXX(self):  # Illegal opcode handler
         return 0
 
-    def ADC(self):  # Add with carry
-        return 0
+    def ADC(self):
+        """Add with Carry --
+        a = a + fetched + C
+        V is set when both operands have the same sign and the result's sign differs from it"""
+        self.fetch()
+        value = self.fetched
+        carry = self._status & FLAG_C
+        self._status = (self._status & NOT_NVZC) | ADC_FLAGS[self._acc << 9 | value << 1 | carry]
+        self._acc = (self._acc + value + carry) & 0xFF
+        return 1
 
     def AND(self):
         """Logical AND
         Performs a logical AND operation between accumulator value and value fetched from memory
         a = a & fetched"""
         self.fetch()
-        self.acc_reg = self.acc_reg & self.fetched
-        # Set a Zero status flag if acc_reg == 0
-        if self.acc_reg == 0x00:
-            self.status_reg = self.status_reg & self.status_map['Z']
-        # Set a Negative flag if acc_reg has bit 7 on
-        if self.acc_reg & 0x80:
-            self.status_reg = self.status_reg & self.status_map['N']
-
+        self._acc = self._acc & self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._acc]
         return 1
 
-    def ASL(self):  # Arithmetic shift left
+    def ASL(self):
+        """Arithmetic Shift Left --
+        Shifts the accumulator or memory one bit left, bit 7 goes into C"""
+        self.fetch()
+        value = self.fetched
+        self._status = (self._status & NOT_NZC) | SHIFT_LEFT_FLAGS[value << 1]
+        self.store_result((value << 1) & 0xFF)
         return 0
 
     def BCC(self):
         """Branch if Carry Clear"""
-        if not self.status_reg & self.status_map['C']:
+        if not self._status & FLAG_C:
             self.cycles += 1
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def BCS(self):
         """Branch if Carry Bit is set to 1"""
-        if self.status_reg & self.status_map['C']:
+        if self._status & FLAG_C:
             self.cycles += 1
-            logging.debug("CPU.BCS() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):  # if page-related bits are not the same
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):  # if page-related bits are not the same
                 self.cycles += 1
-                logging.debug("CPU.BCS() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def BEQ(self):
         """Branch if Equal --
         If the zero flag is set then add the relative displacement to the program counter to cause a branch to a new
         location."""
-        if self.status_reg & self.status_map['Z']:
+        if self._status & FLAG_Z:
             self.cycles +=1
-            logging.debug("CPU.BEQ() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BEQ() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
-    def BIT(self):  # Bit  Test
+    def BIT(self):
+        """Bit Test --
+        Z is set from a & fetched, N and V are copied from bits 7 and 6 of fetched"""
+        self.fetch()
+        self._status = (self._status & NOT_NVZ) | BIT_FLAGS[self._acc << 8 | self.fetched]
         return 0
 
     def BMI(self):
         """Branch if Minus --
         If the negative flag is set then add the relative displacement to the program counter to cause a branch to a new
         location."""
-        if self.status_reg & self.status_map['N']:
+        if self._status & FLAG_N:
             self.cycles += 1
-            logging.debug("CPU.BMI() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BMI() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def BNE(self):
         """Branch if Not Equal --
         If the zero flag is clear then add the relative displacement to the program counter to cause a branch to a new
         location."""
-        if not self.status_reg & self.status_map['Z']:
+        if not self._status & FLAG_Z:
             self.cycles += 1
-            logging.debug("CPU.BNE() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BNE() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def BPL(self):
         """Branch if Positive --
         If the negative flag is clear then add the relative displacement to the program counter to cause a branch to a
         new location."""
-        if not self.status_reg & self.status_map['N']:
+        if not self._status & FLAG_N:
             self.cycles += 1
-            logging.debug("CPU.BPL() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BPL() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
-    def BRK(self):  # Force Interrupt (Break)
+    def BRK(self):
+        """Force Interrupt --
+        Pushes pc (past the padding byte after the opcode) and status with B set, then jumps through the IRQ vector"""
+        self.interrupt(IRQ_VECTOR, FLAG_B)
         return 0
 
     def BVC(self):
         """Branch if Overflow Clear --
         If the overflow flag is clear then add the relative displacement to the program counter to cause a branch to a
         new location."""
-        if not self.status_reg & self.status_map['V']:
+        if not self._status & FLAG_V:
             self.cycles += 1
-            logging.debug("CPU.BVC() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BVC() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def BVS(self):
         """Branch if Overflow Set --
         If the overflow flag is clear then add the relative displacement to the program counter to cause a branch to a
         new location."""
-        if self.status_reg & self.status_map['V']:
+        if self._status & FLAG_V:
             self.cycles += 1
-            logging.debug("CPU.BVS() - adding 1 CPU cycle")
-            new_addr = self.pc + self.addr_rel
+            new_addr = (self._pc + self.addr_rel) & 0xFFFF
 
-            if (new_addr & 0xFF00) != (self.pc & 0xFF00):
+            if (new_addr & 0xFF00) != (self._pc & 0xFF00):
                 self.cycles += 1
-                logging.debug("CPU.BVS() - adding 1 CPU cycle because of paging")
 
-            self.pc = new_addr
+            self._pc = new_addr
         return 0
 
     def CLC(self):
         """Clear Carry Flag --
         C = 0"""
-        if self.status_reg & self.status_map['C']:
-            self.status_reg ^= self.status_map['C']
+        if self._status & FLAG_C:
+            self._status ^= FLAG_C
         return 0
 
     def CLD(self):
         """Clear Decimal Mode Flag --
         D = 0"""
-        if self.status_reg & self.status_map['D']:
-            self.status_reg ^= self.status_map['D']
+        if self._status & FLAG_D:
+            self._status ^= FLAG_D
         return 0
 
     def CLI(self):  #
         """ Clear Interrupt Disable --
-        I = 0"""
-        if self.status_reg & self.status_map['I']:
-            self.status_reg ^= self.status_map['I']
+        I = 0
+        The interrupt poll happens before I changes, so a waiting IRQ is taken one instruction later"""
+        if self._status & FLAG_I:
+            self._status ^= FLAG_I
+            self.delay_irq()
         return 0
 
     def CLV(self):  #
         """Clear Overflow Flag --
         V = 0"""
-        if self.status_reg & self.status_map['V']:
-            self.status_reg ^= self.status_map['V']
+        if self._status & FLAG_V:
+            self._status ^= FLAG_V
         return 0
 
-    def CMP(self):  # Compare
-        return 0
+    def CMP(self):
+        """Compare --
+        C = a >= fetched, Z and N from a - fetched"""
+        self.fetch()
+        self.compare(self._acc)
+        return 1
 
-    def CPX(self):  # Compare X Register
+    def CPX(self):
+        """Compare X Register --
+        C = x >= fetched, Z and N from x - fetched"""
+        self.fetch()
+        self.compare(self._x)
         return 0
 
-    def CPY(self):  # Compare Y Register
+    def CPY(self):
+        """Compare Y Register --
+        C = y >= fetched, Z and N from y - fetched"""
+        self.fetch()
+        self.compare(self._y)
         return 0
 
-    def DEC(self):  # Decrement Memory
+    def DEC(self):
+        """Decrement Memory --
+        M = M - 1"""
+        self.fetch()
+        temp = (self.fetched - 1) & 0xFF
+        self.write_memory(self.addr_abs, temp)
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[temp]
         return 0
 
-    def DEX(self):  # Decrement X Register
+    def DEX(self):
+        """Decrement X Register --
+        x = x - 1"""
+        self._x = (self._x - 1) & 0xFF
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._x]
         return 0
 
-    def DEY(self):  # Decrement Y register
+    def DEY(self):
+        """Decrement Y Register --
+        y = y - 1"""
+        self._y = (self._y - 1) & 0xFF
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._y]
         return 0
 
-    def EOR(self):  # Exclusive OR
-        return 0
+    def EOR(self):
+        """Exclusive OR --
+        a = a ^ fetched"""
+        self.fetch()
+        self._acc = self._acc ^ self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._acc]
+        return 1
 
-    def INC(self):  # Increment Memory
+    def INC(self):
+        """Increment Memory --
+        M = M + 1"""
+        self.fetch()
+        temp = (self.fetched + 1) & 0xFF
+        self.write_memory(self.addr_abs, temp)
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[temp]
         return 0
 
-    def INX(self):  # Increment X Register
+    def INX(self):
+        """Increment X Register --
+        x = x + 1"""
+        self._x = (self._x + 1) & 0xFF
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._x]
         return 0
 
-    def INY(self):  # Increment Y Register
+    def INY(self):
+        """Increment Y Register --
+        y = y + 1"""
+        self._y = (self._y + 1) & 0xFF
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._y]
         return 0
 
-    def JMP(self):  # Jump
+    def JMP(self):
+        """Jump --
+        pc = address"""
+        self._pc = self.addr_abs
         return 0
 
-    def JSR(self):  # Jump to Subroutine
+    def JSR(self):
+        """Jump to Subroutine --
+        Pushes the address of the last byte of the instruction, then jumps"""
+        return_address = (self._pc - 1) & 0xFFFF
+        self.push(return_address >> 8)
+        self.push(return_address & 0xFF)
+        self._pc = self.addr_abs
         return 0
 
-    def LDA(self):  # Load Accumulator
-        return 0
+    def LDA(self):
+        """Load Accumulator --
+        a = fetched"""
+        self.fetch()
+        self._acc = self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._acc]
+        return 1
 
-    def LDX(self):  # Load X Register
-        return 0
+    def LDX(self):
+        """Load X Register --
+        x = fetched"""
+        self.fetch()
+        self._x = self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._x]
+        return 1
 
-    def LDY(self):  # Load Y register
-        return 0
+    def LDY(self):
+        """Load Y Register --
+        y = fetched"""
+        self.fetch()
+        self._y = self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._y]
+        return 1
 
-    def LSR(self):  # Logical Shift Right
+    def LSR(self):
+        """Logical Shift Right --
+        Shifts the accumulator or memory one bit right, bit 0 goes into C"""
+        self.fetch()
+        value = self.fetched
+        self._status = (self._status & NOT_NZC) | SHIFT_RIGHT_FLAGS[value << 1]
+        self.store_result(value >> 1)
         return 0
 
     def NOP(self):  # No Operation (for non-official opcodes)
         return 0
 
-    def ORA(self):  # Logical Inclusive OR
-        return 0
+    def ORA(self):
+        """Logical Inclusive OR --
+        a = a | fetched"""
+        self.fetch()
+        self._acc = self._acc | self.fetched
+        self._status = (self._status & NOT_NZ) | NZ_FLAGS[self._acc]
+        return 1
 
-    def PHA(self):  # Push Accumulator
+    def PHA(self):
+        """Push Accumulator --
+        a -> stack"""
+        self.push(self._acc)
         return 0
 
-    def PHP(self):  # Push Processor Status
+    def PHP(self):
+        """Push Processor Status --
+        status -> stack, with B and U set in the pushed copy"""
+        self.push(self._status | FLAG_B | FLAG_U)
         return 0
 
-    def PLA(self):  # Pull Accumulator
+    def PLA(self):
+        """Pull Accumulator --
+        stack -> a"""
+        self._acc = self.pull()
+        self.set_zn(self._acc)
         return 0
 
-    def PLP(self):  # Pull Processor Status
+    def PLP(self):
+        """Pull Processor Status --
+        stack -> status, B doesn't exist in the register and U always reads as 1.
+        Like CLI, clearing I only lets a waiting IRQ in after the next instruction"""
+        masked = self._status & FLAG_I
+        self._status = (self.pull() & ~FLAG_B & 0xFF) | FLAG_U
+        if masked and not self._status & FLAG_I:
+            self.delay_irq()
         return 0
 
-    def ROL(self):  # Rotate Left
+    def ROL(self):
+        """Rotate Left --
+        Rotates the accumulator or memory one bit left through C"""
+        self.fetch()
+        value = self.fetched
+        carry = self._status & FLAG_C
+        self._status = (self._status & NOT_NZC) | SHIFT_LEFT_FLAGS[value << 1 | carry]
+        self.store_result(((value << 1) | carry) & 0xFF)
         return 0
 
-    def ROR(self):  # Rotate Right
+    def ROR(self):
+        """Rotate Right --
+        Rotates the accumulator or memory one bit right through C"""
+        self.fetch()
+        value = self.fetched
+        carry = self._status & FLAG_C
+        self._status = (self._status & NOT_NZC) | SHIFT_RIGHT_FLAGS[value << 1 | carry]
+        self.store_result((carry << 7) | (value >> 1))
         return 0
 
-    def RTI(self):  # Return from Interrupt
+    def RTI(self):
+        """Return from Interrupt --
+        Pulls status, then pc"""
+        self._status = (self.pull() & ~FLAG_B & 0xFF) | FLAG_U
+        lo = self.pull()
+        self._pc = (self.pull() << 8) | lo
         return 0
 
-    def RTS(self):  # Return from subroutine
+    def RTS(self):
+        """Return from Subroutine --
+        Pulls pc and adds one to it"""
+        lo = self.pull()
+        self._pc = (((self.pull() << 8) | lo) + 1) & 0xFFFF
         return 0
 
-    def SBC(self):  # Substract with carry
-        return 0
+    def SBC(self):
+        """Subtract with Carry --
+        a = a - fetched - (1 - C), done as an addition of the inverted operand"""
+        self.fetch()
+        value = self.fetched ^ 0xFF
+        carry = self._status & FLAG_C
+        self._status = (self._status & NOT_NVZC) | ADC_FLAGS[self._acc << 9 | value << 1 | carry]
+        self._acc = (self._acc + value + carry) & 0xFF
+        return 1
 
-    def SEC(self):  # Set Carry Flag
+    def SEC(self):
+        """Set Carry Flag --
+        C = 1"""
+        self._status |= FLAG_C
         return 0
 
-    def SED(self):  # Set Decimal Flag
+    def SED(self):
+        """Set Decimal Flag --
+        D = 1"""
+        self._status |= FLAG_D
         return 0
 
-    def SEI(self):  # Set Interrupt Disable
+    def SEI(self):
+        """Set Interrupt Disable --
+        I = 1"""
+        self._status |= FLAG_I
         return 0
 
-    def STA(self):  # Store Accumulator
+    def STA(self):
+        """Store Accumulator --
+        M = a"""
+        self.write_memory(self.addr_abs, self._acc)
         return 0
 
-    def STX(self):  # Store Register X
+    def STX(self):
+        """Store X Register --
+        M = x"""
+        self.write_memory(self.addr_abs, self._x)
         return 0
 
-    def STY(self):  # Store Register Y
+    def STY(self):
+        """Store Y Register --
+        M = y"""
+        self.write_memory(self.addr_abs, self._y)
         return 0
 
-    def TAX(self):  # Transfer Accumulator to X
+    def TAX(self):
+        """Transfer Accumulator to X --
+        x = a"""
+        self._x = self._acc
+        self.set_zn(self._x)
         return 0
 
-    def TAY(self):  # Transfer Accumulator to Y
+    def TAY(self):
+        """Transfer Accumulator to Y --
+        y = a"""
+        self._y = self._acc
+        self.set_zn(self._y)
         return 0
 
-    def TSX(self):  # Transfer Stack Pointer to X
+    def TSX(self):
+        """Transfer Stack Pointer to X --
+        x = stkp"""
+        self._x = self._stkp
+        self.set_zn(self._x)
         return 0
 
-    def TXA(self):  # Transfer X to Accumulator
+    def TXA(self):
+        """Transfer X to Accumulator --
+        a = x"""
+        self._acc = self._x
+        self.set_zn(self._acc)
         return 0
 
-    def TXS(self):  # Transfer X to Stack Pointer
+    def TXS(self):
+        """Transfer X to Stack Pointer --
+        stkp = x, flags are left alone"""
+        self._stkp = self._x
         return 0
 
-    def TYA(self):  # Transfer Y to Accumulator
+    def TYA(self):
+        """Transfer Y to Accumulator --
+        a = y"""
+        self._acc = self._y
+        self.set_zn(self._acc)
         return 0
 
     # I/O methods
@@ -581,54 +847,352 @@ class CPU:
 
     def connect_bus(self, bus: Bus):
         self.bus = bus
+        self.ram = bus.ram
 
-    def write_to_bus(self, address: uint16, data: uint8):
+    def set_decode_cache(self, cache):
+        """Executes pre-decoded instructions from `cache` (a nes_core.decode.DecodeCache) where possible.
+        Passing None goes back to decoding every instruction"""
+        if self.decode_cache is not None and self.decode_cache is not cache:
+            self.decode_cache.detach()
+        self.decode_cache = cache
+
+    def set_trace_sink(self, sink):
+        """Enables per-instruction tracing into `sink` (any callable taking a TraceRecord).
+        Passing None turns tracing off again, leaving a single None check in clock()"""
+        self.trace_sink = sink
+
+    def write_to_bus(self, address: int, data: int):
         if self.bus is not None:
             self.bus.write(address, data)
         else:
             raise NoBusConnectedError
 
-    def read_from_bus(self, address: uint16):
+    def read_from_bus(self, address: int):
         if self.bus is not None:
             return self.bus.read(address, False)
         else:
             raise NoBusConnectedError
 
+    def execute(self):
+        """Decodes and executes the whole instruction at pc at once, or enters a due interrupt instead.
+        Sets and returns the number of cycles the instruction takes"""
+        if self.interrupts and self.poll_interrupts():
+            return self.cycles
+
+        if self.decode_cache is not None:
+            entry = self.decode_cache.entries[self._pc]
+            if entry is None:
+                entry = self.decode_cache.decode(self._pc)
+            if entry is not None:
+                opcode, operand, next_pc, handler = entry
+                self.opcode = opcode
+                if self.trace_sink is not None:
+                    self.trace_sink(TraceRecord(self._pc, opcode, self.instructions_lookup[opcode].mnemonic,
+                                                self._acc, self._x, self._y, self._status, self._stkp,
+                                                self.cycles_lookup[opcode], self.total_cycles))
+                self._pc = next_pc
+                self.cycles = self.cycles_lookup[opcode]
+                additional_cycles = handler(self, operand)
+                self.cycles += additional_cycles
+                return self.cycles
+
+        opcode = self.opcode = self.read_from_bus(self._pc)
+        if self.trace_sink is not None:
+            self.trace_sink(TraceRecord(self._pc, opcode, self.instructions_lookup[opcode].mnemonic, self._acc,
+                                        self._x, self._y, self._status, self._stkp, self.cycles_lookup[opcode],
+                                        self.total_cycles))
+        self._pc = (self._pc + 1) & 0xFFFF
+
+        # Get starting number of cycles, branches add theirs to it while executing
+        self.cycles = self.cycles_lookup[opcode]
+
+        # Address mode and operation can require additional cycles
+        additional_cycles = self.handler_lookup[opcode](self)
+        self.cycles += additional_cycles
+        return self.cycles
+
     def clock(self):
+        """Advances the CPU by a single cycle. Only needed when another chip has to stay in exact lockstep,
+        otherwise prefer run(), run_instructions() or run_until()"""
         if self.cycles == 0:
-            self.opcode = self.read_from_bus(self.pc)
-            self.pc += 1
-
-            instruction = self.instructions_lookup[self.opcode]
-            logging.debug(f'CPU.clock() - executing instruction {instruction.mnemonic}')
-
-            # Get starting number of cycles
-            self.cycles = instruction.cycles
-            logging.debug(f"CPU.clock() - setting cycles to: {instruction.cycles}")
-
-            # Address mode and operation can require additional cycles
-            additional_cycles_addr_mode = instruction.addr_mode()
-            additional_cycles_operation = instruction.operation()
-            logging.debug(f"CPU.clock() - adding {additional_cycles_addr_mode & additional_cycles_operation} additional cycles")
-            self.cycles += (additional_cycles_addr_mode & additional_cycles_operation)
+            self.execute()
 
         self.cycles -= 1
-        logging.debug(f"CPU.clock() - clock cycle finished. Remaining cycles: {self.cycles}")
+        self.total_cycles += 1
+
+    def run(self, cycles: int):
+        """Advances the CPU by exactly `cycles` cycles, the same as calling clock() that many times.
+        Whole instructions are executed in a tight loop; if the last one doesn't fit into the budget, its remaining
+        cycles are left pending exactly like clock() would. Returns the number of cycles run"""
+        if cycles <= 0:
+            return 0
+        remaining = cycles
+        pending = self.cycles
+        if pending:  # finish the instruction in flight first
+            if pending >= remaining:
+                self.cycles = pending - remaining
+                self.total_cycles += remaining
+                return cycles
+            remaining -= pending
+            self.total_cycles += pending
+
+        execute = self.execute
+        while True:
+            taken = execute()
+            if taken >= remaining:
+                self.cycles = taken - remaining
+                self.total_cycles += remaining
+                return cycles
+            remaining -= taken
+            self.total_cycles += taken
+
+    def run_instructions(self, count: int):
+        """Executes `count` whole instructions, after finishing the one in flight (if any).
+        Leaves the CPU on an instruction boundary and returns the number of cycles run"""
+        taken = self.cycles
+        self.total_cycles += taken
+        execute = self.execute
+        for _ in range(count):
+            cycles = execute()
+            self.total_cycles += cycles
+            taken += cycles
+        self.cycles = 0
+        return taken
+
+    def run_until(self, pc: int = None, cycles: int = None):
+        """Executes whole instructions until pc reaches `pc` on an instruction boundary, or until at least
+        `cycles` cycles have been run, whichever comes first. Returns the number of cycles run"""
+        if pc is None and cycles is None:
+            raise ValueError("run_until() needs a pc or a cycles limit")
+        if cycles is None:
+            cycles = float('inf')
+        taken = self.cycles
+        self.total_cycles += taken
+        execute = self.execute
+        while taken < cycles and self._pc != pc:
+            spent = execute()
+            self.total_cycles += spent
+            taken += spent
+        self.cycles = 0
+        return taken
 
     def illegal_opcode(self):
         pass
 
+    # Interrupts
+    # The CPU polls its interrupt lines at the end of each instruction's second to last cycle, and only sees a
+    # line change one cycle after it happened. A signal arriving while the CPU is at total_cycles = n is therefore
+    # first taken by the instruction boundary at n + 2 or later
     def reset(self):
-        pass
-
-    def irq(self):  # Interrupt request signal
-        pass
-
-    def nmi(self):  # Non maskable interrupt
-        pass
+        """Reset signal: loads pc from the reset vector, moves stkp down 3 like the pushes the reset sequence fakes
+        and sets I. Takes 7 cycles, left pending like an instruction in flight"""
+        self._stkp = (self._stkp - 3) & 0xFF
+        self._status |= FLAG_I | FLAG_U
+        self._pc = self.read_from_bus(RESET_VECTOR) | (self.read_from_bus(RESET_VECTOR + 1) << 8)
+        self.interrupts &= ~INTERRUPT_NMI & 0xFF
+        self.cycles = INTERRUPT_CYCLES
+
+    def irq(self, level: bool = True, source: int = IRQ_MAPPER):
+        """Sets (level True) or releases `source`'s hold on the level triggered IRQ line. An IRQ is taken on every
+        poll that finds the line down and I clear"""
+        if level:
+            if not self.interrupts & IRQ_LINES:
+                self.irq_cycle = self.total_cycles
+            self.interrupts |= source
+        else:
+            self.interrupts &= ~source & 0xFF
+
+    def nmi(self):
+        """Non maskable interrupt: latches an NMI edge, which is taken once"""
+        if not self.interrupts & INTERRUPT_NMI:
+            self.nmi_cycle = self.total_cycles
+            self.interrupts |= INTERRUPT_NMI
+
+    def stall(self, cycles: int):
+        """Halts the CPU for `cycles` cycles after the instruction being executed, for a DMA it started. Only valid
+        from within execute(), i.e. from a bus access"""
+        self.cycles += cycles
+        self.stall_cycles += cycles
+
+    def delay_irq(self):
+        """Keeps a waiting IRQ out until after the next instruction, for instructions clearing I"""
+        if self.interrupts & IRQ_LINES:
+            self.irq_cycle = max(self.irq_cycle, self.total_cycles + self.cycles - 1)
+
+    def poll_interrupts(self):
+        """Enters a due NMI, or IRQ when I is clear. Returns True if it did, with `cycles` set"""
+        interrupts = self.interrupts
+        if interrupts & INTERRUPT_NMI and self.nmi_cycle <= self.total_cycles - 2:
+            self.interrupts = interrupts & ~INTERRUPT_NMI & 0xFF
+            self.interrupt(NMI_VECTOR)
+        elif interrupts & IRQ_LINES and not self._status & FLAG_I and self.irq_cycle <= self.total_cycles - 2:
+            self.interrupt(IRQ_VECTOR)
+        else:
+            return False
+        self.cycles = INTERRUPT_CYCLES
+        self.interrupts_taken += 1
+        return True
+
+    def interrupt(self, vector: int, flags: int = 0):
+        """Interrupt sequence shared by NMI, IRQ and BRK: pushes pc and status (with U and `flags` set),
+        sets I and jumps through `vector`"""
+        self.push(self._pc >> 8)
+        self.push(self._pc & 0xFF)
+        self.push(self._status | FLAG_U | flags)
+        self._status |= FLAG_I
+        self._pc = self.read_from_bus(vector) | (self.read_from_bus(vector + 1) << 8)
+
+    # Save states
+    def get_state(self):
+        """Registers and timing as a tuple of ints, in the order set_state() takes them"""
+        return (self._pc, self._acc, self._x, self._y, self._stkp, self._status, self.opcode, self.cycles,
+                self.interrupts, self.total_cycles, self.nmi_cycle, self.irq_cycle)
+
+    def set_state(self, state):
+        (self._pc, self._acc, self._x, self._y, self._stkp, self._status, self.opcode, self.cycles,
+         self.interrupts, self.total_cycles, self.nmi_cycle, self.irq_cycle) = state
 
     def fetch(self):
-        if self.instructions_lookup[self.opcode].addr_mode is not self.IMP:
-            self.fetched = self.read_from_bus(self.addr_abs)
-            logging.debug(f'Fetched {self.fetched} from memory address {hex(self.addr_abs)}')
+        if self.mode_lookup[self.opcode] != MODE_IMP:
+            address = self.addr_abs
+            if address < DIRECT_RAM_END:
+                self.fetched = self.ram[address]
+            else:
+                self.fetched = self.read_from_bus(address)
         return self.fetched
+
+
+# Opcode table, indexed by opcode. Operations and addressing modes are plain functions taking the CPU.
+CPU.instructions_lookup = (
+    ins("BRK", CPU.BRK, CPU.IMM, 7), ins("ORA", CPU.ORA, CPU.IZX, 6), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 3), ins("ORA", CPU.ORA, CPU.ZP0, 3),
+    ins("ASL", CPU.ASL, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("PHP", CPU.PHP, CPU.IMP, 3),
+    ins("ORA", CPU.ORA, CPU.IMM, 2), ins("ASL", CPU.ASL, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("ORA", CPU.ORA, CPU.ABS, 4), ins("ASL", CPU.ASL, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BPL", CPU.BPL, CPU.REL, 2), ins("ORA", CPU.ORA, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("ORA", CPU.ORA, CPU.ZPX, 4),
+    ins("ASL", CPU.ASL, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("CLC", CPU.CLC, CPU.IMP, 2),
+    ins("ORA", CPU.ORA, CPU.ABY, 4), ins("???", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("ORA", CPU.ORA, CPU.ABX, 4), ins("ASL", CPU.ASL, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("JSR", CPU.JSR, CPU.ABS, 6), ins("AND", CPU.AND, CPU.IZX, 6), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("BIT", CPU.BIT, CPU.ZP0, 3), ins("AND", CPU.AND, CPU.ZP0, 3),
+    ins("ROL", CPU.ROL, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("PLP", CPU.PLP, CPU.IMP, 4),
+    ins("AND", CPU.AND, CPU.IMM, 2), ins("ROL", CPU.ROL, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("BIT", CPU.BIT, CPU.ABS, 4), ins("AND", CPU.AND, CPU.ABS, 4), ins("ROL", CPU.ROL, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BMI", CPU.BMI, CPU.REL, 2), ins("AND", CPU.AND, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("AND", CPU.AND, CPU.ZPX, 4),
+    ins("ROL", CPU.ROL, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("SEC", CPU.SEC, CPU.IMP, 2),
+    ins("AND", CPU.AND, CPU.ABY, 4), ins("???", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("AND", CPU.AND, CPU.ABX, 4), ins("ROL", CPU.ROL, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("RTI", CPU.RTI, CPU.IMP, 6), ins("EOR", CPU.EOR, CPU.IZX, 6), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 3), ins("EOR", CPU.EOR, CPU.ZP0, 3),
+    ins("LSR", CPU.LSR, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("PHA", CPU.PHA, CPU.IMP, 3),
+    ins("EOR", CPU.EOR, CPU.IMM, 2), ins("LSR", CPU.LSR, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("JMP", CPU.JMP, CPU.ABS, 3), ins("EOR", CPU.EOR, CPU.ABS, 4), ins("LSR", CPU.LSR, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BVC", CPU.BVC, CPU.REL, 2), ins("EOR", CPU.EOR, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("EOR", CPU.EOR, CPU.ZPX, 4),
+    ins("LSR", CPU.LSR, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("CLI", CPU.CLI, CPU.IMP, 2),
+    ins("EOR", CPU.EOR, CPU.ABY, 4), ins("???", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("EOR", CPU.EOR, CPU.ABX, 4), ins("LSR", CPU.LSR, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("RTS", CPU.RTS, CPU.IMP, 6), ins("ADC", CPU.ADC, CPU.IZX, 6), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 3), ins("ADC", CPU.ADC, CPU.ZP0, 3),
+    ins("ROR", CPU.ROR, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("PLA", CPU.PLA, CPU.IMP, 4),
+    ins("ADC", CPU.ADC, CPU.IMM, 2), ins("ROR", CPU.ROR, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("JMP", CPU.JMP, CPU.IND, 5), ins("ADC", CPU.ADC, CPU.ABS, 4), ins("ROR", CPU.ROR, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BVS", CPU.BVS, CPU.REL, 2), ins("ADC", CPU.ADC, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("ADC", CPU.ADC, CPU.ZPX, 4),
+    ins("ROR", CPU.ROR, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("SEI", CPU.SEI, CPU.IMP, 2),
+    ins("ADC", CPU.ADC, CPU.ABY, 4), ins("???", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("ADC", CPU.ADC, CPU.ABX, 4), ins("ROR", CPU.ROR, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 2), ins("STA", CPU.STA, CPU.IZX, 6), ins("???", CPU.NOP, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 6), ins("STY", CPU.STY, CPU.ZP0, 3), ins("STA", CPU.STA, CPU.ZP0, 3),
+    ins("STX", CPU.STX, CPU.ZP0, 3), ins("???", CPU.XXX, CPU.IMP, 3), ins("DEY", CPU.DEY, CPU.IMP, 2),
+    ins("???", CPU.NOP, CPU.IMP, 2), ins("TXA", CPU.TXA, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("STY", CPU.STY, CPU.ABS, 4), ins("STA", CPU.STA, CPU.ABS, 4), ins("STX", CPU.STX, CPU.ABS, 4),
+    ins("???", CPU.XXX, CPU.IMP, 4),
+    ins("BCC", CPU.BCC, CPU.REL, 2), ins("STA", CPU.STA, CPU.IZY, 6), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 6), ins("STY", CPU.STY, CPU.ZPX, 4), ins("STA", CPU.STA, CPU.ZPX, 4),
+    ins("STX", CPU.STX, CPU.ZPY, 4), ins("???", CPU.XXX, CPU.IMP, 4), ins("TYA", CPU.TYA, CPU.IMP, 2),
+    ins("STA", CPU.STA, CPU.ABY, 5), ins("TXS", CPU.TXS, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 5),
+    ins("???", CPU.NOP, CPU.IMP, 5), ins("STA", CPU.STA, CPU.ABX, 5), ins("???", CPU.XXX, CPU.IMP, 5),
+    ins("???", CPU.XXX, CPU.IMP, 5),
+    ins("LDY", CPU.LDY, CPU.IMM, 2), ins("LDA", CPU.LDA, CPU.IZX, 6), ins("LDX", CPU.LDX, CPU.IMM, 2),
+    ins("???", CPU.XXX, CPU.IMP, 6), ins("LDY", CPU.LDY, CPU.ZP0, 3), ins("LDA", CPU.LDA, CPU.ZP0, 3),
+    ins("LDX", CPU.LDX, CPU.ZP0, 3), ins("???", CPU.XXX, CPU.IMP, 3), ins("TAY", CPU.TAY, CPU.IMP, 2),
+    ins("LDA", CPU.LDA, CPU.IMM, 2), ins("TAX", CPU.TAX, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("LDY", CPU.LDY, CPU.ABS, 4), ins("LDA", CPU.LDA, CPU.ABS, 4), ins("LDX", CPU.LDX, CPU.ABS, 4),
+    ins("???", CPU.XXX, CPU.IMP, 4),
+    ins("BCS", CPU.BCS, CPU.REL, 2), ins("LDA", CPU.LDA, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 5), ins("LDY", CPU.LDY, CPU.ZPX, 4), ins("LDA", CPU.LDA, CPU.ZPX, 4),
+    ins("LDX", CPU.LDX, CPU.ZPY, 4), ins("???", CPU.XXX, CPU.IMP, 4), ins("CLV", CPU.CLV, CPU.IMP, 2),
+    ins("LDA", CPU.LDA, CPU.ABY, 4), ins("TSX", CPU.TSX, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 4),
+    ins("LDY", CPU.LDY, CPU.ABX, 4), ins("LDA", CPU.LDA, CPU.ABX, 4), ins("LDX", CPU.LDX, CPU.ABY, 4),
+    ins("???", CPU.XXX, CPU.IMP, 4),
+    ins("CPY", CPU.CPY, CPU.IMM, 2), ins("CMP", CPU.CMP, CPU.IZX, 6), ins("???", CPU.NOP, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("CPY", CPU.CPY, CPU.ZP0, 3), ins("CMP", CPU.CMP, CPU.ZP0, 3),
+    ins("DEC", CPU.DEC, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("INY", CPU.INY, CPU.IMP, 2),
+    ins("CMP", CPU.CMP, CPU.IMM, 2), ins("DEX", CPU.DEX, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("CPY", CPU.CPY, CPU.ABS, 4), ins("CMP", CPU.CMP, CPU.ABS, 4), ins("DEC", CPU.DEC, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BNE", CPU.BNE, CPU.REL, 2), ins("CMP", CPU.CMP, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("CMP", CPU.CMP, CPU.ZPX, 4),
+    ins("DEC", CPU.DEC, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("CLD", CPU.CLD, CPU.IMP, 2),
+    ins("CMP", CPU.CMP, CPU.ABY, 4), ins("NOP", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("CMP", CPU.CMP, CPU.ABX, 4), ins("DEC", CPU.DEC, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("CPX", CPU.CPX, CPU.IMM, 2), ins("SBC", CPU.SBC, CPU.IZX, 6), ins("???", CPU.NOP, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("CPX", CPU.CPX, CPU.ZP0, 3), ins("SBC", CPU.SBC, CPU.ZP0, 3),
+    ins("INC", CPU.INC, CPU.ZP0, 5), ins("???", CPU.XXX, CPU.IMP, 5), ins("INX", CPU.INX, CPU.IMP, 2),
+    ins("SBC", CPU.SBC, CPU.IMM, 2), ins("NOP", CPU.NOP, CPU.IMP, 2), ins("???", CPU.SBC, CPU.IMP, 2),
+    ins("CPX", CPU.CPX, CPU.ABS, 4), ins("SBC", CPU.SBC, CPU.ABS, 4), ins("INC", CPU.INC, CPU.ABS, 6),
+    ins("???", CPU.XXX, CPU.IMP, 6),
+    ins("BEQ", CPU.BEQ, CPU.REL, 2), ins("SBC", CPU.SBC, CPU.IZY, 5), ins("???", CPU.XXX, CPU.IMP, 2),
+    ins("???", CPU.XXX, CPU.IMP, 8), ins("???", CPU.NOP, CPU.IMP, 4), ins("SBC", CPU.SBC, CPU.ZPX, 4),
+    ins("INC", CPU.INC, CPU.ZPX, 6), ins("???", CPU.XXX, CPU.IMP, 6), ins("SED", CPU.SED, CPU.IMP, 2),
+    ins("SBC", CPU.SBC, CPU.ABY, 4), ins("NOP", CPU.NOP, CPU.IMP, 2), ins("???", CPU.XXX, CPU.IMP, 7),
+    ins("???", CPU.NOP, CPU.IMP, 4), ins("SBC", CPU.SBC, CPU.ABX, 4), ins("INC", CPU.INC, CPU.ABX, 7),
+    ins("???", CPU.XXX, CPU.IMP, 7),
+)
+
+# Flat dispatch tables derived once from instructions_lookup and shared by every CPU instance
+ADDRESSING_MODES = ('IMP', 'IMM', 'ZP0', 'ZPX', 'ZPY', 'REL', 'ABS', 'ABX', 'ABY', 'IND', 'IZX', 'IZY')
+OPERATIONS = tuple(sorted({instruction.operation.__name__ for instruction in CPU.instructions_lookup}))
+MODE_IMP = ADDRESSING_MODES.index('IMP')
+
+
+def _fuse(addr_mode, operation):
+    """Builds one handler running an addressing mode and an operation, returning the additional cycles"""
+    def handler(cpu):
+        return addr_mode(cpu) & operation(cpu)
+    handler.__name__ = f'{operation.__name__}_{addr_mode.__name__}'
+    return handler
+
+
+CPU.cycles_lookup = tuple(instruction.cycles for instruction in CPU.instructions_lookup)
+CPU.mode_lookup = tuple(ADDRESSING_MODES.index(instruction.addr_mode.__name__)
+                        for instruction in CPU.instructions_lookup)
+CPU.operation_lookup = tuple(OPERATIONS.index(instruction.operation.__name__)
+                             for instruction in CPU.instructions_lookup)
+CPU.handler_lookup = tuple(_fuse(instruction.addr_mode, instruction.operation)
+                           for instruction in CPU.instructions_lookup)
+
+
+def _fuse_decoded(resolve, operation):
+    """Same as _fuse, for an instruction whose operand has already been decoded"""
+    def handler(cpu, operand):
+        return resolve(cpu, operand) & operation(cpu)
+    handler.__name__ = f'{operation.__name__}_{resolve.__name__}'
+    return handler
+
+
+CPU.decoded_handler_lookup = tuple(_fuse_decoded(getattr(CPU, 'resolve_' + instruction.addr_mode.__name__),
+                                                 instruction.operation)
+                                   for instruction in CPU.instructions_lookup)
@@ -0,0 +1,88 @@
+from .cpu import CPU, ADDRESSING_MODES
+
+# Bytes taken by an instruction (opcode included) for each addressing mode id
+INSTRUCTION_LENGTHS = tuple({'IMP': 1, 'ABS': 3, 'ABX': 3, 'ABY': 3, 'IND': 3}.get(mode, 2)
+                            for mode in ADDRESSING_MODES)
+MODE_IMM = ADDRESSING_MODES.index('IMM')
+MODE_REL = ADDRESSING_MODES.index('REL')
+
+# Internal RAM is mirrored four times, a write through one mirror can't be seen from the others' pages,
+# so code running there is always decoded on the fly
+FIRST_CACHED_ADDRESS = 0x2000
+
+
+class DecodeCache:
+    """Pre-decoded instructions keyed by pc.
+    Each entry is (opcode, operand, next pc, handler), where handler is the opcode's entry in
+    CPU.decoded_handler_lookup. Entries are dropped when the bus remaps or reloads their page (mapper bank switches).
+    Pages of writable memory holding cached code get their direct write entry swapped for a trap, so the first write
+    to such a page (self-modifying or freshly copied code) drops its entries before it lands."""
+    def __init__(self, bus):
+        self.bus = bus
+        self.entries = [None] * 0x10000
+        self.cached_pages = bytearray(0x100)  # pages with at least one entry
+        self.trapped_writes = {}  # page -> the write entry the trap replaced
+        bus.page_listeners.append(self.invalidate_pages)
+
+    def decode(self, pc: int):
+        """Decodes the instruction at `pc` into a cache entry. Returns None if it can't be cached"""
+        bus = self.bus
+        if pc < FIRST_CACHED_ADDRESS or bus.read_pages[pc >> 8] is None:
+            return None
+        opcode = bus.read(pc)
+        mode = CPU.mode_lookup[opcode]
+        length = INSTRUCTION_LENGTHS[mode]
+        if (pc & 0xFF) + length > 0x100:  # operand spills into the next page
+            return None
+
+        if mode == MODE_IMM:
+            operand = pc + 1
+        elif length == 2:
+            operand = bus.read(pc + 1)
+            if mode == MODE_REL and operand & 0x80:
+                operand |= 0xFF00
+        elif length == 3:
+            operand = bus.read(pc + 1) | (bus.read(pc + 2) << 8)
+        else:
+            operand = 0
+
+        return self.store(pc, (opcode, operand, (pc + length) & 0xFFFF, CPU.decoded_handler_lookup[opcode]))
+
+    def store(self, pc: int, entry):
+        """Caches `entry` for `pc`, which must only depend on memory in pc's own page"""
+        page = pc >> 8
+        bus = self.bus
+        self.entries[pc] = entry
+        if not self.cached_pages[page]:
+            self.cached_pages[page] = 1
+            if bus.write_pages[page] is not None:
+                self.trapped_writes[page] = (bus.write_pages[page], bus.write_handlers[page])
+                bus.write_pages[page] = None
+                bus.write_handlers[page] = self.trapped_write
+        return entry
+
+    def trapped_write(self, address: int, data: int):
+        page = address >> 8
+        view = self.trapped_writes[page][0]
+        self.invalidate_pages(page, page)
+        view[address & 0xFF] = data
+
+    def invalidate_pages(self, first_page: int, last_page: int):
+        bus = self.bus
+        for page in range(first_page, last_page + 1):
+            if not self.cached_pages[page]:
+                continue
+            self.cached_pages[page] = 0
+            self.entries[page << 8:(page + 1) << 8] = [None] * 0x100
+            saved = self.trapped_writes.pop(page, None)
+            # a remap already replaced the trap, only put the old entry back if the trap is still there
+            if saved is not None and bus.write_pages[page] is None and bus.write_handlers[page] == self.trapped_write:
+                bus.write_pages[page], bus.write_handlers[page] = saved
+
+    def invalidate(self):
+        self.invalidate_pages(0x00, 0xFF)
+
+    def detach(self):
+        """Drops every entry, removes the write traps and stops listening to the bus"""
+        self.invalidate()
+        self.bus.page_listeners.remove(self.invalidate_pages)
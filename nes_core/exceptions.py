@@ -4,3 +4,15 @@ class NoBusConnectedError(BaseException):
 
 class AddressOutOfBoundsError(ValueError):
     pass
+
+
+class InvalidRomError(ValueError):
+    pass
+
+
+class UnsupportedMapperError(NotImplementedError):
+    pass
+
+
+class SaveStateError(ValueError):
+    pass
@@ -0,0 +1,401 @@
+import numpy as np
+from .cpu import CPU, ADDRESSING_MODES, FLAG_C, FLAG_Z, FLAG_I, FLAG_D, FLAG_B, FLAG_U, FLAG_V, FLAG_N, STACK_PAGE, \
+    IRQ_VECTOR, NZ_FLAGS, ADC_FLAGS, COMPARE_FLAGS, SHIFT_LEFT_FLAGS, SHIFT_RIGHT_FLAGS, BIT_FLAGS, NOT_NZ, NOT_NZC, \
+    NOT_NVZ, NOT_NVZC
+from .bus import RAM_SIZE, PAGE_COUNT, INTERNAL_RAM_SIZE
+
+# Operations adding a cycle when their addressing mode crosses a page, like the CPU ones returning 1
+PAGE_PENALTY_OPERATIONS = {'ADC', 'AND', 'CMP', 'EOR', 'LDA', 'LDX', 'LDY', 'ORA', 'SBC'}
+# Branches and the flag they test: (flag, branch when set)
+BRANCHES = {'BCC': (FLAG_C, False), 'BCS': (FLAG_C, True), 'BEQ': (FLAG_Z, True), 'BNE': (FLAG_Z, False),
+            'BMI': (FLAG_N, True), 'BPL': (FLAG_N, False), 'BVC': (FLAG_V, False), 'BVS': (FLAG_V, True)}
+# Flag changes of the flag instructions: (bits, set)
+FLAG_OPERATIONS = {'CLC': (FLAG_C, False), 'CLD': (FLAG_D, False), 'CLI': (FLAG_I, False), 'CLV': (FLAG_V, False),
+                   'SEC': (FLAG_C, True), 'SED': (FLAG_D, True), 'SEI': (FLAG_I, True)}
+MIRRORED_RAM_END = 0x2000  # internal RAM is mirrored every 2 KiB up to here
+# The CPU's flag tables, gathered from with a lane's index into them
+NZ_TABLE = np.frombuffer(NZ_FLAGS, dtype=np.uint8)
+ADC_TABLE = np.frombuffer(ADC_FLAGS, dtype=np.uint8)
+COMPARE_TABLE = np.frombuffer(COMPARE_FLAGS, dtype=np.uint8)
+SHIFT_LEFT_TABLE = np.frombuffer(SHIFT_LEFT_FLAGS, dtype=np.uint8)
+SHIFT_RIGHT_TABLE = np.frombuffer(SHIFT_RIGHT_FLAGS, dtype=np.uint8)
+BIT_TABLE = np.frombuffer(BIT_FLAGS, dtype=np.uint8)
+
+
+class Fleet:
+    """N independent CPUs stepped together, for running many copies of the same program with different inputs.
+    Registers are NumPy arrays with one lane per CPU (held as int64 and masked like the CPU's plain ints), and each
+    lane has its own 64 KiB of memory, a row of `memory`. step() fetches every lane's opcode, groups the lanes by it
+    and runs each group's instruction once, vectorized over the group, so the interpreter overhead is paid per
+    distinct opcode instead of per lane.
+
+    Results match CPU instruction for instruction and cycle for cycle. Memory is plain memory though: pages that
+    are devices on the bus a fleet is copied from read as 0 and ignore writes, and `device_access` records which lanes
+    touched one (from there on their results are no longer the CPU's). Read-only pages (PRG ROM) ignore writes, and
+    there are no interrupts besides BRK."""
+    def __init__(self, size: int):
+        self.size = size
+        self.memory = np.zeros((size, RAM_SIZE), dtype=np.uint8)
+        self.pc = np.zeros(size, dtype=np.int64)
+        self.a = np.zeros(size, dtype=np.int64)
+        self.x = np.zeros(size, dtype=np.int64)
+        self.y = np.zeros(size, dtype=np.int64)
+        self.stkp = np.zeros(size, dtype=np.int64)
+        self.status = np.zeros(size, dtype=np.int64)
+        self.total_cycles = np.zeros(size, dtype=np.int64)
+        self.device_access = np.zeros(size, dtype=bool)
+        # Per page: writable, and whether it is a device the fleet can't emulate
+        self.writable_pages = np.ones(PAGE_COUNT, dtype=bool)
+        self.device_pages = np.zeros(PAGE_COUNT, dtype=bool)
+        # Address every address really lands on, folding the internal RAM mirrors onto $0000-$07FF
+        self.address_map = np.arange(RAM_SIZE, dtype=np.int64)
+        self.address_map[:MIRRORED_RAM_END] &= INTERNAL_RAM_SIZE - 1
+
+    @classmethod
+    def from_cpu(cls, cpu, size: int):
+        """A fleet of `size` copies of `cpu` and the memory its bus currently shows"""
+        fleet = cls(size)
+        bus = cpu.bus
+        # pages a decode cache trapped have no direct write entry but are still the memory the trap saved
+        trapped_writes = cpu.decode_cache.trapped_writes if cpu.decode_cache is not None else {}
+        image = np.zeros(RAM_SIZE, dtype=np.uint8)
+        for page in range(PAGE_COUNT):
+            view = bus.read_pages[page]
+            if view is None:
+                fleet.device_pages[page] = True
+            else:
+                image[page << 8:(page + 1) << 8] = np.frombuffer(view, dtype=np.uint8)
+            fleet.writable_pages[page] = bus.write_pages[page] is not None or page in trapped_writes
+        fleet.memory[:] = image
+        fleet.pc[:] = cpu.pc
+        fleet.a[:] = cpu.acc_reg
+        fleet.x[:] = cpu.x_reg
+        fleet.y[:] = cpu.y_reg
+        fleet.stkp[:] = cpu.stkp
+        fleet.status[:] = cpu.status_reg
+        fleet.total_cycles[:] = cpu.total_cycles + cpu.cycles
+        return fleet
+
+    def load(self, address: int, data, lanes=None):
+        """Copies `data` into the memory of `lanes` (all by default) starting at `address`"""
+        data = np.frombuffer(bytes(data), dtype=np.uint8)
+        self.memory[slice(None) if lanes is None else lanes, address:address + len(data)] = data
+
+    # Running
+    def step(self, lanes=None):
+        """Executes one instruction on every lane, or on the lanes selected by boolean mask `lanes`"""
+        lanes = np.arange(self.size) if lanes is None else np.flatnonzero(lanes)
+        if not len(lanes):
+            return
+        opcodes = self.read(lanes, self.pc[lanes])
+        if (opcodes == opcodes[0]).all():
+            self.execute(int(opcodes[0]), lanes)
+            return
+        order = np.argsort(opcodes, kind='stable')
+        lanes, opcodes = lanes[order], opcodes[order]
+        starts = np.flatnonzero(np.diff(opcodes, prepend=-1))
+        for start, end in zip(starts, np.append(starts[1:], len(lanes))):
+            self.execute(int(opcodes[start]), lanes[start:end])
+
+    def run(self, instructions: int):
+        """Executes `instructions` instructions on every lane"""
+        for _ in range(instructions):
+            self.step()
+
+    def run_until(self, cycles: int):
+        """Executes whole instructions on each lane until it has run at least `cycles` cycles in total. Lanes that
+        get there first are masked out while the others catch up"""
+        while True:
+            behind = self.total_cycles < cycles
+            if not behind.any():
+                return
+            self.step(behind)
+
+    def execute(self, opcode: int, lanes):
+        """Executes `opcode` on `lanes` (an index array), all of which have it at their pc"""
+        mode = ADDRESSING_MODES[CPU.mode_lookup[opcode]]
+        operation = CPU.instructions_lookup[opcode].operation.__name__
+        pc = self.pc[lanes] + 1
+        address, crossed, pc = getattr(self, 'mode_' + mode)(lanes, pc & 0xFFFF)
+        self.pc[lanes] = pc & 0xFFFF
+        cycles = CPU.cycles_lookup[opcode]
+        if crossed is not None and operation in PAGE_PENALTY_OPERATIONS:
+            cycles = cycles + crossed
+        if operation in BRANCHES:
+            flag, when_set = BRANCHES[operation]
+            cycles = cycles + self.branch(lanes, address, (self.status[lanes] & flag != 0) == when_set)
+        elif operation in FLAG_OPERATIONS:
+            bits, set_bits = FLAG_OPERATIONS[operation]
+            self.status[lanes] = self.status[lanes] | bits if set_bits else self.status[lanes] & ~bits
+        else:
+            getattr(self, operation)(lanes, mode, address)
+        self.total_cycles[lanes] += cycles
+
+    # Memory
+    def read(self, lanes, address):
+        address = self.address_map[address]
+        if self.device_pages.any():
+            self.device_access[lanes] |= self.device_pages[address >> 8]
+        return self.memory[lanes, address].astype(np.int64)
+
+    def write(self, lanes, address, data):
+        address = self.address_map[address]
+        page = address >> 8
+        if self.device_pages.any():
+            self.device_access[lanes] |= self.device_pages[page]
+        allowed = self.writable_pages[page]
+        if not allowed.all():
+            lanes, address, data = lanes[allowed], address[allowed], data[allowed]
+        self.memory[lanes, address] = data
+
+    def fetch(self, lanes, mode, address):
+        return self.a[lanes] if mode == 'IMP' else self.read(lanes, address)
+
+    def push(self, lanes, data):
+        stkp = self.stkp[lanes]
+        self.write(lanes, STACK_PAGE + stkp, data)
+        self.stkp[lanes] = (stkp - 1) & 0xFF
+
+    def pull(self, lanes):
+        stkp = (self.stkp[lanes] + 1) & 0xFF
+        self.stkp[lanes] = stkp
+        return self.read(lanes, STACK_PAGE + stkp)
+
+    def set_zn(self, lanes, value):
+        self.status[lanes] = (self.status[lanes] & NOT_NZ) | NZ_TABLE[value]
+
+    def store_result(self, lanes, mode, address, value):
+        if mode == 'IMP':
+            self.a[lanes] = value
+        else:
+            self.write(lanes, address, value)
+
+    def branch(self, lanes, offset, taken):
+        """Moves the lanes where `taken` by `offset`, returns the extra cycles of each lane"""
+        pc = self.pc[lanes]
+        target = (pc + offset) & 0xFFFF
+        self.pc[lanes] = np.where(taken, target, pc)
+        return taken * (1 + ((target & 0xFF00) != (pc & 0xFF00)))
+
+    # Addressing modes, taking the lanes and their pc past the opcode.
+    # Return the address (or REL offset), which lanes crossed a page (None if the mode can't) and the new pc
+    def mode_IMP(self, lanes, pc):
+        return None, None, pc
+
+    def mode_IMM(self, lanes, pc):
+        return pc, None, pc + 1
+
+    def mode_ZP0(self, lanes, pc):
+        return self.read(lanes, pc), None, pc + 1
+
+    def mode_ZPX(self, lanes, pc):
+        return (self.read(lanes, pc) + self.x[lanes]) & 0xFF, None, pc + 1
+
+    def mode_ZPY(self, lanes, pc):
+        return (self.read(lanes, pc) + self.y[lanes]) & 0xFF, None, pc + 1
+
+    def mode_REL(self, lanes, pc):
+        offset = self.read(lanes, pc)
+        return np.where(offset & 0x80, offset | 0xFF00, offset), None, pc + 1
+
+    def absolute(self, lanes, pc):
+        return self.read(lanes, pc) | (self.read(lanes, (pc + 1) & 0xFFFF) << 8)
+
+    def mode_ABS(self, lanes, pc):
+        return self.absolute(lanes, pc), None, pc + 2
+
+    def mode_ABX(self, lanes, pc):
+        base = self.absolute(lanes, pc)
+        address = (base + self.x[lanes]) & 0xFFFF
+        return address, (address & 0xFF00) != (base & 0xFF00), pc + 2
+
+    def mode_ABY(self, lanes, pc):
+        base = self.absolute(lanes, pc)
+        address = (base + self.y[lanes]) & 0xFFFF
+        return address, (address & 0xFF00) != (base & 0xFF00), pc + 2
+
+    def mode_IND(self, lanes, pc):
+        pointer = self.absolute(lanes, pc)
+        high = np.where(pointer & 0xFF == 0xFF, pointer & 0xFF00, pointer + 1)  # page boundary bug
+        return self.read(lanes, pointer) | (self.read(lanes, high) << 8), None, pc + 2
+
+    def mode_IZX(self, lanes, pc):
+        pointer = self.read(lanes, pc) + self.x[lanes]
+        return self.read(lanes, pointer & 0xFF) | (self.read(lanes, (pointer + 1) & 0xFF) << 8), None, pc + 1
+
+    def mode_IZY(self, lanes, pc):
+        pointer = self.read(lanes, pc)
+        base = self.read(lanes, pointer) | (self.read(lanes, (pointer + 1) & 0xFF) << 8)
+        address = (base + self.y[lanes]) & 0xFFFF
+        return address, (address & 0xFF00) != (base & 0xFF00), pc + 1
+
+    # Operations, see the CPU ones for what they do
+    def XXX(self, lanes, mode, address):
+        pass
+
+    NOP = XXX
+
+    def add(self, lanes, value):
+        a = self.a[lanes]
+        status = self.status[lanes]
+        carry = status & FLAG_C
+        self.status[lanes] = (status & NOT_NVZC) | ADC_TABLE[a << 9 | value << 1 | carry]
+        self.a[lanes] = (a + value + carry) & 0xFF
+
+    def ADC(self, lanes, mode, address):
+        self.add(lanes, self.fetch(lanes, mode, address))
+
+    def SBC(self, lanes, mode, address):
+        self.add(lanes, self.fetch(lanes, mode, address) ^ 0xFF)
+
+    def AND(self, lanes, mode, address):
+        self.a[lanes] &= self.fetch(lanes, mode, address)
+        self.set_zn(lanes, self.a[lanes])
+
+    def ORA(self, lanes, mode, address):
+        self.a[lanes] |= self.fetch(lanes, mode, address)
+        self.set_zn(lanes, self.a[lanes])
+
+    def EOR(self, lanes, mode, address):
+        self.a[lanes] ^= self.fetch(lanes, mode, address)
+        self.set_zn(lanes, self.a[lanes])
+
+    def ASL(self, lanes, mode, address):
+        value = self.fetch(lanes, mode, address)
+        self.status[lanes] = (self.status[lanes] & NOT_NZC) | SHIFT_LEFT_TABLE[value << 1]
+        self.store_result(lanes, mode, address, (value << 1) & 0xFF)
+
+    def LSR(self, lanes, mode, address):
+        value = self.fetch(lanes, mode, address)
+        self.status[lanes] = (self.status[lanes] & NOT_NZC) | SHIFT_RIGHT_TABLE[value << 1]
+        self.store_result(lanes, mode, address, value >> 1)
+
+    def ROL(self, lanes, mode, address):
+        value = self.fetch(lanes, mode, address)
+        carry = self.status[lanes] & FLAG_C
+        self.status[lanes] = (self.status[lanes] & NOT_NZC) | SHIFT_LEFT_TABLE[value << 1 | carry]
+        self.store_result(lanes, mode, address, ((value << 1) | carry) & 0xFF)
+
+    def ROR(self, lanes, mode, address):
+        value = self.fetch(lanes, mode, address)
+        carry = self.status[lanes] & FLAG_C
+        self.status[lanes] = (self.status[lanes] & NOT_NZC) | SHIFT_RIGHT_TABLE[value << 1 | carry]
+        self.store_result(lanes, mode, address, (carry << 7) | (value >> 1))
+
+    def BIT(self, lanes, mode, address):
+        value = self.fetch(lanes, mode, address)
+        self.status[lanes] = (self.status[lanes] & NOT_NVZ) | BIT_TABLE[self.a[lanes] << 8 | value]
+
+    def compare(self, lanes, register, mode, address):
+        value = self.fetch(lanes, mode, address)
+        self.status[lanes] = (self.status[lanes] & NOT_NZC) | COMPARE_TABLE[register << 8 | value]
+
+    def CMP(self, lanes, mode, address):
+        self.compare(lanes, self.a[lanes], mode, address)
+
+    def CPX(self, lanes, mode, address):
+        self.compare(lanes, self.x[lanes], mode, address)
+
+    def CPY(self, lanes, mode, address):
+        self.compare(lanes, self.y[lanes], mode, address)
+
+    def DEC(self, lanes, mode, address):
+        value = (self.fetch(lanes, mode, address) - 1) & 0xFF
+        self.write(lanes, address, value)
+        self.set_zn(lanes, value)
+
+    def INC(self, lanes, mode, address):
+        value = (self.fetch(lanes, mode, address) + 1) & 0xFF
+        self.write(lanes, address, value)
+        self.set_zn(lanes, value)
+
+    def load_register(self, register, lanes, value):
+        register[lanes] = value
+        self.set_zn(lanes, value)
+
+    def LDA(self, lanes, mode, address):
+        self.load_register(self.a, lanes, self.fetch(lanes, mode, address))
+
+    def LDX(self, lanes, mode, address):
+        self.load_register(self.x, lanes, self.fetch(lanes, mode, address))
+
+    def LDY(self, lanes, mode, address):
+        self.load_register(self.y, lanes, self.fetch(lanes, mode, address))
+
+    def DEX(self, lanes, mode, address):
+        self.load_register(self.x, lanes, (self.x[lanes] - 1) & 0xFF)
+
+    def DEY(self, lanes, mode, address):
+        self.load_register(self.y, lanes, (self.y[lanes] - 1) & 0xFF)
+
+    def INX(self, lanes, mode, address):
+        self.load_register(self.x, lanes, (self.x[lanes] + 1) & 0xFF)
+
+    def INY(self, lanes, mode, address):
+        self.load_register(self.y, lanes, (self.y[lanes] + 1) & 0xFF)
+
+    def TAX(self, lanes, mode, address):
+        self.load_register(self.x, lanes, self.a[lanes])
+
+    def TAY(self, lanes, mode, address):
+        self.load_register(self.y, lanes, self.a[lanes])
+
+    def TSX(self, lanes, mode, address):
+        self.load_register(self.x, lanes, self.stkp[lanes])
+
+    def TXA(self, lanes, mode, address):
+        self.load_register(self.a, lanes, self.x[lanes])
+
+    def TYA(self, lanes, mode, address):
+        self.load_register(self.a, lanes, self.y[lanes])
+
+    def TXS(self, lanes, mode, address):
+        self.stkp[lanes] = self.x[lanes]
+
+    def STA(self, lanes, mode, address):
+        self.write(lanes, address, self.a[lanes])
+
+    def STX(self, lanes, mode, address):
+        self.write(lanes, address, self.x[lanes])
+
+    def STY(self, lanes, mode, address):
+        self.write(lanes, address, self.y[lanes])
+
+    def JMP(self, lanes, mode, address):
+        self.pc[lanes] = address
+
+    def JSR(self, lanes, mode, address):
+        return_address = (self.pc[lanes] - 1) & 0xFFFF
+        self.push(lanes, return_address >> 8)
+        self.push(lanes, return_address & 0xFF)
+        self.pc[lanes] = address
+
+    def RTS(self, lanes, mode, address):
+        low = self.pull(lanes)
+        self.pc[lanes] = (((self.pull(lanes) << 8) | low) + 1) & 0xFFFF
+
+    def PHA(self, lanes, mode, address):
+        self.push(lanes, self.a[lanes])
+
+    def PHP(self, lanes, mode, address):
+        self.push(lanes, self.status[lanes] | FLAG_B | FLAG_U)
+
+    def PLA(self, lanes, mode, address):
+        self.load_register(self.a, lanes, self.pull(lanes))
+
+    def PLP(self, lanes, mode, address):
+        self.status[lanes] = (self.pull(lanes) & ~FLAG_B) | FLAG_U
+
+    def RTI(self, lanes, mode, address):
+        self.PLP(lanes, mode, address)
+        low = self.pull(lanes)
+        self.pc[lanes] = (self.pull(lanes) << 8) | low
+
+    def BRK(self, lanes, mode, address):
+        pc = self.pc[lanes]
+        self.push(lanes, pc >> 8)
+        self.push(lanes, pc & 0xFF)
+        self.push(lanes, self.status[lanes] | FLAG_U | FLAG_B)
+        self.status[lanes] |= FLAG_I
+        vector = np.full(len(lanes), IRQ_VECTOR)
+        self.pc[lanes] = self.read(lanes, vector) | (self.read(lanes, vector + 1) << 8)
@@ -0,0 +1,236 @@
+from collections import namedtuple
+from .cpu import CPU, ADDRESSING_MODES
+from .decode import DecodeCache, INSTRUCTION_LENGTHS, FIRST_CACHED_ADDRESS
+
+MAX_BLOCK_INSTRUCTIONS = 32
+
+# Operations ending a block: they change pc (or may, for illegal opcodes) in ways only known at run time
+TERMINATORS = {'BCC', 'BCS', 'BEQ', 'BMI', 'BNE', 'BPL', 'BVC', 'BVS', 'JMP', 'JSR', 'RTS', 'RTI', 'BRK', 'XXX'}
+# Operations that only read the memory their addressing mode points at
+READERS = {'ADC', 'AND', 'BIT', 'CMP', 'CPX', 'CPY', 'EOR', 'LDA', 'LDX', 'LDY', 'NOP', 'ORA', 'SBC'}
+# Operations changing the index registers, which are kept in locals for indexed addressing
+X_WRITERS = {'LDX', 'TAX', 'TSX', 'INX', 'DEX'}
+Y_WRITERS = {'LDY', 'TAY', 'INY', 'DEY'}
+
+Block = namedtuple('Block', ['function', 'start', 'end', 'length', 'max_cycles', 'source'])
+
+
+def _address_range(mode: str, operand: int):
+    """Lowest and highest address an addressing mode can reach, None when it depends on memory contents"""
+    if mode in ('ZP0', 'ZPX', 'ZPY'):
+        return 0x0000, 0x00FF
+    if mode == 'ABS':
+        return operand, operand
+    if mode in ('ABX', 'ABY'):
+        return operand, operand + 0xFF
+    return None
+
+
+def _is_safe(operation: str, mode: str, operand: int):
+    """True when an instruction can only touch internal RAM or read memory mapped at or above $6000.
+    Anything else may reach PPU/APU registers or mapper registers, so it has to be the last one in its block"""
+    if mode in ('IMP', 'IMM', 'REL'):
+        return True
+    reach = _address_range(mode, operand)
+    if reach is None:
+        return False
+    low, high = reach
+    if high < 0x2000:
+        return True
+    return operation in READERS and low >= 0x6000 and high <= 0xFFFF
+
+
+class BlockCache(DecodeCache):
+    """Compiles straight-line runs of instructions into one Python function each.
+    Blocks never leave the page they start in, so the DecodeCache invalidation (bank switches, writes to cached
+    code) applies to them unchanged."""
+    def __init__(self, bus, max_instructions=MAX_BLOCK_INSTRUCTIONS):
+        super().__init__(bus)
+        self.max_instructions = max_instructions
+        self.namespace = {'__builtins__': {}}
+        for instruction in CPU.instructions_lookup:
+            self.namespace[instruction.operation.__name__] = instruction.operation
+        for mode in ADDRESSING_MODES:
+            self.namespace['resolve_' + mode] = getattr(CPU, 'resolve_' + mode)
+
+    def decode(self, pc: int):
+        """Compiles the block starting at `pc`. Returns None if not even its first instruction can be cached"""
+        bus = self.bus
+        if pc < FIRST_CACHED_ADDRESS or bus.read_pages[pc >> 8] is None:
+            return None
+
+        instructions = []
+        address = pc
+        while len(instructions) < self.max_instructions:
+            opcode = bus.read(address)
+            mode_id = CPU.mode_lookup[opcode]
+            length = INSTRUCTION_LENGTHS[mode_id]
+            if (address & 0xFF) + length > 0x100:
+                break
+            if length == 2:
+                operand = bus.read(address + 1)
+            elif length == 3:
+                operand = bus.read(address + 1) | (bus.read(address + 2) << 8)
+            else:
+                operand = 0
+            operation = CPU.instructions_lookup[opcode].operation.__name__
+            mode = ADDRESSING_MODES[mode_id]
+            instructions.append((address, opcode, operation, mode, operand, length))
+            address += length
+            # an instruction ending on the page boundary ends the block, the next page isn't trapped for it
+            if operation in TERMINATORS or not _is_safe(operation, mode, operand) or address >> 8 != pc >> 8:
+                break
+
+        if not instructions:
+            return None
+        return self.store(pc, self.compile(instructions))
+
+    def compile(self, instructions):
+        start = instructions[0][0]
+        last = len(instructions) - 1
+        lines = [f'def block_{start:04X}(cpu):', '    x = cpu._x', '    y = cpu._y', '    t = 0', '    s = 0']
+        max_cycles = 0
+
+        for index, (address, opcode, operation, mode, operand, length) in enumerate(instructions):
+            next_pc = (address + length) & 0xFFFF
+            base = CPU.cycles_lookup[opcode]
+            mnemonic = CPU.instructions_lookup[opcode].mnemonic
+            terminator = operation in TERMINATORS
+            max_cycles += base + (2 if mode == 'REL' else 0) + (1 if mode in ('ABX', 'ABY', 'IZY') else 0)
+
+            lines.append(f'    # ${address:04X} {mnemonic} {mode} ${operand:04X}')
+            device = index == last and not _is_safe(operation, mode, operand)
+            if device:
+                # may touch another chip, which must see the cycle count at the start of this instruction, and may
+                # stall the CPU (OAM DMA), so its cycles are taken from cpu.cycles like a terminator's
+                lines.append('    cpu.total_cycles += t')
+                lines.append('    s = t')
+            if index == last:
+                lines.append(f'    cpu._pc = 0x{next_pc:04X}')
+            lines.append(f'    cpu.opcode = 0x{opcode:02X}')
+
+            # Addressing, folded to a constant wherever it doesn't depend on registers or memory
+            extra = None
+            if mode == 'IMP':
+                lines.append('    cpu.fetched = cpu._acc')
+            elif mode == 'IMM':
+                lines.append(f'    cpu.addr_abs = 0x{(address + 1) & 0xFFFF:04X}')
+            elif mode in ('ZP0', 'ABS'):
+                lines.append(f'    cpu.addr_abs = 0x{operand:04X}')
+            elif mode in ('ZPX', 'ZPY'):
+                index_register = 'x' if mode == 'ZPX' else 'y'
+                lines.append(f'    cpu.addr_abs = (0x{operand:02X} + {index_register}) & 0xFF')
+            elif mode == 'REL':
+                relative = operand | 0xFF00 if operand & 0x80 else operand
+                lines.append(f'    cpu.addr_rel = 0x{relative:04X}')
+            elif mode in ('ABX', 'ABY'):
+                index_register = 'x' if mode == 'ABX' else 'y'
+                lines.append(f'    a = (0x{operand:04X} + {index_register}) & 0xFFFF')
+                lines.append('    cpu.addr_abs = a')
+                extra = f'((a & 0xFF00) != 0x{operand & 0xFF00:04X})'
+            else:  # IND, IZX, IZY read their pointer from memory
+                lines.append(f'    m = resolve_{mode}(cpu, 0x{operand:04X})')
+                extra = 'm'
+
+            if terminator or device:
+                lines.append(f'    cpu.cycles = {base}')
+                if extra is None:
+                    lines.append(f'    {operation}(cpu)')
+                else:
+                    lines.append(f'    e = {extra} & {operation}(cpu)')
+                    lines.append('    cpu.cycles += e')
+                lines.append('    t += cpu.cycles')
+            elif extra is None:
+                lines.append(f'    {operation}(cpu)')
+                lines.append(f'    t += {base}')
+            else:
+                lines.append(f'    t += {base} + ({extra} & {operation}(cpu))')
+
+            if operation in X_WRITERS:
+                lines.append('    x = cpu._x')
+            if operation in Y_WRITERS:
+                lines.append('    y = cpu._y')
+
+        lines.append('    cpu.total_cycles += t - s')
+        lines.append('    return t')
+        source = '\n'.join(lines) + '\n'
+        namespace = dict(self.namespace)
+        exec(compile(source, f'<block ${start:04X}>', 'exec'), namespace)
+        end = (instructions[-1][0] + instructions[-1][5]) & 0xFFFF
+        return Block(namespace[f'block_{start:04X}'], start, end, len(instructions), max_cycles, source)
+
+
+class BlockEngine:
+    """Runs a CPU through compiled blocks.
+    It has the same run API as CPU and gives exactly the same results: a block only runs when even its worst case
+    cycle count fits into the remaining budget and no interrupt is waiting, everything else falls back to
+    CPU.execute()"""
+    def __init__(self, cpu, max_instructions=MAX_BLOCK_INSTRUCTIONS):
+        self.cpu = cpu
+        self.blocks = BlockCache(cpu.bus, max_instructions)
+
+    def detach(self):
+        self.blocks.detach()
+
+    def step(self, limit):
+        """Runs one block (or a single instruction when no block fits in `limit` cycles) from an instruction
+        boundary. Returns the number of cycles run"""
+        cpu = self.cpu
+        blocks = self.blocks
+        pc = cpu._pc
+        block = blocks.entries[pc]
+        if block is None:
+            block = blocks.decode(pc)
+        if block is not None and block.max_cycles <= limit and cpu.trace_sink is None and not cpu.interrupts:
+            return block.function(cpu)
+        taken = cpu.execute()
+        cpu.total_cycles += taken
+        return taken
+
+    def run(self, cycles: int):
+        """Same as CPU.run()"""
+        cpu = self.cpu
+        if cycles <= 0:
+            return 0
+        remaining = cycles
+        pending = cpu.cycles
+        if pending:
+            if pending >= remaining:
+                cpu.cycles = pending - remaining
+                cpu.total_cycles += remaining
+                return cycles
+            remaining -= pending
+            cpu.total_cycles += pending
+            cpu.cycles = 0
+
+        step = self.step
+        while True:
+            taken = step(remaining)
+            if taken >= remaining:
+                # only a single instruction can overshoot; hand its extra cycles back as pending
+                cpu.cycles = taken - remaining
+                cpu.total_cycles -= cpu.cycles
+                return cycles
+            remaining -= taken
+
+    def run_until(self, pc: int = None, cycles: int = None):
+        """Same as CPU.run_until(). Blocks containing `pc` past their first instruction are interpreted"""
+        if pc is None and cycles is None:
+            raise ValueError("run_until() needs a pc or a cycles limit")
+        cpu = self.cpu
+        if cycles is None:
+            cycles = float('inf')
+        taken = cpu.cycles
+        cpu.total_cycles += taken
+        cpu.cycles = 0
+        blocks = self.blocks
+        while taken < cycles and cpu._pc != pc:
+            block = blocks.entries[cpu._pc] or blocks.decode(cpu._pc)
+            if block is not None and pc is not None and block.start < pc < block.end:
+                spent = cpu.execute()
+                cpu.total_cycles += spent
+            else:
+                spent = self.step(float('inf'))
+            taken += spent
+        cpu.cycles = 0
+        return taken
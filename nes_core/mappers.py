@@ -0,0 +1,315 @@
+from .cartridge import (Cartridge, MIRROR_HORIZONTAL, MIRROR_VERTICAL, MIRROR_FOUR_SCREEN,
+                        MIRROR_SINGLE_LOWER, MIRROR_SINGLE_UPPER)
+from .exceptions import UnsupportedMapperError
+
+MIRRORINGS = (MIRROR_HORIZONTAL, MIRROR_VERTICAL, MIRROR_FOUR_SCREEN, MIRROR_SINGLE_LOWER, MIRROR_SINGLE_UPPER)
+
+IO_PAGE_END = 0x40FF  # $4020-$40FF shares its page with the I/O registers, see Bus.map_expansion()
+PRG_RAM_START = 0x6000
+PRG_ROM_START = 0x8000
+CHR_PAGE_SIZE = 0x400  # CHR is mapped into the PPU's $0000-$1FFF in 1 KiB windows
+
+
+class Mapper:
+    """Base class for cartridge boards.
+    A mapper decides which PRG bank sits behind each part of $8000-$FFFF and which CHR bank behind each 1 KiB window
+    of the PPU pattern tables. Bank switching only rewrites bus page table entries and `chr_pages`, so neither the
+    CPU nor the PPU ever pay for the indirection."""
+    mapper_id = None
+    counts_scanlines = False  # True for boards whose scanline() can change the IRQ line
+    state_fields = ()  # Attributes (ints, bools or lists of ints) update_banks() rebuilds the banking from
+
+    def __init__(self, cartridge: Cartridge):
+        self.cartridge = cartridge
+        self.bus = None
+        self.prg_rom = cartridge.prg_rom
+        self.chr = cartridge.chr
+        self.chr_writable = not cartridge.chr.readonly
+        self.chr_pages = [None] * 8
+        self.chr_offsets = [None] * 8  # Offset into `chr` of the bank behind each window
+        self.chr_version = 0  # Bumped on every CHR bank switch, lets the PPU notice its pattern data moved
+        self.mirroring = cartridge.mirroring
+        self.irq = False  # Level of the cartridge IRQ line
+        self.irq_handler = None  # Called with the new level whenever `irq` changes, e.g. to drive CPU.irq
+
+    def attach(self, bus):
+        self.bus = bus
+        bus.map_expansion(self.cpu_read, self.cpu_write)
+        bus.map_device(IO_PAGE_END + 1, PRG_RAM_START - 1, self.cpu_read, self.cpu_write)
+        if self.cartridge.prg_ram:
+            bus.map_memory(PRG_RAM_START, PRG_ROM_START - 1, self.cartridge.prg_ram)
+        else:
+            bus.map_device(PRG_RAM_START, PRG_ROM_START - 1, self.cpu_read, self.cpu_write)
+        self.reset()
+
+    def reset(self):
+        """Puts the board into its power up banking"""
+        self.update_banks()
+
+    def update_banks(self):
+        """Maps the banks selected by the board's registers"""
+        self.map_prg(PRG_ROM_START, 0x8000, 0)
+        self.map_chr(0x0000, 0x2000, 0)
+
+    # Save states
+    def get_state(self):
+        """Mirroring and the `state_fields` registers, flattened into a list of ints"""
+        state = [MIRRORINGS.index(self.mirroring)]
+        for name in self.state_fields:
+            value = getattr(self, name)
+            if isinstance(value, list):
+                state.extend(value)
+            else:
+                state.append(int(value))
+        return state
+
+    def set_state(self, state):
+        """Loads registers saved by get_state() and remaps the banks, unless nothing changed"""
+        state = list(state)
+        if state == self.get_state():
+            return
+        position = 1
+        for name in self.state_fields:
+            value = getattr(self, name)
+            if isinstance(value, list):
+                setattr(self, name, state[position:position + len(value)])
+                position += len(value)
+            else:
+                setattr(self, name, type(value)(state[position]))
+                position += 1
+        self.update_banks()
+        self.mirroring = MIRRORINGS[state[0]]
+
+    # Banking helpers, `bank` counts in units of `size` and wraps around the available ROM
+    def prg_bank_count(self, size: int):
+        return max(len(self.prg_rom) // size, 1)
+
+    def chr_bank_count(self, size: int):
+        return max(len(self.chr) // size, 1)
+
+    def map_prg(self, address: int, size: int, bank: int):
+        """Maps PRG ROM bank `bank` (of `size` bytes) at CPU `address`"""
+        offset = (bank % self.prg_bank_count(size)) * size
+        self.bus.map_memory(address, address + size - 1, self.prg_rom[offset:offset + size],
+                            writable=False, write_handler=self.cpu_write)
+
+    def map_chr(self, address: int, size: int, bank: int):
+        """Maps CHR bank `bank` (of `size` bytes) at PPU `address`"""
+        if not self.chr:
+            return
+        bank_offset = (bank % self.chr_bank_count(size)) * size
+        for window in range(size // CHR_PAGE_SIZE):
+            offset = (bank_offset + window * CHR_PAGE_SIZE) % len(self.chr)
+            self.chr_pages[(address // CHR_PAGE_SIZE) + window] = self.chr[offset:offset + CHR_PAGE_SIZE]
+            self.chr_offsets[(address // CHR_PAGE_SIZE) + window] = offset
+        self.chr_version += 1
+
+    def set_irq(self, level: bool):
+        if level != self.irq:
+            self.irq = level
+            if self.irq_handler is not None:
+                self.irq_handler(level)
+
+    # CPU side
+    def cpu_read(self, address: int):
+        return 0  # open bus
+
+    def cpu_write(self, address: int, data: int):
+        pass
+
+    # PPU side, pattern tables at $0000-$1FFF
+    def ppu_read(self, address: int):
+        return self.chr_pages[address >> 10][address & 0x3FF]
+
+    def ppu_write(self, address: int, data: int):
+        if self.chr_writable:
+            self.chr_pages[address >> 10][address & 0x3FF] = data
+
+    def scanline(self):
+        """Called by the PPU once per rendered scanline, for boards that count them"""
+        pass
+
+
+class NROM(Mapper):
+    """Mapper 0 - fixed 16 or 32 KiB PRG and 8 KiB CHR"""
+    mapper_id = 0
+
+
+class MMC1(Mapper):
+    """Mapper 1 - serial shift register loaded one bit per write"""
+    mapper_id = 1
+    state_fields = ('shift', 'control', 'chr_bank_0', 'chr_bank_1', 'prg_bank')
+
+    def reset(self):
+        self.shift = 0x10
+        self.control = 0x0C
+        self.chr_bank_0 = 0
+        self.chr_bank_1 = 0
+        self.prg_bank = 0
+        self.update_banks()
+
+    def cpu_write(self, address: int, data: int):
+        if address < PRG_ROM_START:
+            return
+        if data & 0x80:
+            self.shift = 0x10
+            self.control |= 0x0C
+            self.update_banks()
+            return
+        complete = self.shift & 0x01
+        self.shift = (self.shift >> 1) | ((data & 0x01) << 4)
+        if complete:  # fifth write, the marker bit reached bit 0
+            value = self.shift
+            register = (address >> 13) & 0x03
+            if register == 0:
+                self.control = value
+            elif register == 1:
+                self.chr_bank_0 = value
+            elif register == 2:
+                self.chr_bank_1 = value
+            else:
+                self.prg_bank = value & 0x0F
+            self.shift = 0x10
+            self.update_banks()
+
+    def update_banks(self):
+        self.mirroring = (MIRROR_SINGLE_LOWER, MIRROR_SINGLE_UPPER,
+                          MIRROR_VERTICAL, MIRROR_HORIZONTAL)[self.control & 0x03]
+
+        prg_mode = (self.control >> 2) & 0x03
+        if prg_mode < 2:  # 32 KiB at $8000
+            self.map_prg(0x8000, 0x8000, self.prg_bank >> 1)
+        elif prg_mode == 2:  # first bank fixed at $8000, switchable at $C000
+            self.map_prg(0x8000, 0x4000, 0)
+            self.map_prg(0xC000, 0x4000, self.prg_bank)
+        else:  # switchable at $8000, last bank fixed at $C000
+            self.map_prg(0x8000, 0x4000, self.prg_bank)
+            self.map_prg(0xC000, 0x4000, self.prg_bank_count(0x4000) - 1)
+
+        if self.control & 0x10:  # two 4 KiB banks
+            self.map_chr(0x0000, 0x1000, self.chr_bank_0)
+            self.map_chr(0x1000, 0x1000, self.chr_bank_1)
+        else:  # one 8 KiB bank
+            self.map_chr(0x0000, 0x2000, self.chr_bank_0 >> 1)
+
+
+class UxROM(Mapper):
+    """Mapper 2 - switchable 16 KiB bank at $8000, last bank fixed at $C000"""
+    mapper_id = 2
+    state_fields = ('prg_bank',)
+
+    def reset(self):
+        self.prg_bank = 0
+        self.update_banks()
+
+    def update_banks(self):
+        self.map_prg(0x8000, 0x4000, self.prg_bank)
+        self.map_prg(0xC000, 0x4000, self.prg_bank_count(0x4000) - 1)
+        self.map_chr(0x0000, 0x2000, 0)
+
+    def cpu_write(self, address: int, data: int):
+        if address >= PRG_ROM_START:
+            self.prg_bank = data & 0x0F
+            self.map_prg(0x8000, 0x4000, self.prg_bank)
+
+
+class CNROM(Mapper):
+    """Mapper 3 - fixed PRG, switchable 8 KiB CHR bank"""
+    mapper_id = 3
+    state_fields = ('chr_bank',)
+
+    def reset(self):
+        self.chr_bank = 0
+        self.update_banks()
+
+    def update_banks(self):
+        self.map_prg(PRG_ROM_START, 0x8000, 0)
+        self.map_chr(0x0000, 0x2000, self.chr_bank)
+
+    def cpu_write(self, address: int, data: int):
+        if address >= PRG_ROM_START:
+            self.chr_bank = data & 0x03
+            self.map_chr(0x0000, 0x2000, self.chr_bank)
+
+
+class MMC3(Mapper):
+    """Mapper 4 - 8 KiB PRG / 1 and 2 KiB CHR banking and a scanline counter driving the IRQ line"""
+    mapper_id = 4
+    counts_scanlines = True
+    state_fields = ('bank_select', 'registers', 'irq_latch', 'irq_counter', 'irq_reload', 'irq_enabled', 'irq')
+
+    def reset(self):
+        self.bank_select = 0
+        self.registers = [0, 2, 4, 5, 6, 7, 0, 1]
+        self.irq_latch = 0
+        self.irq_counter = 0
+        self.irq_reload = False
+        self.irq_enabled = False
+        self.set_irq(False)
+        self.update_banks()
+
+    def cpu_write(self, address: int, data: int):
+        if address < PRG_ROM_START:
+            return
+        even = not (address & 0x01)
+        region = address & 0xE000
+        if region == 0x8000:
+            if even:
+                self.bank_select = data
+            else:
+                self.registers[self.bank_select & 0x07] = data
+            self.update_banks()
+        elif region == 0xA000:
+            if even and self.cartridge.mirroring != MIRROR_FOUR_SCREEN:
+                self.mirroring = MIRROR_HORIZONTAL if data & 0x01 else MIRROR_VERTICAL
+        elif region == 0xC000:
+            if even:
+                self.irq_latch = data
+            else:
+                self.irq_counter = 0
+                self.irq_reload = True
+        else:
+            if even:
+                self.irq_enabled = False
+                self.set_irq(False)
+            else:
+                self.irq_enabled = True
+
+    def update_banks(self):
+        registers = self.registers
+        second_last = self.prg_bank_count(0x2000) - 2
+        if self.bank_select & 0x40:
+            self.map_prg(0x8000, 0x2000, second_last)
+            self.map_prg(0xC000, 0x2000, registers[6])
+        else:
+            self.map_prg(0x8000, 0x2000, registers[6])
+            self.map_prg(0xC000, 0x2000, second_last)
+        self.map_prg(0xA000, 0x2000, registers[7])
+        self.map_prg(0xE000, 0x2000, second_last + 1)
+
+        inverted = 0x1000 if self.bank_select & 0x80 else 0x0000
+        self.map_chr(0x0000 ^ inverted, 0x0800, registers[0] >> 1)
+        self.map_chr(0x0800 ^ inverted, 0x0800, registers[1] >> 1)
+        self.map_chr(0x1000 ^ inverted, 0x0400, registers[2])
+        self.map_chr(0x1400 ^ inverted, 0x0400, registers[3])
+        self.map_chr(0x1800 ^ inverted, 0x0400, registers[4])
+        self.map_chr(0x1C00 ^ inverted, 0x0400, registers[5])
+
+    def scanline(self):
+        if self.irq_counter == 0 or self.irq_reload:
+            self.irq_counter = self.irq_latch
+            self.irq_reload = False
+        else:
+            self.irq_counter -= 1
+        if self.irq_counter == 0 and self.irq_enabled:
+            self.set_irq(True)
+
+
+MAPPERS = {mapper.mapper_id: mapper for mapper in (NROM, MMC1, UxROM, CNROM, MMC3)}
+
+
+def create_mapper(cartridge: Cartridge) -> Mapper:
+    try:
+        return MAPPERS[cartridge.mapper_id](cartridge)
+    except KeyError:
+        raise UnsupportedMapperError(f"mapper {cartridge.mapper_id} is not supported") from None
@@ -0,0 +1,174 @@
+"""nestest conformance and throughput harness.
+
+Runs test_roms/cpu_nestest.nes in automation mode (from $C000, no PPU needed) and optionally compares every
+instruction against the reference log (nestest.log), one line at a time, so neither log is ever held in memory.
+
+    python -m nes_core.nestest [rom] [--log nestest.log] [--max-instructions N]
+"""
+import argparse
+import os
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from .bus import Bus
+from .cartridge import Cartridge
+from .cpu import CPU
+from .trace import TraceRecord
+
+NESTEST_PATH = os.path.join(os.path.dirname(__file__), '..', 'test_roms', 'cpu_nestest.nes')
+
+AUTOMATION_START = 0xC000
+START_STATUS = 0x24
+START_STACK_POINTER = 0xFD
+START_CYCLES = 7  # the reset sequence already ran when the reference log starts
+OFFICIAL_END = 0xC6BD  # first instruction of the unofficial opcode tests
+RESULT_OFFICIAL = 0x0002  # nestest leaves its error codes here, 0 means every test passed
+RESULT_UNOFFICIAL = 0x0003
+
+_REGISTERS = re.compile(r'A:([0-9A-F]{2}) X:([0-9A-F]{2}) Y:([0-9A-F]{2}) P:([0-9A-F]{2}) SP:([0-9A-F]{2})')
+_CYCLES = re.compile(r'CYC:\s*(\d+)')
+
+Mismatch = namedtuple('Mismatch', ['line_number', 'expected', 'actual'])
+
+
+class NestestResult(namedtuple('NestestResult', ['instructions', 'cycles', 'seconds', 'mismatch',
+                                                 'result_official', 'result_unofficial', 'pc'])):
+    @property
+    def passed(self):
+        return self.mismatch is None and self.result_official == 0
+
+    @property
+    def instructions_per_second(self):
+        return self.instructions / self.seconds if self.seconds else 0.0
+
+    @property
+    def cycles_per_second(self):
+        return self.cycles / self.seconds if self.seconds else 0.0
+
+
+def parse_log_line(line: str):
+    """Extracts (pc, a, x, y, p, sp, total cycles) from a nestest.log line, cycles are None when missing"""
+    registers = _REGISTERS.search(line)
+    if registers is None:
+        raise ValueError(f"not a nestest log line: {line!r}")
+    cycles = _CYCLES.search(line)
+    return (int(line[:4], 16), *(int(value, 16) for value in registers.groups()),
+            int(cycles.group(1)) if cycles else None)
+
+
+class GoldenLogComparer:
+    """Trace sink comparing each TraceRecord with the next line of a reference log.
+    `lines` is any iterable of log lines, an open file keeps only the current one in memory.
+    Records after the first mismatch (or past the end of the log) are ignored"""
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.line_number = 0
+        self.mismatch = None
+        self.exhausted = False
+
+    @property
+    def done(self):
+        return self.exhausted or self.mismatch is not None
+
+    def __call__(self, record: TraceRecord):
+        if self.done:
+            return
+        line = next(self.lines, None)
+        if line is None or not line.strip():
+            self.exhausted = True
+            return
+        self.line_number += 1
+        pc, a, x, y, p, sp, cycles = parse_log_line(line)
+        actual = (record.pc, record.a, record.x, record.y, record.p, record.sp,
+                  record.total_cycles if cycles is not None else None)
+        if actual != (pc, a, x, y, p, sp, cycles):
+            self.mismatch = Mismatch(self.line_number, line.rstrip('\n'), self.format(record))
+
+    @staticmethod
+    def format(record: TraceRecord):
+        return (f'{record.pc:04X}  {record.mnemonic}  A:{record.a:02X} X:{record.x:02X} Y:{record.y:02X} '
+                f'P:{record.p:02X} SP:{record.sp:02X} CYC:{record.total_cycles}')
+
+
+def create_cpu(cartridge: Cartridge):
+    """Builds a CPU with the nestest `cartridge` inserted, in the state the reference log starts from"""
+    bus = Bus()
+    bus.insert_cartridge(cartridge)
+    cpu = CPU()
+    cpu.connect_bus(bus)
+    cpu.pc = AUTOMATION_START
+    cpu.status_reg = START_STATUS
+    cpu.stkp = START_STACK_POINTER
+    cpu.total_cycles = START_CYCLES
+    return cpu
+
+
+@contextmanager
+def nestest_cpu(rom_path: str = NESTEST_PATH):
+    """create_cpu() on the ROM file, which is unplugged and closed again when the with block exits"""
+    with Cartridge.from_file(rom_path) as cartridge:
+        cpu = create_cpu(cartridge)
+        try:
+            yield cpu
+        finally:
+            cpu.bus.remove_cartridge()
+
+
+def run_nestest(rom_path: str = NESTEST_PATH, log_path: str = None, max_instructions: int = None,
+                stop_pc: int = OFFICIAL_END):
+    """Runs nestest until pc reaches `stop_pc` (by default once the official opcodes are done), the log runs out
+    or diverges, or `max_instructions` have run. Without a log the CPU runs untraced, which is what the
+    throughput numbers are meant to measure"""
+    with nestest_cpu(rom_path) as cpu:
+        log_file = open(log_path) if log_path is not None else None
+        comparer = GoldenLogComparer(log_file) if log_file is not None else None
+        if max_instructions is None:
+            max_instructions = float('inf')
+
+        instructions = 0
+        execute = cpu.execute
+        try:
+            start = time.perf_counter()
+            if comparer is None:
+                while cpu._pc != stop_pc and instructions < max_instructions:
+                    cpu.total_cycles += execute()
+                    instructions += 1
+            else:
+                cpu.set_trace_sink(comparer)
+                while cpu._pc != stop_pc and instructions < max_instructions:
+                    cpu.total_cycles += execute()
+                    if comparer.done:
+                        break
+                    instructions += 1
+            seconds = time.perf_counter() - start
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+        return NestestResult(instructions, cpu.total_cycles - START_CYCLES, seconds,
+                             comparer.mismatch if comparer is not None else None,
+                             cpu.bus.read(RESULT_OFFICIAL), cpu.bus.read(RESULT_UNOFFICIAL), cpu.pc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs nestest in automation mode")
+    parser.add_argument('rom_path', nargs='?', default=NESTEST_PATH)
+    parser.add_argument('--log', help="reference nestest.log to compare the trace against")
+    parser.add_argument('--max-instructions', type=int)
+    args = parser.parse_args()
+
+    result = run_nestest(args.rom_path, args.log, args.max_instructions)
+    print(f'{result.instructions} instructions, {result.cycles} cycles in {result.seconds:.3f}s '
+          f'({result.instructions_per_second:,.0f} IPS, {result.cycles_per_second:,.0f} CPS)')
+    print(f'stopped at ${result.pc:04X}, results ${RESULT_OFFICIAL:02X}={result.result_official:02X} '
+          f'${RESULT_UNOFFICIAL:02X}={result.result_unofficial:02X}')
+    if result.mismatch is not None:
+        print(f'mismatch on line {result.mismatch.line_number}:')
+        print(f'  expected {result.mismatch.expected}')
+        print(f'  actual   {result.mismatch.actual}')
+    return 0 if result.passed else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
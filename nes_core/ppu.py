@@ -0,0 +1,496 @@
+import numpy as np
+from .cartridge import (MIRROR_HORIZONTAL, MIRROR_VERTICAL, MIRROR_FOUR_SCREEN,
+                        MIRROR_SINGLE_LOWER, MIRROR_SINGLE_UPPER)
+from .tiles import TileCache
+
+SCREEN_WIDTH = 256
+SCREEN_HEIGHT = 240
+DOTS_PER_SCANLINE = 341
+SCANLINES_PER_FRAME = 262
+VBLANK_SCANLINE = 241
+PRE_RENDER_SCANLINE = 261
+FRAME_DOTS = DOTS_PER_SCANLINE * SCANLINES_PER_FRAME  # one dot less on odd frames while rendering
+
+# PPUCTRL ($2000)
+CTRL_INCREMENT_32 = 0x04
+CTRL_SPRITE_TABLE = 0x08
+CTRL_BACKGROUND_TABLE = 0x10
+CTRL_SPRITE_16 = 0x20
+CTRL_NMI = 0x80
+# PPUMASK ($2001)
+MASK_GREYSCALE = 0x01
+MASK_BACKGROUND_LEFT = 0x02
+MASK_SPRITES_LEFT = 0x04
+MASK_BACKGROUND = 0x08
+MASK_SPRITES = 0x10
+MASK_RENDERING = MASK_BACKGROUND | MASK_SPRITES
+# PPUSTATUS ($2002)
+STATUS_OVERFLOW = 0x20
+STATUS_SPRITE_ZERO = 0x40
+STATUS_VBLANK = 0x80
+
+# Physical 1 KiB nametable behind each of the four logical ones at $2000, $2400, $2800 and $2C00
+NAMETABLE_MIRRORING = {
+    MIRROR_HORIZONTAL: (0, 0, 1, 1),
+    MIRROR_VERTICAL: (0, 1, 0, 1),
+    MIRROR_SINGLE_LOWER: (0, 0, 0, 0),
+    MIRROR_SINGLE_UPPER: (1, 1, 1, 1),
+    MIRROR_FOUR_SCREEN: (0, 1, 2, 3),
+}
+_NAMETABLE_OFFSETS = {mirroring: np.array(tables, dtype=np.intp) * 0x400
+                      for mirroring, tables in NAMETABLE_MIRRORING.items()}
+
+# Dots with something to do, by kind of scanline. Dot 1 of a visible line renders the whole line at once.
+_VISIBLE_EVENTS = (1, 256, 257, 260)
+_VBLANK_EVENTS = (1,)
+_PRE_RENDER_EVENTS = (1, 256, 257, 260, 280, 339)
+_IDLE_EVENTS = ()
+
+_TILES = np.arange(33, dtype=np.intp)  # a scanline touches 33 tiles when fine x scroll isn't 0
+
+# 2C02 palette, NES colour index -> RGB
+NES_PALETTE = np.array([
+    (84, 84, 84), (0, 30, 116), (8, 16, 144), (48, 0, 136), (68, 0, 100), (92, 0, 48), (84, 4, 0), (60, 24, 0),
+    (32, 42, 0), (8, 58, 0), (0, 64, 0), (0, 60, 0), (0, 50, 60), (0, 0, 0), (0, 0, 0), (0, 0, 0),
+    (152, 150, 152), (8, 76, 196), (48, 50, 236), (92, 30, 228), (136, 20, 176), (160, 20, 100), (152, 34, 32),
+    (120, 60, 0), (84, 90, 0), (40, 114, 0), (8, 124, 0), (0, 118, 40), (0, 102, 120), (0, 0, 0), (0, 0, 0),
+    (0, 0, 0),
+    (236, 238, 236), (76, 154, 236), (120, 124, 236), (176, 98, 236), (228, 84, 236), (236, 88, 180),
+    (236, 106, 100), (212, 136, 32), (160, 170, 0), (116, 196, 0), (76, 208, 32), (56, 204, 108), (56, 180, 204),
+    (60, 60, 60), (0, 0, 0), (0, 0, 0),
+    (236, 238, 236), (168, 204, 236), (188, 188, 236), (212, 178, 236), (236, 174, 236), (236, 174, 212),
+    (236, 180, 176), (228, 196, 144), (204, 210, 120), (180, 222, 120), (168, 226, 144), (152, 226, 180),
+    (160, 214, 228), (160, 162, 160), (0, 0, 0), (0, 0, 0),
+], dtype=np.uint8)
+
+
+def _palette_index(address: int):
+    """Palette RAM offset of `address`, the sprite backdrop entries mirror the background ones"""
+    index = address & 0x1F
+    if index & 0x13 == 0x10:
+        index &= 0x0F
+    return index
+
+
+def _scanline_events(scanline: int):
+    """Dots of `scanline` where something happens"""
+    if scanline < SCREEN_HEIGHT:
+        return _VISIBLE_EVENTS
+    if scanline == VBLANK_SCANLINE:
+        return _VBLANK_EVENTS
+    if scanline == PRE_RENDER_SCANLINE:
+        return _PRE_RENDER_EVENTS
+    return _IDLE_EVENTS
+
+
+class PPU:
+    """2C02 picture processing unit, mapped at $2000-$2007 (mirrored up to $3FFF).
+    Timing is kept per dot: VBlank, NMI, sprite 0 hit and the scroll register updates happen on the exact dot they
+    do on hardware. Pixels are not produced one by one though, each visible scanline is rendered in one go with
+    NumPy at its first dot, into `framebuffer` (240x256 NES colour indices, use NES_PALETTE or frame_rgb() for RGB).
+    Register writes that land in the middle of a scanline therefore show up from the next one.
+    With `draw` off (fast-forward) the framebuffer is left alone: a line is only put together when sprite 0 is on it
+    and could hit, so sprite 0 hit, sprite overflow and VBlank stay exactly what they are when drawing."""
+    def __init__(self):
+        self.bus = None
+        self.nmi_handler = None  # Called whenever the PPU raises an NMI, e.g. CPU.nmi
+        self.vram = bytearray(0x1000)  # Nametables, 2 KiB on the console plus 2 KiB for four screen boards
+        self.palette = bytearray(0x20)
+        self.oam = bytearray(0x100)  # Sprite attributes, 64 sprites of 4 bytes
+        self.framebuffer = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH), dtype=np.uint8)
+        self.draw = True  # Whether visible scanlines are drawn into the framebuffer
+        self._vram_array = np.frombuffer(self.vram, dtype=np.uint8)
+        self._palette_array = np.frombuffer(self.palette, dtype=np.uint8)
+        self._oam_array = np.frombuffer(self.oam, dtype=np.uint8).reshape(64, 4)
+        self.tile_cache = TileCache()
+        self.reset()
+
+    def attach(self, bus):
+        """Maps the PPU registers into the CPU address space of `bus`, CHR and mirroring come from its mapper"""
+        self.bus = bus
+        bus.map_device(0x2000, 0x3FFF, self.cpu_read, self.cpu_write)
+
+    def reset(self):
+        self.ctrl = 0x00
+        self.mask = 0x00
+        self.status = 0x00
+        self.oam_address = 0x00
+        self.v = 0x0000  # Current VRAM address (15 bits)
+        self.t = 0x0000  # Temporary VRAM address, the top left corner of the screen
+        self.fine_x = 0
+        self.w = False  # Write toggle shared by $2005 and $2006
+        self.data_buffer = 0x00  # $2007 read buffer
+        self.io_latch = 0x00  # Last value written to any register, returned by write-only ones
+        self.scanline = 0
+        self.dot = 0  # Next dot to run on the scanline
+        self.frame = 0
+        self.odd_frame = False
+        self.nmi = False  # Set when the PPU raises an NMI, cleared by whoever acknowledges it
+        self._line_length = DOTS_PER_SCANLINE
+        self._events = _VISIBLE_EVENTS
+        self._sprite_zero_dot = None  # Dot of this line where sprite 0 hits the background
+        self._suppress_vblank = False
+
+    def load_oam(self, data):
+        """OAM DMA: 256 bytes into OAM from OAMADDR on, wrapping around, in two slice copies"""
+        start = self.oam_address
+        self.oam[start:] = data[:0x100 - start]
+        self.oam[:start] = data[0x100 - start:]
+
+    # Save states, the memories (vram, palette, oam, framebuffer) are saved as they are
+    def get_state(self):
+        """Registers and timing as a tuple of ints, in the order set_state() takes them.
+        A pending sprite 0 hit is saved as -1 when there is none"""
+        return (self.ctrl, self.mask, self.status, self.oam_address, self.v, self.t, self.fine_x, int(self.w),
+                self.data_buffer, self.io_latch, self.scanline, self.dot, self.frame, int(self.odd_frame),
+                int(self.nmi), self._line_length,
+                -1 if self._sprite_zero_dot is None else self._sprite_zero_dot, int(self._suppress_vblank))
+
+    def set_state(self, state):
+        (self.ctrl, self.mask, self.status, self.oam_address, self.v, self.t, self.fine_x, w,
+         self.data_buffer, self.io_latch, self.scanline, self.dot, self.frame, odd_frame,
+         nmi, self._line_length, sprite_zero_dot, suppress_vblank) = state
+        self.w = bool(w)
+        self.odd_frame = bool(odd_frame)
+        self.nmi = bool(nmi)
+        self._sprite_zero_dot = None if sprite_zero_dot < 0 else sprite_zero_dot
+        self._suppress_vblank = bool(suppress_vblank)
+        self._events = _scanline_events(self.scanline)
+
+    # Memory seen by the PPU
+    @property
+    def mapper(self):
+        return self.bus.mapper if self.bus is not None else None
+
+    def nametable_offset(self, address: int):
+        mapper = self.mapper
+        mirroring = mapper.mirroring if mapper is not None else MIRROR_HORIZONTAL
+        return NAMETABLE_MIRRORING[mirroring][(address >> 10) & 0x03] * 0x400 + (address & 0x3FF)
+
+    def ppu_read(self, address: int):
+        address &= 0x3FFF
+        if address < 0x2000:
+            mapper = self.mapper
+            return mapper.ppu_read(address) if mapper is not None and mapper.chr else 0
+        if address < 0x3F00:
+            return self.vram[self.nametable_offset(address)]
+        return self.palette[_palette_index(address)]
+
+    def ppu_write(self, address: int, data: int):
+        address &= 0x3FFF
+        if address < 0x2000:
+            mapper = self.mapper
+            if mapper is not None and mapper.chr:
+                mapper.ppu_write(address, data)
+                self.tile_cache.chr_written(mapper, address)
+        elif address < 0x3F00:
+            self.vram[self.nametable_offset(address)] = data
+        else:
+            self.palette[_palette_index(address)] = data & 0x3F
+
+    # CPU side registers
+    def cpu_read(self, address: int):
+        register = address & 0x07
+        if register == 2:
+            data = (self.status & 0xE0) | (self.io_latch & 0x1F)
+            self.status &= ~STATUS_VBLANK & 0xFF
+            self.w = False
+            if self.scanline == VBLANK_SCANLINE and self.dot == 1:  # read right before VBlank starts
+                self._suppress_vblank = True
+            self.io_latch = data
+            return data
+        if register == 4:
+            self.io_latch = self.oam[self.oam_address]
+            return self.io_latch
+        if register == 7:
+            address = self.v & 0x3FFF
+            if address < 0x3F00:
+                data = self.data_buffer
+                self.data_buffer = self.ppu_read(address)
+            else:
+                data = (self.io_latch & 0xC0) | self.ppu_read(address)
+                self.data_buffer = self.ppu_read(address - 0x1000)
+            self.increment_v()
+            self.io_latch = data
+            return data
+        return self.io_latch
+
+    def cpu_write(self, address: int, data: int):
+        register = address & 0x07
+        self.io_latch = data
+        if register == 0:
+            nmi_was_enabled = self.ctrl & CTRL_NMI
+            self.ctrl = data
+            self.t = (self.t & 0x73FF) | ((data & 0x03) << 10)
+            if not nmi_was_enabled and data & CTRL_NMI and self.status & STATUS_VBLANK:
+                self.raise_nmi()
+        elif register == 1:
+            self.mask = data
+        elif register == 3:
+            self.oam_address = data
+        elif register == 4:
+            self.oam[self.oam_address] = data
+            self.oam_address = (self.oam_address + 1) & 0xFF
+        elif register == 5:
+            if not self.w:
+                self.t = (self.t & 0x7FE0) | (data >> 3)
+                self.fine_x = data & 0x07
+            else:
+                self.t = (self.t & 0x0C1F) | ((data & 0x07) << 12) | ((data & 0xF8) << 2)
+            self.w = not self.w
+        elif register == 6:
+            if not self.w:
+                self.t = (self.t & 0x00FF) | ((data & 0x3F) << 8)
+            else:
+                self.t = (self.t & 0x7F00) | data
+                self.v = self.t
+            self.w = not self.w
+        elif register == 7:
+            self.ppu_write(self.v, data)
+            self.increment_v()
+
+    def increment_v(self):
+        self.v = (self.v + (32 if self.ctrl & CTRL_INCREMENT_32 else 1)) & 0x7FFF
+
+    # Scroll register updates done by the rendering hardware
+    def increment_y(self):
+        v = self.v
+        if v & 0x7000 != 0x7000:
+            self.v = v + 0x1000
+            return
+        v &= 0x0FFF
+        coarse_y = (v >> 5) & 0x1F
+        if coarse_y == 29:
+            coarse_y = 0
+            v ^= 0x0800
+        elif coarse_y == 31:
+            coarse_y = 0
+        else:
+            coarse_y += 1
+        self.v = (v & 0x7C1F) | (coarse_y << 5)
+
+    def copy_x(self):
+        self.v = (self.v & 0x7BE0) | (self.t & 0x041F)
+
+    def copy_y(self):
+        self.v = (self.v & 0x041F) | (self.t & 0x7BE0)
+
+    def raise_nmi(self):
+        self.nmi = True
+        if self.nmi_handler is not None:
+            self.nmi_handler()
+
+    # Timing
+    def clock(self):
+        """Runs a single dot"""
+        self.run(1)
+
+    def run(self, dots: int):
+        """Runs `dots` dots, jumping straight from one dot with work to do to the next"""
+        while dots > 0:
+            dot = self.dot
+            target = self._line_length
+            for event in self._events:
+                if event >= dot:
+                    target = event
+                    break
+            if self._sprite_zero_dot is not None and dot <= self._sprite_zero_dot < target:
+                target = self._sprite_zero_dot
+            if target > dot:
+                span = target - dot if target - dot < dots else dots
+                self.dot = dot + span
+                dots -= span
+            else:
+                self.dot_event(dot)
+                self.dot = dot + 1
+                dots -= 1
+            if self.dot >= self._line_length:
+                self.next_scanline()
+
+    def dots_until_event(self, scanline_ticks=False):
+        """Lower bound on the dots left before the PPU may raise an NMI or, with `scanline_ticks`, clock the
+        mapper's scanline counter. Nothing the CPU writes can bring either closer, so that far the CPU may run
+        ahead without the PPU having to keep up"""
+        position = self.scanline * DOTS_PER_SCANLINE + self.dot
+        distance = (VBLANK_SCANLINE * DOTS_PER_SCANLINE + 1 - position) % FRAME_DOTS
+        if scanline_ticks:
+            scanline = self.scanline
+            if self.dot > 260:
+                scanline += 1
+            if SCREEN_HEIGHT <= scanline < PRE_RENDER_SCANLINE:
+                scanline = PRE_RENDER_SCANLINE
+            distance = min(distance, (scanline * DOTS_PER_SCANLINE + 260 - position) % FRAME_DOTS)
+        return max(distance - 1, 0)  # the odd frame skip may make it a dot shorter
+
+    def dot_event(self, dot: int):
+        scanline = self.scanline
+        if dot == self._sprite_zero_dot:
+            self.status |= STATUS_SPRITE_ZERO
+            self._sprite_zero_dot = None
+            if dot not in self._events:
+                return
+        if scanline == VBLANK_SCANLINE:
+            if not self._suppress_vblank:
+                self.status |= STATUS_VBLANK
+                if self.ctrl & CTRL_NMI:
+                    self.raise_nmi()
+            self._suppress_vblank = False
+            return
+        if dot == 1:
+            if scanline == PRE_RENDER_SCANLINE:
+                self.status &= ~(STATUS_VBLANK | STATUS_SPRITE_ZERO | STATUS_OVERFLOW) & 0xFF
+            else:
+                self.render_scanline(scanline)
+            return
+        if not self.mask & MASK_RENDERING:
+            return
+        if dot == 256:
+            self.increment_y()
+        elif dot == 257:
+            self.copy_x()
+        elif dot == 260:
+            mapper = self.mapper
+            if mapper is not None:
+                mapper.scanline()
+        elif dot == 280:
+            self.copy_y()
+        elif dot == 339 and self.odd_frame:
+            self._line_length = DOTS_PER_SCANLINE - 1  # odd frames skip the last pre-render dot
+
+    def next_scanline(self):
+        self.dot = 0
+        self._line_length = DOTS_PER_SCANLINE
+        self._sprite_zero_dot = None
+        self.scanline += 1
+        if self.scanline == SCANLINES_PER_FRAME:
+            self.scanline = 0
+            self.frame += 1
+            self.odd_frame = not self.odd_frame
+        self._events = _scanline_events(self.scanline)
+
+    # Rendering
+    def render_scanline(self, scanline: int):
+        """Draws a whole scanline into the framebuffer and works out where sprite 0 hits on it"""
+        mask = self.mask
+        if not mask & MASK_RENDERING:
+            if self.draw:
+                self.framebuffer[scanline] = self.palette[0]
+            return
+        if not self.draw and not self.sprite_zero_possible(scanline):
+            return
+
+        tiles = self.tile_cache.update(self.mapper)
+        background, background_palette = self.background_line(tiles)
+        sprites, sprite_palette, sprite_behind, sprite_zero = self.sprite_line(scanline, tiles)
+
+        background_opaque = background != 0
+        sprite_opaque = sprites != 0
+        if self.draw:
+            colour = np.where(background_opaque, (background_palette << 2) | background, 0)
+            show_sprite = sprite_opaque & (~background_opaque | ~sprite_behind)
+            colour = np.where(show_sprite, 0x10 | (sprite_palette << 2) | sprites, colour)
+            line = self._palette_array[colour]
+            if mask & MASK_GREYSCALE:
+                line = line & 0x30
+            self.framebuffer[scanline] = line
+
+        if sprite_zero is not None and mask & MASK_BACKGROUND and mask & MASK_SPRITES:
+            hits = np.flatnonzero(sprite_zero & background_opaque & sprite_opaque)
+            hits = hits[hits != 255]
+            if len(hits) and not self.status & STATUS_SPRITE_ZERO:
+                # pixel x comes out on dot x + 1, a hit on pixel 0 can only be seen after this dot
+                self._sprite_zero_dot = max(int(hits[0]) + 1, 2)
+
+    def sprite_zero_possible(self, scanline: int):
+        """Whether sprite 0 could hit the background on a scanline, evaluating the line's sprites (and so sprite
+        overflow) like sprite_line() does"""
+        if not self.mask & MASK_SPRITES:
+            return False
+        _, found = self.evaluate_sprites(scanline)
+        return bool(self.mask & MASK_BACKGROUND and len(found) and found[0] == 0
+                    and not self.status & STATUS_SPRITE_ZERO)
+
+    def evaluate_sprites(self, scanline: int):
+        """Rows of every sprite on a scanline and the indices of the first 8 that are on it, setting sprite
+        overflow when there are more"""
+        height = 16 if self.ctrl & CTRL_SPRITE_16 else 8
+        rows = scanline - 1 - self._oam_array[:, 0].astype(np.intp)  # sprites show up one line below their Y
+        found = np.flatnonzero((rows >= 0) & (rows < height))
+        if len(found) > 8:
+            self.status |= STATUS_OVERFLOW
+            found = found[:8]
+        return rows, found
+
+    def background_line(self, tiles):
+        """Background pixel values (0-3) and attribute palettes (0-3) of the current line, 256 each"""
+        if not self.mask & MASK_BACKGROUND:
+            zeros = np.zeros(SCREEN_WIDTH, dtype=np.uint8)
+            return zeros, zeros
+        v = self.v
+        fine_y = (v >> 12) & 0x07
+        coarse_y = (v >> 5) & 0x1F
+        columns = (v & 0x1F) + _TILES
+        tables = ((v >> 10) & 0x03) ^ (columns >> 5)  # crossing column 31 moves to the horizontal neighbour
+        columns &= 0x1F
+        mapper = self.mapper
+        offsets = _NAMETABLE_OFFSETS[mapper.mirroring if mapper is not None else MIRROR_HORIZONTAL][tables]
+
+        indices = self._vram_array[offsets + (coarse_y << 5) + columns].astype(np.intp)
+        attributes = self._vram_array[offsets + 0x3C0 + ((coarse_y >> 2) << 3) + (columns >> 2)]
+        shifts = ((coarse_y & 0x02) << 1) | (columns & 0x02)
+        palettes = (attributes >> shifts) & 0x03
+
+        if self.ctrl & CTRL_BACKGROUND_TABLE:
+            indices |= 0x100
+        pixels = tiles[indices, fine_y]
+        start = self.fine_x
+        pixels = pixels.ravel()[start:start + SCREEN_WIDTH]
+        palettes = np.repeat(palettes, 8)[start:start + SCREEN_WIDTH]
+        if not self.mask & MASK_BACKGROUND_LEFT:
+            pixels[:8] = 0
+        return pixels, palettes
+
+    def sprite_line(self, scanline: int, tiles):
+        """Sprite pixel values, palettes, behind-background flags and sprite 0 coverage (None when sprite 0 isn't
+        on the line) of a scanline"""
+        pixels = np.zeros(SCREEN_WIDTH, dtype=np.uint8)
+        palettes = np.zeros(SCREEN_WIDTH, dtype=np.uint8)
+        behind = np.zeros(SCREEN_WIDTH, dtype=bool)
+        if not self.mask & MASK_SPRITES:
+            return pixels, palettes, behind, None
+
+        height = 16 if self.ctrl & CTRL_SPRITE_16 else 8
+        oam = self._oam_array
+        rows, found = self.evaluate_sprites(scanline)
+
+        sprite_zero = None
+        table = 0x100 if self.ctrl & CTRL_SPRITE_TABLE else 0
+        for index in found[::-1]:  # lowest index has the highest priority, so it is drawn last
+            tile, attributes, x = int(oam[index, 1]), int(oam[index, 2]), int(oam[index, 3])
+            row = int(rows[index])
+            if attributes & 0x80:
+                row = height - 1 - row
+            if height == 16:
+                tile = ((tile & 0x01) << 8) | (tile & 0xFE) | (row >> 3)
+            else:
+                tile |= table
+            row_pixels = tiles[tile, row & 0x07]
+            if attributes & 0x40:
+                row_pixels = row_pixels[::-1]
+            row_pixels = row_pixels[:SCREEN_WIDTH - x]
+            opaque = row_pixels != 0
+            span = slice(x, x + len(row_pixels))
+            pixels[span] = np.where(opaque, row_pixels, pixels[span])
+            palettes[span] = np.where(opaque, attributes & 0x03, palettes[span])
+            behind[span] = np.where(opaque, bool(attributes & 0x20), behind[span])
+            if index == 0:
+                sprite_zero = np.zeros(SCREEN_WIDTH, dtype=bool)
+                sprite_zero[span] = opaque
+
+        if not self.mask & MASK_SPRITES_LEFT:
+            pixels[:8] = 0
+        return pixels, palettes, behind, sprite_zero
+
+    def frame_rgb(self):
+        """The framebuffer as a 240x256x3 RGB array"""
+        return NES_PALETTE[self.framebuffer]
@@ -0,0 +1,188 @@
+"""Per-opcode, per-addressing-mode and per-pc execution profiles.
+
+A Profiler is a trace sink: it rides on the single trace_sink check CPU.execute() already has, so a CPU without
+one attached runs exactly the code it runs anyway. Attached, it counts executions, cycles and page crossing
+penalty cycles for each of the 256 opcodes and executions and cycles for every pc:
+    python -m nes_core.profiler game.nes --frames 600 --csv opcodes.csv --folded profile.folded
+The folded output (mode;mnemonic;$pc cycles) feeds flamegraph.pl or speedscope."""
+import argparse
+import csv
+from array import array
+import numpy as np
+from .cartridge import Cartridge
+from .console import Console
+from .cpu import CPU, ADDRESSING_MODES, INTERRUPT_CYCLES
+
+OPCODE_COLUMNS = ('opcode', 'mnemonic', 'mode', 'executions', 'cycles', 'penalty_cycles')
+HOTSPOT_COLUMNS = ('pc', 'opcode', 'mnemonic', 'executions', 'cycles')
+
+
+def _counters(size: int):
+    return array('q', bytes(8 * size))
+
+
+class Profiler:
+    """Counters filled in by a CPU the profiler is attached to.
+    An instruction's cycles are only known once the next one starts, so each trace record settles the previous
+    instruction. Page crossing and branch penalties are the cycles beyond the base count. Interrupts entered in
+    between (CPU.interrupts_taken) are counted under `interrupts` instead, and DMA stalls the instruction started
+    (CPU.stall_cycles) under `stall_cycles`. It reads both counters from the CPU, so use attach() rather than
+    setting it as a trace sink yourself."""
+    def __init__(self):
+        self.executions = _counters(256)
+        self.cycles = _counters(256)
+        self.penalty_cycles = _counters(256)
+        self.pc_executions = _counters(0x10000)
+        self.pc_cycles = _counters(0x10000)
+        self.pc_opcodes = array('B', bytes(0x10000))  # Last opcode seen at each pc
+        self.interrupts = 0
+        self.interrupt_cycles = 0
+        self.stall_cycles = 0
+        self.cpu = None
+        self.sink = None  # Trace sink that was attached before, records are passed on to it
+        self._opcode = None  # Instruction waiting for its cycle count
+        self._pc = 0
+        self._start = 0
+        self._stalled = 0  # CPU.stall_cycles when the instruction started
+        self._interrupted = 0  # CPU.interrupts_taken when the instruction started
+
+    def attach(self, cpu):
+        """Starts profiling `cpu`, keeping its current trace sink (if any) fed"""
+        self.cpu = cpu
+        self.sink = cpu.trace_sink
+        self._opcode = None
+        cpu.set_trace_sink(self)
+
+    def detach(self):
+        """Stops profiling, settling the instruction in flight, and gives the CPU its previous trace sink back"""
+        cpu = self.cpu
+        if self._opcode is not None:
+            self.settle(cpu.total_cycles + cpu.cycles)
+            self._opcode = None
+        cpu.set_trace_sink(self.sink)
+        self.cpu = None
+        self.sink = None
+
+    def __call__(self, record):
+        cpu = self.cpu
+        if cpu is None:
+            raise RuntimeError("Profiler is fed by the CPU it is attached to, use attach()")
+        if self._opcode is not None:
+            self.settle(record.total_cycles)
+        self._opcode = opcode = record.opcode
+        self._pc = pc = record.pc
+        self._start = record.total_cycles
+        self._stalled = cpu.stall_cycles
+        self._interrupted = cpu.interrupts_taken
+        self.executions[opcode] += 1
+        self.pc_executions[pc] += 1
+        self.pc_opcodes[pc] = opcode
+        if self.sink is not None:
+            self.sink(record)
+
+    def settle(self, end: int):
+        """Books the cycles of the previous instruction, which ran until `end`"""
+        opcode = self._opcode
+        cpu = self.cpu
+        stalled = cpu.stall_cycles - self._stalled
+        self.stall_cycles += stalled
+        interrupts = cpu.interrupts_taken - self._interrupted
+        self.interrupts += interrupts
+        self.interrupt_cycles += interrupts * INTERRUPT_CYCLES
+        taken = end - self._start - stalled - interrupts * INTERRUPT_CYCLES
+        self.cycles[opcode] += taken
+        self.penalty_cycles[opcode] += taken - CPU.cycles_lookup[opcode]
+        self.pc_cycles[self._pc] += taken
+
+    def clear(self):
+        for counters in (self.executions, self.cycles, self.penalty_cycles, self.pc_executions, self.pc_cycles):
+            counters[:] = _counters(len(counters))
+        self.interrupts = 0
+        self.interrupt_cycles = 0
+        self.stall_cycles = 0
+
+    # Reports
+    def opcode_rows(self):
+        """(opcode, mnemonic, mode, executions, cycles, penalty_cycles) of every executed opcode, most cycles first"""
+        rows = [(opcode, CPU.instructions_lookup[opcode].mnemonic, ADDRESSING_MODES[CPU.mode_lookup[opcode]],
+                 self.executions[opcode], self.cycles[opcode], self.penalty_cycles[opcode])
+                for opcode in range(256) if self.executions[opcode]]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def mode_rows(self):
+        """(mode, executions, cycles, penalty_cycles) per addressing mode, most cycles first"""
+        totals = {mode: [0, 0, 0] for mode in ADDRESSING_MODES}
+        for _, _, mode, executions, cycles, penalty in self.opcode_rows():
+            total = totals[mode]
+            total[0] += executions
+            total[1] += cycles
+            total[2] += penalty
+        return sorted(((mode, *total) for mode, total in totals.items() if total[0]), key=lambda row: row[2],
+                      reverse=True)
+
+    def hotspots(self, count: int = 20):
+        """(pc, opcode, mnemonic, executions, cycles) of the `count` pcs with the most cycles"""
+        cycles = np.frombuffer(self.pc_cycles, dtype=np.int64)
+        top = np.argsort(cycles, kind='stable')[::-1][:count]
+        return [(int(pc), self.pc_opcodes[pc], CPU.instructions_lookup[self.pc_opcodes[pc]].mnemonic,
+                 self.pc_executions[pc], int(cycles[pc]))
+                for pc in top if cycles[pc]]
+
+    def write_csv(self, file):
+        writer = csv.writer(file)
+        writer.writerow(OPCODE_COLUMNS)
+        for opcode, *row in self.opcode_rows():
+            writer.writerow([f'{opcode:02X}', *row])
+
+    def write_hotspots_csv(self, file, count: int = 0x10000):
+        writer = csv.writer(file)
+        writer.writerow(HOTSPOT_COLUMNS)
+        for pc, opcode, *row in self.hotspots(count):
+            writer.writerow([f'{pc:04X}', f'{opcode:02X}', *row])
+
+    def write_folded(self, file):
+        """Folded stacks, one `mode;mnemonic;$pc cycles` line per executed pc"""
+        for pc, opcode, mnemonic, _, cycles in self.hotspots(0x10000):
+            file.write(f'{ADDRESSING_MODES[CPU.mode_lookup[opcode]]};{mnemonic};${pc:04X} {cycles}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profiles a ROM by opcode, addressing mode and pc")
+    parser.add_argument('rom_path')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--top', type=int, default=20, help="rows to print per table")
+    parser.add_argument('--csv', help="write the opcode table to this CSV file")
+    parser.add_argument('--hotspots', help="write the pc table to this CSV file")
+    parser.add_argument('--folded', help="write folded stacks for flame graphs to this file")
+    args = parser.parse_args(argv)
+
+    console = Console()
+    console.insert_cartridge(Cartridge.from_file(args.rom_path))
+    profiler = Profiler()
+    profiler.attach(console.cpu)
+    for _ in range(args.frames):
+        console.run_frame()
+    profiler.detach()
+
+    print(f'{"opcode":8}{"mode":6}{"executions":>12}{"cycles":>12}{"penalty":>10}')
+    for opcode, mnemonic, mode, executions, cycles, penalty in profiler.opcode_rows()[:args.top]:
+        print(f'{opcode:02X} {mnemonic:5}{mode:6}{executions:>12,}{cycles:>12,}{penalty:>10,}')
+    print()
+    for mode, executions, cycles, penalty in profiler.mode_rows():
+        print(f'{"":8}{mode:6}{executions:>12,}{cycles:>12,}{penalty:>10,}')
+    print()
+    for pc, opcode, mnemonic, executions, cycles in profiler.hotspots(args.top):
+        print(f'${pc:04X}  {opcode:02X} {mnemonic:5}{executions:>12,}{cycles:>12,}')
+    print(f'\n{profiler.interrupts} interrupts, {profiler.interrupt_cycles:,} cycles')
+    print(f'{profiler.stall_cycles:,} DMA stall cycles')
+
+    for path, write in ((args.csv, profiler.write_csv), (args.hotspots, profiler.write_hotspots_csv),
+                        (args.folded, profiler.write_folded)):
+        if path:
+            with open(path, 'w', newline='') as output:
+                write(output)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+import zlib
+from collections import deque
+import numpy as np
+from .savestate import save_state, load_state
+
+DEFAULT_SECONDS = 10
+DEFAULT_FPS = 60
+DEFAULT_MEMORY_LIMIT = 8 * 1024 * 1024
+COMPRESSION_LEVEL = 1
+
+
+def xor_bytes(data, other) -> bytes:
+    """Bytewise XOR of two equally long bytes-like objects"""
+    return np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), np.frombuffer(other, dtype=np.uint8)).tobytes()
+
+
+class RewindBuffer:
+    """Keeps one save state per frame of a Console, for the last `seconds` of play.
+    Only the newest state is kept whole. Each older one is stored as the zlib compressed XOR of itself with the state
+    after it: mostly zeros, since little of the machine changes in a frame, so each one takes only a few hundred
+    bytes. Rewinding walks the chain back from the newest state; the oldest states are dropped once there are more
+    than `seconds` * `fps` of them or they take more than `memory_limit` bytes.
+    Framebuffers are left out of the states (capture() is meant to be called at frame boundaries, and the next
+    frame redraws it)."""
+    def __init__(self, console, seconds: float = DEFAULT_SECONDS, fps: int = DEFAULT_FPS,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        self.console = console
+        self.capacity = max(int(seconds * fps), 1)
+        self.memory_limit = memory_limit
+        self.deltas = deque()  # Compressed XOR deltas, oldest first; the last one leads back from `latest`
+        self.latest = None  # Uncompressed newest state
+        self.memory_used = 0  # Bytes held by `deltas` and `latest`
+
+    def __len__(self):
+        """Number of states that can be rewound to, the newest one included"""
+        return len(self.deltas) + (self.latest is not None)
+
+    def capture(self):
+        """Adds the console's current state as the newest one"""
+        state = save_state(self.console, compress=False, framebuffer=False)
+        latest = self.latest
+        if latest is not None and len(latest) == len(state):
+            delta = zlib.compress(xor_bytes(state, latest), COMPRESSION_LEVEL)
+            self.deltas.append(delta)
+            self.memory_used += len(delta) - len(latest)
+        elif latest is not None:  # another cartridge, the older states can't be reached anymore
+            self.clear()
+        self.latest = state
+        self.memory_used += len(state)
+        self.trim()
+
+    def trim(self):
+        """Drops the oldest states until the buffer is within both of its limits"""
+        deltas = self.deltas
+        while deltas and (len(deltas) >= self.capacity or self.memory_used > self.memory_limit):
+            self.memory_used -= len(deltas.popleft())
+
+    def rewind(self, frames: int = 1):
+        """Loads the state `frames` captures before the newest one, or the oldest one if there are fewer, and makes
+        it the newest. Returns the number of frames actually rewound"""
+        if self.latest is None:
+            return 0
+        state = self.latest
+        rewound = 0
+        while rewound < frames and self.deltas:
+            delta = self.deltas.pop()
+            self.memory_used -= len(delta)
+            state = xor_bytes(state, zlib.decompress(delta))
+            rewound += 1
+        self.memory_used += len(state) - len(self.latest)
+        self.latest = state
+        load_state(self.console, state)
+        return rewound
+
+    def clear(self):
+        self.deltas.clear()
+        self.latest = None
+        self.memory_used = 0
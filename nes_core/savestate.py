@@ -0,0 +1,208 @@
+"""Save states of a whole Console.
+
+Snapshots are the in-memory form: scalar state as tuples of ints, and every memory (CPU RAM, cartridge PRG and CHR
+RAM, VRAM, palette, OAM and the framebuffer) as a tuple of immutable 256 byte pages. A snapshot taken with `base`
+reuses the base's page objects wherever the memory still holds the same bytes, so a run of snapshots of a machine
+costs little more than what changed between them, and restoring only copies the pages that differ.
+
+save_state()/load_state() go through the same snapshots to and from a versioned binary format: a header followed by
+tagged sections, the memories stored whole with bulk copies, all of it zlib compressed by default.
+
+The framebuffer is optional: a state taken at a frame boundary can leave it out, since the next frame redraws it,
+and restoring such a state leaves the framebuffer alone."""
+import struct
+import zlib
+from .exceptions import SaveStateError
+
+MAGIC = b'PNST'
+VERSION = 3
+FLAG_COMPRESSED = 0x0001
+PAGE_SIZE = 0x100
+
+HEADER = struct.Struct('<4sHH')  # magic, version, flags
+SECTION = struct.Struct('<4sI')  # tag, payload length
+CPU_STATE = struct.Struct('<H6BHB3q')  # matches CPU.get_state(), cycles is wide enough for DMA stalls
+PPU_STATE = struct.Struct('<4B2H4B2Hq2BHhB')  # matches PPU.get_state()
+CLOCK_STATE = struct.Struct('<qq')  # Console system_clock and ppu_clock
+NO_MAPPER = 0xFFFF
+OPTIONAL_REGIONS = {b'FRMB'}
+
+
+class Snapshot:
+    """A Console's complete state, see take_snapshot()"""
+    __slots__ = ('cpu', 'ppu', 'apu', 'clocks', 'mapper_id', 'mapper', 'regions')
+
+    def __init__(self, cpu, ppu, apu, clocks, mapper_id, mapper, regions):
+        self.cpu = cpu  # CPU.get_state()
+        self.ppu = ppu  # PPU.get_state()
+        self.apu = apu  # APU.get_state()
+        self.clocks = clocks  # (system_clock, ppu_clock)
+        self.mapper_id = mapper_id  # NO_MAPPER without a cartridge
+        self.mapper = mapper  # Mapper.get_state()
+        self.regions = regions  # Region tag -> tuple of pages
+
+    def shared_pages(self, other):
+        """Number of pages this snapshot shares with `other` instead of holding its own copy"""
+        return sum(page is other_page
+                   for tag, pages in self.regions.items()
+                   for page, other_page in zip(pages, other.regions.get(tag, ())))
+
+
+def memory_regions(console, framebuffer=True):
+    """(tag, writable memoryview) of every memory a save state holds"""
+    bus, ppu = console.bus, console.ppu
+    regions = [(b'RAM ', bus.memory)]
+    if bus.cartridge is not None:
+        regions.append((b'PRAM', memoryview(bus.cartridge.prg_ram)))
+        regions.append((b'CRAM', memoryview(bus.cartridge.chr_ram)))
+    regions += [(b'VRAM', memoryview(ppu.vram)),
+                (b'PALT', memoryview(ppu.palette)),
+                (b'OAM ', memoryview(ppu.oam))]
+    if framebuffer:
+        regions.append((b'FRMB', memoryview(ppu.framebuffer).cast('B')))
+    return regions
+
+
+def apu_state(console):
+    """APU.get_state() once the APU has caught up with the CPU"""
+    console.apu.sync()
+    return tuple(console.apu.get_state())
+
+
+def take_snapshot(console, base: Snapshot = None, framebuffer=True) -> Snapshot:
+    """Captures `console`, sharing every page that is unchanged since `base` (if given) with it"""
+    mapper = console.bus.mapper
+    regions = {}
+    for tag, buffer in memory_regions(console, framebuffer):
+        shared = base.regions.get(tag, ()) if base is not None else ()
+        pages = []
+        for index, start in enumerate(range(0, len(buffer), PAGE_SIZE)):
+            view = buffer[start:start + PAGE_SIZE]
+            if index < len(shared) and view == shared[index]:
+                pages.append(shared[index])
+            else:
+                pages.append(bytes(view))
+        regions[tag] = tuple(pages)
+    return Snapshot(console.cpu.get_state(), console.ppu.get_state(), apu_state(console),
+                    (console.system_clock, console.ppu_clock),
+                    NO_MAPPER if mapper is None else mapper.mapper_id,
+                    () if mapper is None else tuple(mapper.get_state()), regions)
+
+
+def restore_snapshot(console, snapshot: Snapshot):
+    """Puts `console` back into the state `snapshot` was taken in. Only pages that differ are copied, and only
+    those are reported to the bus page listeners"""
+    bus, ppu = console.bus, console.ppu
+    mapper = bus.mapper
+    if snapshot.mapper_id != (NO_MAPPER if mapper is None else mapper.mapper_id):
+        raise SaveStateError("save state is from another kind of cartridge")
+    if mapper is not None:
+        mapper.set_state(snapshot.mapper)
+
+    for tag, buffer in memory_regions(console):
+        pages = snapshot.regions.get(tag)
+        if pages is None and tag in OPTIONAL_REGIONS:
+            continue
+        if pages is None or sum(map(len, pages)) != len(buffer):
+            raise SaveStateError(f"save state has no matching {tag.decode().strip()} section")
+        changed = []
+        for index, page in enumerate(pages):
+            start = index * PAGE_SIZE
+            if buffer[start:start + len(page)] != page:
+                if tag == b'RAM ':
+                    bus.load(start, page)  # The bus's bulk path, which notifies the page listeners too
+                else:
+                    buffer[start:start + len(page)] = page
+                changed.append(index)
+        if not changed:
+            continue
+        if tag == b'PRAM':
+            bus.pages_changed(0x60, 0x7F)
+        elif tag == b'CRAM':
+            ppu.tile_cache.invalidate()
+
+    console.cpu.set_state(snapshot.cpu)
+    ppu.set_state(snapshot.ppu)
+    console.apu.set_state(snapshot.apu)
+    console.system_clock, console.ppu_clock = snapshot.clocks
+
+
+def _encode(cpu, ppu, apu, clocks, mapper_id, mapper, regions, compress):
+    """Binary save state from the scalar states and (tag, bytes-like) memory regions"""
+    sections = [(b'CPU ', CPU_STATE.pack(*cpu)),
+                (b'PPU ', PPU_STATE.pack(*ppu)),
+                (b'APU ', struct.pack(f'<{len(apu)}q', *apu)),
+                (b'CLCK', CLOCK_STATE.pack(*clocks)),
+                (b'MAPR', struct.pack(f'<H{len(mapper)}q', mapper_id, *mapper))]
+    sections += regions
+    body = b''.join(part for tag, payload in sections for part in (SECTION.pack(tag, len(payload)), payload))
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_COMPRESSED
+    return HEADER.pack(MAGIC, VERSION, flags) + body
+
+
+def encode_snapshot(snapshot: Snapshot, compress=True) -> bytes:
+    """Binary save state of `snapshot`"""
+    return _encode(snapshot.cpu, snapshot.ppu, snapshot.apu, snapshot.clocks, snapshot.mapper_id, snapshot.mapper,
+                   [(tag, b''.join(pages)) for tag, pages in snapshot.regions.items()], compress)
+
+
+def decode_snapshot(data) -> Snapshot:
+    """Snapshot of a binary save state made by encode_snapshot()"""
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise SaveStateError("save state is truncated")
+    magic, version, flags = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveStateError("not a save state")
+    if version != VERSION:
+        raise SaveStateError(f"unsupported save state version {version}")
+    body = data[HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        try:
+            body = memoryview(zlib.decompress(body))
+        except zlib.error as error:
+            raise SaveStateError("save state is corrupt") from error
+
+    sections = {}
+    position = 0
+    while position < len(body):
+        if position + SECTION.size > len(body):
+            raise SaveStateError("save state is truncated")
+        tag, length = SECTION.unpack_from(body, position)
+        position += SECTION.size
+        sections[tag] = body[position:position + length]
+        position += length
+    if position != len(body):
+        raise SaveStateError("save state is truncated")
+
+    try:
+        cpu = CPU_STATE.unpack(sections.pop(b'CPU '))
+        ppu = PPU_STATE.unpack(sections.pop(b'PPU '))
+        apu = sections.pop(b'APU ')
+        clocks = CLOCK_STATE.unpack(sections.pop(b'CLCK'))
+        mapper = sections.pop(b'MAPR')
+    except (KeyError, struct.error) as error:
+        raise SaveStateError("save state is missing a section") from error
+    apu = struct.unpack(f'<{len(apu) // 8}q', apu)
+    mapper_id, = struct.unpack_from('<H', mapper)
+    mapper_state = struct.unpack(f'<{(len(mapper) - 2) // 8}q', mapper[2:])
+    regions = {tag: tuple(bytes(payload[start:start + PAGE_SIZE]) for start in range(0, len(payload), PAGE_SIZE))
+               for tag, payload in sections.items()}
+    return Snapshot(cpu, ppu, apu, clocks, mapper_id, mapper_state, regions)
+
+
+def save_state(console, compress=True, framebuffer=True) -> bytes:
+    """Binary save state of `console`, copying each memory in one go"""
+    mapper = console.bus.mapper
+    return _encode(console.cpu.get_state(), console.ppu.get_state(), apu_state(console),
+                   (console.system_clock, console.ppu_clock),
+                   NO_MAPPER if mapper is None else mapper.mapper_id, () if mapper is None else mapper.get_state(),
+                   memory_regions(console, framebuffer), compress)
+
+
+def load_state(console, data):
+    """Loads a binary save state made by save_state() into `console`"""
+    restore_snapshot(console, decode_snapshot(data))
@@ -0,0 +1,111 @@
+"""Builders shared by the tests: CPUs on a bare bus, ROM images, cartridges, PPUs and consoles."""
+from nes_core.bus import Bus
+from nes_core.cartridge import Cartridge
+from nes_core.console import Console
+from nes_core.cpu import CPU
+from nes_core.ppu import PPU
+
+# Turns on NMIs and rendering, then keeps reading $2002 and filling the nametable
+PROGRAM = bytes([
+    0xA9, 0x80,        # 8000 LDA #$80
+    0x8D, 0x00, 0x20,  # 8002 STA $2000     NMI on
+    0xA9, 0x1E,        # 8005 LDA #$1E
+    0x8D, 0x01, 0x20,  # 8007 STA $2001     rendering on
+    0xA2, 0x00,        # 800A LDX #$00
+    0xAD, 0x02, 0x20,  # 800C LDA $2002
+    0x9D, 0x00, 0x03,  # 800F STA $0300,X   keep every status read
+    0xE8,              # 8012 INX
+    0x8E, 0x05, 0x20,  # 8013 STX $2005
+    0xA9, 0x20,        # 8016 LDA #$20
+    0x8D, 0x06, 0x20,  # 8018 STA $2006
+    0x8E, 0x06, 0x20,  # 801B STX $2006
+    0x8E, 0x07, 0x20,  # 801E STX $2007     fill the nametable
+    0xA0, 0x80,        # 8021 LDY #$80
+    0x88,              # 8023 DEY           a stretch without device accesses
+    0xD0, 0xFD,        # 8024 BNE $8023
+    0x4C, 0x0C, 0x80,  # 8026 JMP $800C
+])
+NMI_HANDLER = bytes([
+    0xE6, 0x10,        # 8040 INC $10       count NMIs
+    0xAD, 0x02, 0x20,  # 8042 LDA $2002
+    0x40,              # 8045 RTI
+])
+HANDLER_ADDRESS = 0x8040
+# Starts an OAM DMA right away, the CPU then sits in its 513 or 514 stall cycles
+DMA_PROGRAM = bytes([
+    0xA9, 0x02,        # 8000 LDA #$02
+    0x8D, 0x14, 0x40,  # 8002 STA $4014
+    0x4C, 0x05, 0x80,  # 8005 JMP $8005
+])
+
+
+def make_cpu(program=b'', origin=0x0200):
+    """A CPU on a bare bus, with `program` loaded at `origin` and pc on it"""
+    bus = Bus()
+    cpu = CPU()
+    cpu.connect_bus(bus)
+    bus.load(origin, program)
+    cpu.pc = origin
+    return cpu, bus
+
+
+def make_rom(prg_banks=1, chr_banks=1, flags6=0x00, flags7=0x00, extra_header=b'', trainer=False):
+    """iNES image, PRG bytes count up from 0 in every bank and CHR is filled with $CC"""
+    header = b'NES\x1a' + bytes([prg_banks, chr_banks, flags6 | (0x04 if trainer else 0), flags7])
+    header += extra_header.ljust(8, b'\x00')
+    body = b'\xAA' * 512 if trainer else b''
+    body += bytes(i & 0xFF for i in range(prg_banks * 16 * 1024))
+    body += b'\xCC' * (chr_banks * 8 * 1024)
+    return header + body
+
+
+def make_program_rom(program=PROGRAM, handler=NMI_HANDLER, nmi=HANDLER_ADDRESS, irq=0x8000):
+    """NROM image with 8 KiB CHR RAM: `program` at $8000 (the reset vector) and `handler` at $8040"""
+    prg = bytearray(0x4000)
+    prg[:len(program)] = program
+    prg[HANDLER_ADDRESS - 0x8000:HANDLER_ADDRESS - 0x8000 + len(handler)] = handler
+    prg[0x3FFA:] = bytes([nmi & 0xFF, nmi >> 8, 0x00, 0x80, irq & 0xFF, irq >> 8])
+    return b'NES\x1a' + bytes([1, 0, 0, 0]) + bytes(8) + prg
+
+
+def make_cartridge(mapper_id, prg_banks, chr_banks):
+    """Every 8 KiB PRG chunk is filled with its index, every 1 KiB CHR chunk with its index"""
+    header = b'NES\x1a' + bytes([prg_banks, chr_banks, (mapper_id & 0x0F) << 4, mapper_id & 0xF0]) + bytes(8)
+    prg = b''.join(bytes([chunk]) * 0x2000 for chunk in range(prg_banks * 2))
+    chr_rom = b''.join(bytes([chunk]) * 0x400 for chunk in range(chr_banks * 8))
+    return Cartridge(header + prg + chr_rom)
+
+
+def insert(cartridge):
+    bus = Bus()
+    bus.insert_cartridge(cartridge)
+    return bus, bus.mapper
+
+
+def make_ppu(flags6=0x00):
+    bus = Bus()
+    bus.insert_cartridge(Cartridge(make_rom(chr_banks=0, flags6=flags6)))  # 8 KiB CHR RAM
+    ppu = PPU()
+    ppu.attach(bus)
+    return ppu, bus
+
+
+def set_address(bus, address):
+    bus.read(0x2002)
+    bus.write(0x2006, address >> 8)
+    bus.write(0x2006, address & 0xFF)
+
+
+def write_data(bus, address, data):
+    set_address(bus, address)
+    for value in data:
+        bus.write(0x2007, value)
+
+
+def make_console(program=PROGRAM):
+    """Console running `program`, with the CPU cycle of every NMI the PPU raises recorded in the returned list"""
+    console = Console()
+    console.insert_cartridge(Cartridge(make_program_rom(program)))
+    nmis = []
+    console.ppu.nmi_handler = lambda: (nmis.append(console.cpu.total_cycles), console.deliver_nmi())
+    return console, nmis
@@ -0,0 +1,199 @@
+import unittest
+import numpy as np
+from nes_core.apu import APU, CPU_CLOCK_RATE, DMC_RATES, FRAME_SEQUENCES
+from nes_core.audio import SampleBuffer
+from nes_core.cartridge import Cartridge
+from nes_core.console import Console
+from nes_core.cpu import IRQ_APU_FRAME, IRQ_DMC
+from nes_core.tests.helpers import make_cpu, make_program_rom, HANDLER_ADDRESS
+
+FRAME_IRQ_CYCLE = FRAME_SEQUENCES[False][-1][0]
+
+# Starts a DMC sample and the frame counter with IRQs on, counting IRQs and keeping every $4015 read
+PROGRAM = bytes([
+    0xA9, 0x1F,        # 8000 LDA #$1F
+    0x8D, 0x15, 0x40,  # 8002 STA $4015     every channel on
+    0xA9, 0xBF,        # 8005 LDA #$BF
+    0x8D, 0x00, 0x40,  # 8007 STA $4000     pulse 1, constant volume 15
+    0x8D, 0x03, 0x40,  # 800A STA $4003
+    0xA9, 0x8F,        # 800D LDA #$8F
+    0x8D, 0x10, 0x40,  # 800F STA $4010     DMC IRQ on, fastest rate
+    0xA9, 0x01,        # 8012 LDA #$01
+    0x8D, 0x13, 0x40,  # 8014 STA $4013     17 byte sample
+    0xA9, 0x1F,        # 8017 LDA #$1F
+    0x8D, 0x15, 0x40,  # 8019 STA $4015     start it
+    0xA9, 0x00,        # 801C LDA #$00
+    0x8D, 0x17, 0x40,  # 801E STA $4017     4 step sequence, frame IRQ on
+    0xA2, 0x00,        # 8021 LDX #$00
+    0x58,              # 8023 CLI
+    0xE6, 0x20,        # 8024 INC $20
+    0x4C, 0x24, 0x80,  # 8026 JMP $8024
+])
+IRQ_HANDLER = bytes([
+    0xAD, 0x15, 0x40,  # 8040 LDA $4015     acknowledges the frame IRQ
+    0x9D, 0x00, 0x03,  # 8043 STA $0300,X
+    0xE8,              # 8046 INX
+    0xA9, 0x1F,        # 8047 LDA #$1F
+    0x8D, 0x15, 0x40,  # 8049 STA $4015     acknowledges the DMC IRQ and restarts the sample
+    0x40,              # 804C RTI
+])
+
+
+def make_console(program=PROGRAM):
+    console = Console()
+    console.insert_cartridge(Cartridge(make_program_rom(program, IRQ_HANDLER, nmi=0x8000, irq=HANDLER_ADDRESS)))
+    return console
+
+
+def make_apu():
+    cpu, bus = make_cpu()
+    apu = APU()
+    apu.attach(bus)
+    apu.connect_cpu(cpu)
+    return apu, bus, cpu
+
+
+class TestAPU(unittest.TestCase):
+    def setUp(self) -> None:
+        self.apu, self.bus, self.cpu = make_apu()
+
+    def run_to(self, cycle):
+        self.cpu.total_cycles = cycle
+        self.apu.run_until(cycle)
+
+    def test_length_counter_and_status(self):
+        bus = self.bus
+        bus.write(0x4003, 0x08)
+        self.assertEqual(bus.read(0x4015), 0x00)  # the channel is off, the length isn't loaded
+        bus.write(0x4015, 0x01)
+        bus.write(0x4003, 0x18)  # length index 3: 2 half frames
+        self.run_to(1)
+        self.assertEqual(bus.read(0x4015) & 0x0F, 0x01)
+        self.run_to(FRAME_SEQUENCES[False][1][0] + 1)
+        self.assertEqual(self.apu.pulse1.length, 1)
+        self.run_to(FRAME_IRQ_CYCLE + 1)
+        self.assertEqual(self.apu.pulse1.length, 0)
+        self.assertEqual(bus.read(0x4015), 0x40)  # the frame IRQ, cleared by the read
+        self.assertEqual(bus.read(0x4015), 0x00)
+
+    def test_frame_irq(self):
+        self.assertLessEqual(self.apu.irq_deadline, FRAME_IRQ_CYCLE + 1)
+        self.run_to(FRAME_IRQ_CYCLE)
+        self.assertEqual(self.apu.irq_deadline, FRAME_IRQ_CYCLE + 1)
+        self.assertFalse(self.cpu.interrupts & IRQ_APU_FRAME)
+        self.run_to(FRAME_IRQ_CYCLE + 1)
+        self.assertTrue(self.cpu.interrupts & IRQ_APU_FRAME)
+        self.bus.read(0x4015)
+        self.assertFalse(self.cpu.interrupts & IRQ_APU_FRAME)
+
+        self.bus.write(0x4017, 0x40)  # inhibited
+        self.run_to(10 * FRAME_IRQ_CYCLE)
+        self.assertFalse(self.cpu.interrupts & IRQ_APU_FRAME)
+        self.bus.write(0x4017, 0x80)  # five steps, no IRQ
+        self.run_to(20 * FRAME_IRQ_CYCLE)
+        self.assertFalse(self.cpu.interrupts & IRQ_APU_FRAME)
+
+    def test_queued_writes_apply_on_their_cycle(self):
+        self.bus.write(0x4015, 0x01)
+        self.cpu.total_cycles = 100
+        self.bus.write(0x4003, 0x08)
+        self.assertEqual(len(self.apu.events), 1)
+        self.assertEqual(self.apu.pulse1.length, 0)
+        self.run_to(100)
+        self.assertEqual(self.apu.pulse1.length, 0)
+        self.run_to(101)
+        self.assertEqual(self.apu.pulse1.length, 254)
+        self.assertFalse(self.apu.events)
+
+    def test_dmc(self):
+        self.bus.load(0xC000, bytes([0xFF, 0x00]))
+        bus = self.bus
+        bus.write(0x4011, 0x40)
+        bus.write(0x4010, 0x8F)
+        bus.write(0x4013, 0x00)  # 1 byte
+        self.run_to(1)
+        bus.write(0x4015, 0x10)
+        self.assertEqual(self.apu.dmc.buffer, 0xFF)
+        self.assertTrue(self.apu.dmc.irq)  # the reader took the only byte at once
+        self.assertTrue(self.cpu.interrupts & IRQ_DMC)
+        self.run_to(1 + 16 * DMC_RATES[0x0F])
+        self.assertEqual(self.apu.dmc.level, 0x40 + 2 * 8)
+
+        bus.write(0x4015, 0x00)
+        self.assertFalse(self.cpu.interrupts & IRQ_DMC)
+        bus.write(0x4013, 0x01)  # 17 bytes, the IRQ comes with the last fetch
+        bus.write(0x4015, 0x10)
+        cycle = self.cpu.total_cycles
+        while not self.cpu.interrupts & IRQ_DMC:
+            self.assertGreaterEqual(self.apu.irq_deadline, cycle)  # never late
+            remaining = self.apu.dmc.bytes_remaining
+            cycle += 1
+            self.run_to(cycle)
+        self.assertEqual((remaining, self.apu.dmc.bytes_remaining), (1, 0))
+        self.assertGreater(cycle, 16 * 8 * DMC_RATES[0x0F])
+        self.assertEqual(self.bus.read(0x4015) & 0x80, 0x80)
+
+    def test_synthesis(self):
+        apu = self.apu
+        apu.output = SampleBuffer(capacity=1 << 16)
+        bus = self.bus
+        bus.write(0x4015, 0x0F)
+        bus.write(0x4000, 0xBF)  # 50% duty, constant volume 15
+        bus.write(0x4002, 0xFD)
+        bus.write(0x4003, 0x08)  # 440 Hz
+        self.run_to(CPU_CLOCK_RATE // 10)
+        samples = apu.output.read()
+        self.assertEqual(len(samples), 4410)
+        self.assertAlmostEqual(samples.max() - samples.min(), 0.1494, places=2)  # pulse 1 at 15, over the triangle
+        highs = samples > (samples.max() + samples.min()) / 2
+        rising = np.count_nonzero(highs[1:] & ~highs[:-1])
+        self.assertIn(rising, (43, 44))
+
+    def test_every_channel_sounds(self):
+        apu = self.apu
+        apu.output = SampleBuffer(capacity=1 << 16)
+        for address, data in ((0x4015, 0x0F), (0x4008, 0xFF), (0x400A, 0x40), (0x400B, 0x08),
+                              (0x400C, 0x3F), (0x400E, 0x04), (0x400F, 0x08)):
+            self.bus.write(address, data)
+        self.run_to(20000)
+        block = apu.block[:, :19999]
+        self.assertEqual(set(np.unique(block[2])), set(range(16)))
+        self.assertEqual(set(np.unique(block[3])), {0, 15})
+        self.assertFalse(block[0].any())
+
+    def test_state_round_trip(self):
+        self.bus.write(0x4015, 0x0F)
+        self.bus.write(0x400F, 0x08)
+        self.run_to(5000)
+        state = self.apu.get_state()
+        other, _, _ = make_apu()
+        other.set_state(state)
+        self.assertEqual(other.get_state(), state)
+        self.assertEqual(other.irq_deadline, self.apu.irq_deadline)
+
+
+class TestAPUConsole(unittest.TestCase):
+    def test_catch_up_matches_lockstep(self):
+        lockstep = make_console()
+        scheduled = make_console()
+        cycles = 3 * FRAME_IRQ_CYCLE + 777
+        for _ in range(3 * cycles):
+            lockstep.clock()
+        scheduled.run(cycles)
+        self.assertEqual(lockstep.cpu.get_state(), scheduled.cpu.get_state())
+        self.assertEqual(lockstep.bus.dump(), scheduled.bus.dump())
+        for console in (lockstep, scheduled):
+            console.apu.sync()
+        self.assertEqual(lockstep.apu.get_state(), scheduled.apu.get_state())
+        self.assertGreaterEqual(scheduled.cpu.x_reg, 10)  # IRQs taken, frame and DMC ones
+
+    def test_run_frame_renders_the_frame(self):
+        console = make_console()
+        console.apu.output = SampleBuffer()
+        console.run_frame()
+        self.assertEqual(console.apu.cycle, console.cpu.total_cycles)
+        self.assertGreater(len(console.apu.output), 700)
+
+
+if __name__ == '__main__':
+    unittest.main()
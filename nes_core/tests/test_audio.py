@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+import wave
+import numpy as np
+from nes_core.audio import SampleBuffer, WaveSink
+
+
+class TestSampleBuffer(unittest.TestCase):
+    def test_fifo(self):
+        buffer = SampleBuffer(capacity=8, block_size=4)
+        buffer.write(np.arange(5))
+        self.assertEqual(list(buffer.read(3)), [0, 1, 2])
+        buffer.write(np.arange(5, 10))
+        self.assertEqual(len(buffer), 7)
+        self.assertEqual(list(buffer.read()), [3, 4, 5, 6, 7, 8, 9])
+
+    def test_overflow_drops_the_oldest(self):
+        buffer = SampleBuffer(capacity=8, block_size=4)
+        buffer.write(np.arange(6))
+        buffer.write(np.arange(6, 12))
+        self.assertEqual(buffer.dropped, 4)
+        self.assertEqual(list(buffer.read()), list(range(4, 12)))
+        buffer.write(np.arange(20))
+        self.assertEqual(list(buffer.read()), list(range(12, 20)))
+
+    def test_sink_gets_whole_blocks(self):
+        blocks = []
+        buffer = SampleBuffer(capacity=8, sink=blocks.append, block_size=4)
+        buffer.write(np.arange(10))
+        self.assertEqual([list(block) for block in blocks], [[0, 1, 2, 3], [4, 5, 6, 7]])
+        buffer.flush()
+        self.assertEqual(list(blocks[-1]), [8, 9])
+        self.assertEqual(buffer.dropped, 0)
+
+    def test_wave_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.wav')
+            sink = WaveSink(path, 22050)
+            buffer = SampleBuffer(22050, sink=sink)
+            buffer.write(np.array([0.0, 0.5, 1.0] * 1000))
+            buffer.flush()
+            sink.close()
+            with wave.open(path) as file:
+                self.assertEqual((file.getnchannels(), file.getsampwidth(), file.getframerate()), (1, 2, 22050))
+                pcm = np.frombuffer(file.readframes(file.getnframes()), dtype='<i2')
+        self.assertEqual(list(pcm[:3]), [-32767, 0, 32767])
+        self.assertEqual(len(pcm), 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from nes_core.batch import emulate, find_roms, make_jobs, run_batch, run_job, main, Job
+from nes_core.console import Console
+from nes_core.cartridge import Cartridge
+from nes_core.tests.helpers import make_program_rom
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = self.directory.name
+        os.mkdir(os.path.join(self.root, 'more'))
+        for name in ('a.nes', os.path.join('more', 'b.nes')):
+            with open(os.path.join(self.root, name), 'wb') as rom:
+                rom.write(make_program_rom())
+        with open(os.path.join(self.root, 'broken.nes'), 'wb') as rom:
+            rom.write(b'not a rom')
+        with open(os.path.join(self.root, 'notes.txt'), 'w') as notes:
+            notes.write('a.nes\n')
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_find_roms_in_directory(self):
+        paths = [path for path, _, _ in find_roms(self.root)]
+        self.assertEqual(paths, [self.path('a.nes'), self.path('broken.nes'),
+                                 self.path(os.path.join('more', 'b.nes'))])
+
+    def test_manifests(self):
+        with open(self.path('roms.txt'), 'w') as manifest:
+            manifest.write('# corpus\na.nes\n\nmore/b.nes  # second\n')
+        self.assertEqual(list(find_roms(self.path('roms.txt'))),
+                         [(self.path('a.nes'), None, None), (self.path('more/b.nes'), None, None)])
+        with open(self.path('roms.json'), 'w') as manifest:
+            json.dump(['a.nes', {'path': 'more/b.nes', 'frames': 2}], manifest)
+        jobs = make_jobs(self.path('roms.json'), frames=5)
+        self.assertEqual([(job.index, job.frames, job.cycles) for job in jobs], [(0, 5, None), (1, 2, None)])
+
+    def test_emulate_budgets(self):
+        console = Console()
+        console.insert_cartridge(Cartridge(make_program_rom()))
+        emulate(console, frames=2)
+        self.assertEqual(console.ppu.frame, 2)
+        emulate(console, cycles=1000)
+        self.assertEqual(console.ppu.frame, 2)
+        emulate(console, frames=5, cycles=40000)
+        self.assertEqual(console.ppu.frame, 3)
+        with self.assertRaises(ValueError):
+            emulate(console)
+
+    def test_run_job(self):
+        with mock.patch.object(Cartridge, 'close', autospec=True, side_effect=Cartridge.close) as close:
+            result = run_job(Job(0, self.path('a.nes'), 2, None))
+        close.assert_called_once()
+        self.assertTrue(close.call_args[0][0]._mmap.closed)
+        self.assertEqual((result['mapper'], result['frames']), (0, 2))
+        self.assertGreater(result['cycles'], 29780)
+        self.assertEqual(len(result['framebuffer_sha1']), 40)
+        self.assertIn('error', run_job(Job(1, self.path('broken.nes'), 2, None)))
+
+    def test_run_batch(self):
+        results = sorted(run_batch(make_jobs(self.root, frames=2), workers=2), key=lambda result: result['index'])
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertIn('error', results[1])
+        for key in ('ram_sha1', 'prg_ram_sha1', 'framebuffer_sha1', 'cycles'):
+            self.assertEqual(results[0][key], results[2][key])
+
+    def test_main_streams_json_lines(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = main([self.path('more'), '--cycles', '5000', '--workers', '1'])
+        self.assertEqual(status, 0)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['frames'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from nes_core.benchmark import run_suite, compare, merge_best, mode_program, make_cpu, MODE_INSTRUCTIONS
+from nes_core.cpu import CPU, ADDRESSING_MODES
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_every_addressing_mode_is_covered(self):
+        self.assertEqual(set(MODE_INSTRUCTIONS), set(ADDRESSING_MODES))
+        for mode in ADDRESSING_MODES:
+            cpu = make_cpu(mode_program(mode))
+            opcode = cpu.bus.read(cpu.pc)
+            self.assertEqual(CPU.instructions_lookup[opcode].addr_mode.__name__, mode)
+
+    def test_suite_report(self):
+        report = run_suite(iterations=40, frames=1, repeat=1)
+        self.assertIn('bus.read', report['results'])
+        self.assertIn('mode.IZY', report['results'])
+        self.assertIn('program.memory.jit', report['results'])
+        self.assertIn('rom.fps', report['results'])
+        self.assertTrue(all(rate > 0 for rate in report['results'].values()))
+
+    def test_compare(self):
+        baseline = {'results': {'a': 100.0, 'b': 100.0, 'gone': 100.0}}
+        report = {'results': {'a': 80.0, 'b': 70.0, 'new': 1.0}}
+        self.assertEqual(compare(report, baseline, tolerance=0.25), [('b', 100.0, 70.0)])
+        merge_best(report, {'results': {'a': 70.0, 'b': 90.0}})
+        self.assertEqual(compare(report, baseline, tolerance=0.25), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,7 @@ class TestBus(unittest.TestCase):
 
     def test_bus_ram_all_initial_zeroes(self):
         bus = Bus()
-        self.assertEqual(bus.ram, [0] * (64 * 1024))
+        self.assertEqual(bus.ram, bytearray(64 * 1024))
 
     def test_write(self):
         bus = Bus()
@@ -26,6 +26,37 @@ class TestBus(unittest.TestCase):
         with self.assertRaises(TypeError):
             bus.write(uint16(0), str(4))
 
+    def test_write_value_out_of_range(self):
+        bus = Bus()
+        with self.assertRaises(ValueError):
+            bus.write(0x0000, 0x100)
+
+    def test_read_returns_int(self):
+        bus = Bus()
+        bus.write(0x1234, 0xAB)
+        self.assertIs(type(bus.read(0x1234)), int)
+        self.assertEqual(bus.read(0x1234), 0xAB)
+
+    def test_load_and_dump(self):
+        bus = Bus()
+        bus.load(0x8000, b'\x01\x02\x03')
+        self.assertEqual(bus.read(0x8001), 0x02)
+        self.assertEqual(bytes(bus.dump(0x8000, 3)), b'\x01\x02\x03')
+
+    def test_dump_is_zero_copy_and_read_only(self):
+        bus = Bus()
+        view = bus.dump()
+        self.assertEqual(len(view), 64 * 1024)
+        bus.write(0x0010, 0x42)
+        self.assertEqual(view[0x0010], 0x42)
+        with self.assertRaises(TypeError):
+            view[0x0010] = 0
+
+    def test_load_out_of_range(self):
+        bus = Bus()
+        with self.assertRaises(ValueError):
+            bus.load(0xFFFF, b'\x00\x00')
+
     def test_write_address_out_of_range(self):
         bus = Bus()
         with self.assertRaises(ValueError):
@@ -39,6 +70,50 @@ class TestBus(unittest.TestCase):
         bus = Bus()
         self.assertFalse(bus.address_in_range(0xFFFF + 1))
 
+    def test_internal_ram_mirroring(self):
+        bus = Bus()
+        bus.write(0x0801, 0x11)
+        self.assertEqual(bus.read(0x0001), 0x11)
+        self.assertEqual(bus.read(0x1801), 0x11)
+
+    def test_map_device(self):
+        bus = Bus()
+        writes = []
+        bus.map_device(0x2000, 0x3FFF, lambda address: address & 0x07, lambda address, data: writes.append(data))
+        self.assertEqual(bus.read(0x2002), 0x02)
+        self.assertEqual(bus.read(0x3FFF), 0x07)
+        bus.write(0x2000, 0x80)
+        self.assertEqual(writes, [0x80])
+
+    def test_map_read_only_memory(self):
+        bus = Bus()
+        writes = []
+        rom = bytes(range(256)) * 2
+        bus.map_memory(0x8000, 0xFFFF, rom, writable=False, write_handler=lambda address, data: writes.append(address))
+        self.assertEqual(bus.read(0x8105), 0x05)
+        self.assertEqual(bus.read(0xFE10), 0x10)  # repeated over the whole range
+        bus.write(0x8000, 0x01)
+        self.assertEqual(bus.read(0x8000), 0x00)
+        self.assertEqual(writes, [0x8000])
+
+    def test_unmap(self):
+        bus = Bus()
+        bus.map_device(0x2000, 0x2FFF, lambda address: 0xFF, lambda address, data: None)
+        bus.unmap(0x2000, 0x2FFF)
+        bus.write(0x2000, 0x01)
+        self.assertEqual(bus.read(0x2000), 0x01)
+
+    def test_read_page(self):
+        bus = Bus()
+        bus.load(0x0200, bytes(range(256)))
+        page = bus.read_page(0x02)
+        self.assertEqual(bytes(page), bytes(range(256)))
+        bus.write(0x02FF, 0x00)
+        self.assertEqual(page[0xFF], 0x00)  # a view, not a copy
+        self.assertEqual(bus.read_page(0x0A)[0xFE:], b'\xFE\x00')  # mirrored
+        bus.map_device(0x2000, 0x3FFF, lambda address: address & 0xFF, lambda address, data: None)
+        self.assertEqual(bytes(bus.read_page(0x21)), bytes(range(256)))
+
 
 if __name__ == '__main__':
     unittest.main()
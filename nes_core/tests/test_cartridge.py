@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from nes_core.bus import Bus
+from nes_core.cartridge import Cartridge, MIRROR_HORIZONTAL, MIRROR_VERTICAL
+from nes_core.exceptions import InvalidRomError
+from nes_core.tests.helpers import make_rom
+
+NESTEST_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'test_roms', 'cpu_nestest.nes')
+
+
+class TestCartridge(unittest.TestCase):
+    def test_nestest_header(self):
+        with Cartridge.from_file(NESTEST_PATH) as cartridge:
+            self.assertEqual(cartridge.mapper_id, 0)
+            self.assertEqual(len(cartridge.prg_rom), 16 * 1024)
+            self.assertEqual(len(cartridge.chr_rom), 8 * 1024)
+            self.assertEqual(cartridge.mirroring, MIRROR_HORIZONTAL)
+            self.assertFalse(cartridge.nes2)
+            self.assertEqual(cartridge.prg_rom[0], 0x4C)  # JMP $C5F5
+
+    def test_rom_is_a_view_not_a_copy(self):
+        cartridge = Cartridge(make_rom())
+        self.assertIsInstance(cartridge.prg_rom, memoryview)
+        self.assertTrue(cartridge.prg_rom.readonly)
+
+    def test_bad_magic(self):
+        with self.assertRaises(InvalidRomError):
+            Cartridge(b'NOPE' + bytes(16 * 1024 + 12))
+
+    def test_truncated_rom(self):
+        with self.assertRaises(InvalidRomError):
+            Cartridge(make_rom()[:-1])
+
+    def test_trainer_is_skipped(self):
+        cartridge = Cartridge(make_rom(trainer=True))
+        self.assertEqual(len(cartridge.trainer), 512)
+        self.assertEqual(cartridge.prg_rom[1], 0x01)
+
+    def test_mapper_and_mirroring(self):
+        cartridge = Cartridge(make_rom(flags6=0x11, flags7=0x40))
+        self.assertEqual(cartridge.mapper_id, 0x41)
+        self.assertEqual(cartridge.mirroring, MIRROR_VERTICAL)
+
+    def test_nes2_header(self):
+        # mapper 0x104 submapper 2, 8 KiB PRG RAM (64 << 7), 8 KiB CHR RAM
+        rom = make_rom(chr_banks=0, flags6=0x40, flags7=0x08, extra_header=bytes([0x21, 0x00, 0x07, 0x07]))
+        cartridge = Cartridge(rom)
+        self.assertTrue(cartridge.nes2)
+        self.assertEqual(cartridge.mapper_id, 0x104)
+        self.assertEqual(cartridge.submapper, 2)
+        self.assertEqual(len(cartridge.prg_ram), 8 * 1024)
+        self.assertEqual(len(cartridge.chr_ram), 8 * 1024)
+        self.assertEqual(len(cartridge.chr), 8 * 1024)
+
+    def test_nes2_battery_backed_ram(self):
+        rom = make_rom(flags6=0x02, flags7=0x08, extra_header=bytes([0x00, 0x00, 0x70, 0x00]))  # 8 KiB PRG-NVRAM
+        cartridge = Cartridge(rom)
+        self.assertTrue(cartridge.has_battery)
+        self.assertEqual(len(cartridge.prg_ram), 8 * 1024)
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'empty.nes')
+            open(path, 'wb').close()
+            with self.assertRaises(InvalidRomError):
+                Cartridge.from_file(path)
+
+    def test_close_unmaps_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'game.nes')
+            with open(path, 'wb') as rom_file:
+                rom_file.write(make_rom())
+            cartridge = Cartridge.from_file(path)
+            bus = Bus()
+            bus.insert_cartridge(cartridge)
+            with self.assertLogs('nes_core.cartridge', 'WARNING'):
+                cartridge.close()  # the mapper still holds slices
+            self.assertFalse(cartridge._mmap.closed)
+            bus.remove_cartridge()
+            cartridge.close()
+            self.assertTrue(cartridge._mmap.closed)
+
+    def test_cartridge_on_bus(self):
+        bus = Bus()
+        bus.insert_cartridge(Cartridge(make_rom()))
+        self.assertEqual(bus.read(0x8005), 0x05)
+        self.assertEqual(bus.read(0xC005), 0x05)  # 16 KiB PRG is mirrored
+        bus.write(0x6000, 0x42)
+        self.assertEqual(bus.read(0x6000), 0x42)
+        bus.write(0x8000, 0x42)  # ROM is not writable
+        self.assertEqual(bus.read(0x8000), 0x00)
+        self.assertEqual(bus.read(0x0000), 0x00)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from nes_core.console import Console
+from nes_core.cpu import IRQ_MAPPER
+from nes_core.ppu import FRAME_DOTS
+from nes_core.tests.helpers import make_cartridge, make_console
+
+
+class TestConsole(unittest.TestCase):
+    def assertSameState(self, console, other):
+        cpu, other_cpu = console.cpu, other.cpu
+        for name in ('pc', 'acc_reg', 'x_reg', 'y_reg', 'status_reg', 'stkp', 'cycles', 'total_cycles'):
+            self.assertEqual(getattr(cpu, name), getattr(other_cpu, name), name)
+        ppu, other_ppu = console.ppu, other.ppu
+        for name in ('scanline', 'dot', 'frame', 'v', 't', 'status', 'ctrl', 'mask', 'data_buffer'):
+            self.assertEqual(getattr(ppu, name), getattr(other_ppu, name), name)
+        self.assertEqual(console.system_clock, other.system_clock)
+        self.assertEqual(console.ppu_clock, other.ppu_clock)
+        self.assertEqual(console.bus.dump(), other.bus.dump())
+        self.assertEqual(ppu.vram, other_ppu.vram)
+        self.assertTrue((ppu.framebuffer == other_ppu.framebuffer).all())
+
+    def test_three_dots_per_cpu_cycle(self):
+        console = Console()
+        console.bus.load(0x0000, bytes([0xEA]) * 0x100)
+        for _ in range(30):
+            console.clock()
+        self.assertEqual(console.cpu.total_cycles, 10)
+        self.assertEqual(console.ppu.dot, 30)
+
+    def test_catch_up_matches_lockstep(self):
+        lockstep, lockstep_nmis = make_console()
+        scheduled, scheduled_nmis = make_console()
+        cycles = 2 * FRAME_DOTS // 3 + 1000
+        for _ in range(3 * cycles):
+            lockstep.clock()
+        scheduled.run(cycles)
+        self.assertSameState(lockstep, scheduled)
+        self.assertEqual(lockstep_nmis, scheduled_nmis)
+        self.assertEqual(len(scheduled_nmis), 2)
+        self.assertEqual(scheduled.bus.read(0x0010), 2)  # both were taken
+        self.assertLess(scheduled.syncs, cycles // 4)
+
+    def test_unaligned_run(self):
+        lockstep, lockstep_nmis = make_console()
+        scheduled, scheduled_nmis = make_console()
+        for console in (lockstep, scheduled):
+            console.clock()
+        for _ in range(3 * 5000 + 1):
+            lockstep.clock()
+        scheduled.run(5000)
+        scheduled.clock()
+        self.assertSameState(lockstep, scheduled)
+
+    def test_mapper_irq_line(self):
+        console = Console()
+        console.insert_cartridge(make_cartridge(4, 2, 2))  # MMC3
+        console.bus.mapper.set_irq(True)
+        self.assertEqual(console.cpu.interrupts, IRQ_MAPPER)
+        console.bus.write(0xE000, 0x00)  # acknowledge
+        self.assertEqual(console.cpu.interrupts, 0)
+
+    def test_run_frame(self):
+        console, nmis = make_console()
+        console.run_frame()
+        self.assertEqual((console.ppu.frame, console.ppu.scanline), (1, 0))
+        self.assertLess(console.ppu.dot, 3)
+        self.assertEqual(console.system_clock % 3, 0)
+
+    def test_oam_dma(self):
+        program = bytes([
+            0xA9, 0x10,        # 8000 LDA #$10
+            0x8D, 0x03, 0x20,  # 8002 STA $2003     OAMADDR
+            0xA9, 0x02,        # 8005 LDA #$02
+            0x8D, 0x14, 0x40,  # 8007 STA $4014     DMA from $0200
+            0xE8,              # 800A INX
+            0x8D, 0x14, 0x40,  # 800B STA $4014
+            0x4C, 0x0E, 0x80,  # 800E JMP $800E
+        ])
+        lockstep, _ = make_console(program)
+        scheduled, _ = make_console(program)
+        for console in (lockstep, scheduled):
+            console.bus.load(0x0200, bytes(range(256)))
+        for _ in range(3 * 2000):
+            lockstep.clock()
+        scheduled.run(2000)
+        self.assertSameState(lockstep, scheduled)
+        self.assertEqual(bytes(scheduled.ppu.oam), bytes(range(0xF0, 0x100)) + bytes(range(0xF0)))
+        # The first write lands on an even cycle (18), the second on an odd one (537)
+        self.assertEqual(scheduled.cpu.stall_cycles, 513 + 514)
+
+        console, _ = make_console(program)
+        console.cpu.run_until(pc=0x8007)
+        self.assertEqual(console.cpu.run_until(pc=0x800A), 4 + 513)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
-from nes_core.cpu import CPU
+from nes_core.cpu import CPU, ADDRESSING_MODES, OPERATIONS, IRQ_MAPPER, IRQ_APU_FRAME
+from nes_core.jit import BlockEngine
 from nes_core.bus import Bus
 from nes_core.exceptions import NoBusConnectedError
+from nes_core.trace import ListTraceSink
 from numpy import uint8, uint16
 
 
@@ -21,12 +23,111 @@ class TestCPU(unittest.TestCase):
         with self.assertRaises(NoBusConnectedError):
             self.cpu.read_from_bus(uint16(0))
 
+    def test_ram_with_no_bus(self):
+        self.cpu.stkp = 0xFD
+        with self.assertRaises(NoBusConnectedError):
+            self.cpu.push(0x42)
+        with self.assertRaises(NoBusConnectedError):
+            self.cpu.write_memory(0x0010, 0x42)
+
     def test_write_to_bus(self):  # refactor later as an integration test
         self.cpu.connect_bus(self.bus)
         self.cpu.write_to_bus(uint16(0), uint8(1))
         self.assertEqual(self.bus.read(uint16(0)), uint8(1))
 
 
+class TestCPURegisters(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = Bus()
+        self.cpu = CPU()
+        self.cpu.connect_bus(self.bus)
+
+    def test_registers_are_plain_ints(self):
+        self.cpu.acc_reg = uint8(0x12)
+        self.cpu.pc = uint16(0x1234)
+        self.assertIs(type(self.cpu.acc_reg), int)
+        self.assertIs(type(self.cpu.pc), int)
+
+    def test_8_bit_registers_wrap(self):
+        self.cpu.acc_reg = 0x1FF
+        self.cpu.x_reg = -1
+        self.cpu.y_reg = 0x100
+        self.cpu.stkp = 0x1FD
+        self.cpu.status_reg = 0x3FF
+        self.assertEqual(self.cpu.acc_reg, 0xFF)
+        self.assertEqual(self.cpu.x_reg, 0xFF)
+        self.assertEqual(self.cpu.y_reg, 0x00)
+        self.assertEqual(self.cpu.stkp, 0xFD)
+        self.assertEqual(self.cpu.status_reg, 0xFF)
+
+    def test_program_counter_wraps(self):
+        self.cpu.pc = 0xFFFF
+        self.cpu.pc += 1
+        self.assertEqual(self.cpu.pc, 0x0000)
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            self.cpu.not_a_register = 1
+
+    def test_ZPX_wraps_within_zero_page(self):
+        self.bus.write(0x0000, 0xF0)
+        self.cpu.x_reg = 0x20
+        self.cpu.ZPX()
+        self.assertEqual(self.cpu.addr_abs, 0x0010)
+
+    def test_ABX_wraps_address_space(self):
+        self.bus.write(0x0000, 0xFF)
+        self.bus.write(0x0001, 0xFF)
+        self.cpu.x_reg = 0x02
+        self.assertEqual(self.cpu.ABX(), 1)
+        self.assertEqual(self.cpu.addr_abs, 0x0001)
+        self.assertEqual(self.cpu.pc, 0x0002)
+
+    def test_IMM_points_at_operand(self):
+        self.cpu.pc = 0x0010
+        self.cpu.IMM()
+        self.assertEqual(self.cpu.addr_abs, 0x0010)
+        self.assertEqual(self.cpu.pc, 0x0011)
+
+
+class TestCPUDispatchTables(unittest.TestCase):
+    def test_tables_are_shared_between_instances(self):
+        self.assertIs(CPU().handler_lookup, CPU().handler_lookup)
+        self.assertIs(CPU().instructions_lookup, CPU.instructions_lookup)
+
+    def test_tables_cover_every_opcode(self):
+        for table in (CPU.instructions_lookup, CPU.cycles_lookup, CPU.mode_lookup,
+                      CPU.operation_lookup, CPU.handler_lookup):
+            self.assertEqual(len(table), 256)
+
+    def test_parallel_tables_agree(self):
+        for opcode, instruction in enumerate(CPU.instructions_lookup):
+            self.assertEqual(CPU.cycles_lookup[opcode], instruction.cycles)
+            self.assertEqual(ADDRESSING_MODES[CPU.mode_lookup[opcode]], instruction.addr_mode.__name__)
+            self.assertEqual(OPERATIONS[CPU.operation_lookup[opcode]], instruction.operation.__name__)
+
+    def test_fetch_implied_uses_accumulator(self):
+        bus = Bus()
+        cpu = CPU()
+        cpu.connect_bus(bus)
+        bus.write(0x0000, 0x0A)  # ASL A, implied
+        bus.write(0x0010, 0x55)
+        cpu.acc_reg = 0x33
+        cpu.addr_abs = 0x0010
+        cpu.opcode = 0x0A
+        cpu.IMP()
+        self.assertEqual(cpu.fetch(), 0x33)
+
+    def test_fetch_reads_memory_for_other_modes(self):
+        bus = Bus()
+        cpu = CPU()
+        cpu.connect_bus(bus)
+        bus.write(0x0010, 0x55)
+        cpu.opcode = 0x25  # AND zero page
+        cpu.addr_abs = 0x0010
+        self.assertEqual(cpu.fetch(), 0x55)
+
+
 class TestCPUBranchingInstructions(unittest.TestCase):
     def setUp(self) -> None:
         self.bus = Bus()
@@ -213,6 +314,36 @@ class TestCPUInstructions(unittest.TestCase):
         self.cpu.clock()
         self.assertEqual(self.cpu.cycles, 6)
 
+    def test_shifts_and_BIT(self):
+        # (program, a, carry in) -> (a, status N V Z C bits)
+        cases = {(b'\x0A', 0x80, 1): (0x00, 0x03),  # ASL A
+                 (b'\x2A', 0x40, 1): (0x81, 0x80),  # ROL A
+                 (b'\x4A', 0x01, 1): (0x00, 0x03),  # LSR A
+                 (b'\x6A', 0x02, 1): (0x81, 0x80),  # ROR A
+                 (b'\x24\x10', 0x3F, 1): (0x3F, 0xC3)}  # BIT $10, with $C0 there
+        for (program, a, carry), (result, flags) in cases.items():
+            self.bus.load(0x0200, program)
+            self.bus.write(0x0010, 0xC0)
+            self.cpu.pc = 0x0200
+            self.cpu.acc_reg = a
+            self.cpu.status_reg = 0x20 | carry
+            self.cpu.run_instructions(1)
+            self.assertEqual((self.cpu.acc_reg, self.cpu.status_reg & 0xC3), (result, flags), program)
+
+    def test_BRK_RTI(self):
+        self.cpu.stkp = 0xFD
+        self.cpu.status_reg = 0x20 | self.cpu.status_map['C']
+        self.bus.load(0xFFFE, bytes([0x00, 0x03]))
+        self.bus.load(0x0300, bytes([0x40]))  # RTI
+        self.bus.load(0x0200, bytes([0x00, 0xFF]))  # BRK and its padding byte
+        self.cpu.pc = 0x0200
+        self.assertEqual(self.cpu.run_instructions(1), 7)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp), (0x0300, 0xFA))
+        self.assertEqual(bytes(self.bus.dump(0x01FB, 3)), bytes([0x31, 0x02, 0x02]))  # status with B, then pc + 2
+        self.assertTrue(self.cpu.status_reg & self.cpu.status_map['I'])
+        self.cpu.run_instructions(1)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp, self.cpu.status_reg), (0x0202, 0xFD, 0x21))
+
     def test_CLC(self):
         self.cpu.status_reg |= self.cpu.status_map['C']
         self.bus.write(uint16(0x0000), uint8(0x18))
@@ -237,6 +368,206 @@ class TestCPUInstructions(unittest.TestCase):
         self.cpu.clock()
         self.assertFalse(self.cpu.status_reg & self.cpu.status_map['V'])
 
+    def test_ADC_overflow(self):
+        self.cpu.acc_reg = 0x50
+        self.bus.load(0x0000, bytes([0x69, 0x50]))  # ADC #$50
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.cpu.acc_reg, 0xA0)
+        self.assertTrue(self.cpu.status_reg & self.cpu.status_map['V'])
+        self.assertTrue(self.cpu.status_reg & self.cpu.status_map['N'])
+        self.assertFalse(self.cpu.status_reg & self.cpu.status_map['C'])
+
+    def test_SBC_borrow(self):
+        self.cpu.acc_reg = 0x00
+        self.cpu.status_reg = self.cpu.status_map['C']
+        self.bus.load(0x0000, bytes([0xE9, 0x01]))  # SBC #$01
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.cpu.acc_reg, 0xFF)
+        self.assertFalse(self.cpu.status_reg & self.cpu.status_map['C'])
+
+    def test_JSR_RTS(self):
+        self.cpu.stkp = 0xFD
+        self.bus.load(0x0000, bytes([0x20, 0x10, 0x00]))  # JSR $0010
+        self.bus.load(0x0010, bytes([0x60]))  # RTS
+        self.cpu.run_instructions(1)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp), (0x0010, 0xFB))
+        self.assertEqual((self.bus.read(0x01FD), self.bus.read(0x01FC)), (0x00, 0x02))
+        self.cpu.run_instructions(1)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp), (0x0003, 0xFD))
+
+    def test_ASL_memory(self):
+        self.bus.load(0x0000, bytes([0x06, 0x10]))  # ASL $10
+        self.bus.write(0x0010, 0x81)
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.bus.read(0x0010), 0x02)
+        self.assertTrue(self.cpu.status_reg & self.cpu.status_map['C'])
+
+    def test_zero_page_and_stack_are_internal_ram(self):
+        self.cpu.stkp = 0xFD
+        self.cpu.x_reg = 0x04
+        self.bus.load(0x0300, bytes([0xA9, 0x42,   # LDA #$42
+                                     0x85, 0x20,   # STA $20
+                                     0x48,         # PHA
+                                     0xA1, 0x1C]))  # LDA ($1C,X)
+        self.bus.write(0x0821, 0x02)  # through a mirror, the pointer at $20 is $0242 once the STA lands
+        self.bus.write(0x0242, 0x99)
+        self.cpu.pc = 0x0300
+        self.cpu.run_instructions(4)
+        self.assertEqual(self.bus.read(0x1820), 0x42)
+        self.assertEqual(self.bus.read(0x09FD), 0x42)
+        self.assertEqual(self.cpu.acc_reg, 0x99)
+
+
+class TestCPURunAPI(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = Bus()
+        self.cpu = CPU()
+        self.cpu.connect_bus(self.bus)
+        self.bus.load(0x0000, bytes([0xEA]) * 0x100)  # NOP sled, 2 cycles each
+
+    def test_run_matches_clock(self):
+        reference_cpu = CPU()
+        reference_cpu.connect_bus(self.bus)
+        for _ in range(7):
+            reference_cpu.clock()
+        self.assertEqual(self.cpu.run(7), 7)
+        self.assertEqual(self.cpu.pc, reference_cpu.pc)
+        self.assertEqual(self.cpu.cycles, reference_cpu.cycles)
+        self.assertEqual(self.cpu.total_cycles, reference_cpu.total_cycles)
+
+    def test_run_finishes_instruction_in_flight(self):
+        self.cpu.clock()
+        self.cpu.run(1)
+        self.assertEqual(self.cpu.cycles, 0)
+        self.assertEqual(self.cpu.pc, 0x0001)
+        self.cpu.run(3)
+        self.assertEqual(self.cpu.cycles, 1)
+        self.assertEqual(self.cpu.pc, 0x0003)
+        self.assertEqual(self.cpu.total_cycles, 5)
+
+    def test_run_zero_cycles(self):
+        self.assertEqual(self.cpu.run(0), 0)
+        self.assertEqual(self.cpu.pc, 0x0000)
+
+    def test_run_instructions(self):
+        self.assertEqual(self.cpu.run_instructions(3), 6)
+        self.assertEqual(self.cpu.pc, 0x0003)
+        self.assertEqual(self.cpu.cycles, 0)
+        self.assertEqual(self.cpu.total_cycles, 6)
+
+    def test_run_until_pc(self):
+        self.assertEqual(self.cpu.run_until(pc=0x0010), 32)
+        self.assertEqual(self.cpu.pc, 0x0010)
+
+    def test_run_until_cycles(self):
+        self.assertEqual(self.cpu.run_until(cycles=7), 8)
+        self.assertEqual(self.cpu.pc, 0x0004)
+
+    def test_run_until_needs_a_limit(self):
+        with self.assertRaises(ValueError):
+            self.cpu.run_until()
+
+
+class TestCPUInterrupts(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = Bus()
+        self.cpu = CPU()
+        self.cpu.connect_bus(self.bus)
+        self.bus.load(0x0200, bytes([0xEA]) * 0x100)  # NOP sled
+        self.bus.load(0x0300, bytes([0x40]))  # RTI
+        self.bus.load(0x0310, bytes([0x40]))
+        self.bus.load(0xFFFA, bytes([0x00, 0x03, 0x00, 0x02, 0x10, 0x03]))  # NMI $0300, reset $0200, IRQ $0310
+        self.cpu.reset()
+        self.cpu.run(7)
+
+    def test_reset(self):
+        self.assertEqual((self.cpu.pc, self.cpu.stkp, self.cpu.status_reg), (0x0200, 0xFD, 0x24))
+        self.assertEqual(self.cpu.total_cycles, 7)
+
+    def test_nmi(self):
+        self.cpu.nmi()
+        self.cpu.run_instructions(1)  # the edge arrived too late for this boundary
+        self.assertEqual(self.cpu.pc, 0x0201)
+        self.assertEqual(self.cpu.run_instructions(1), 7)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp), (0x0300, 0xFA))
+        self.assertEqual(bytes(self.bus.dump(0x01FB, 3)), bytes([0x24, 0x01, 0x02]))  # status without B, then pc
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.cpu.pc, 0x0201)
+        self.cpu.run_instructions(2)  # an edge is only taken once
+        self.assertEqual(self.cpu.pc, 0x0203)
+
+    def test_nmi_ignores_I(self):
+        self.cpu.run_instructions(1)
+        self.cpu.nmi()
+        self.cpu.total_cycles += 2
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.cpu.pc, 0x0300)
+
+    def test_irq_is_masked_by_I(self):
+        self.cpu.irq()
+        self.cpu.run_instructions(3)
+        self.assertEqual(self.cpu.pc, 0x0203)
+
+    def test_irq_is_level_triggered(self):
+        self.bus.load(0x0200, bytes([0x58]))  # CLI
+        self.cpu.irq()
+        self.cpu.run_instructions(2)  # CLI, then one more instruction before the IRQ gets in
+        self.assertEqual(self.cpu.pc, 0x0202)
+        self.cpu.run_instructions(1)
+        self.assertEqual(self.cpu.pc, 0x0310)
+        self.cpu.run_instructions(2)  # RTI clears I again, the line is still down
+        self.assertEqual(self.cpu.pc, 0x0310)
+        self.cpu.irq(False)
+        self.cpu.run_instructions(2)
+        self.assertEqual(self.cpu.pc, 0x0203)
+
+    def test_irq_sources(self):
+        self.cpu.irq(True, IRQ_MAPPER)
+        self.cpu.irq(True, IRQ_APU_FRAME)
+        self.cpu.irq(False, IRQ_MAPPER)
+        self.assertEqual(self.cpu.interrupts, IRQ_APU_FRAME)
+
+    def test_block_engine_takes_interrupts(self):
+        self.bus.load(0x8000, bytes([0xEA] * 8 + [0x4C, 0x00, 0x80]))  # a loop the engine compiles into one block
+        self.cpu.pc = 0x8000
+        engine = BlockEngine(self.cpu)
+        engine.run(100)
+        self.cpu.nmi()
+        engine.run_until(pc=0x0300, cycles=30)
+        self.assertEqual((self.cpu.pc, self.cpu.stkp), (0x0300, 0xFA))
+
+
+class TestCPUTracing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bus = Bus()
+        self.cpu = CPU()
+        self.cpu.connect_bus(self.bus)
+
+    def test_tracing_disabled_by_default(self):
+        self.assertIsNone(self.cpu.trace_sink)
+
+    def test_trace_record_per_instruction(self):
+        sink = ListTraceSink()
+        self.cpu.set_trace_sink(sink)
+        self.bus.write(uint16(0x0000), uint8(0x18))  # CLC
+        self.cpu.status_reg = uint8(0b00000001)
+        self.cpu.clock()
+        self.cpu.clock()  # second cycle of CLC, no new record
+        self.assertEqual(len(sink), 1)
+        record = sink.records[0]
+        self.assertEqual(record.pc, 0x0000)
+        self.assertEqual(record.opcode, 0x18)
+        self.assertEqual(record.mnemonic, 'CLC')
+        self.assertEqual(record.p, 0b00000001)
+        self.assertEqual(record.cycles, 2)
+
+    def test_trace_sink_removed(self):
+        sink = ListTraceSink()
+        self.cpu.set_trace_sink(sink)
+        self.cpu.set_trace_sink(None)
+        self.cpu.clock()
+        self.assertEqual(len(sink), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from nes_core.bus import Bus
+from nes_core.cartridge import Cartridge
+from nes_core.decode import DecodeCache
+from nes_core.tests.helpers import make_cpu
+
+PROGRAM = bytes([
+    0x29, 0xF0,        # 8000 AND #$F0
+    0x3D, 0xFF, 0x80,  # 8002 AND $80FF,X  crosses into $8100
+    0x18,              # 8005 CLC
+    0xD0, 0xF8,        # 8006 BNE $8000
+])
+
+
+def make_cached_cpu(cached):
+    cpu, bus = make_cpu(PROGRAM, 0x8000)
+    bus.load(0x8100, b'\xFF')
+    cpu.acc_reg = 0xFF
+    cpu.x_reg = 0x01
+    if cached:
+        cpu.set_decode_cache(DecodeCache(bus))
+    return cpu, bus
+
+
+class TestDecodeCache(unittest.TestCase):
+    def test_same_result_as_decoding(self):
+        cpu, bus = make_cached_cpu(cached=False)
+        cached_cpu, cached_bus = make_cached_cpu(cached=True)
+        self.assertEqual(cpu.run(1001), cached_cpu.run(1001))
+        for register in ('pc', 'acc_reg', 'x_reg', 'status_reg', 'cycles', 'total_cycles', 'addr_abs'):
+            self.assertEqual(getattr(cpu, register), getattr(cached_cpu, register), register)
+
+    def test_entries_are_reused(self):
+        cpu, bus = make_cached_cpu(cached=True)
+        cpu.run_instructions(4)
+        entry = cpu.decode_cache.entries[0x8000]
+        self.assertEqual(entry[:3], (0x29, 0x8001, 0x8002))
+        cpu.run_instructions(4)
+        self.assertIs(cpu.decode_cache.entries[0x8000], entry)
+
+    def test_write_to_cached_code_invalidates(self):
+        cpu, bus = make_cached_cpu(cached=True)
+        cpu.run_instructions(4)
+        bus.write(0x8005, 0xEA)  # CLC -> NOP
+        self.assertIsNone(cpu.decode_cache.entries[0x8000])
+        self.assertEqual(bus.read(0x8005), 0xEA)
+        cpu.run_instructions(3)
+        self.assertEqual(cpu.opcode, 0xEA)
+
+    def test_write_trap_removed_after_invalidation(self):
+        cpu, bus = make_cached_cpu(cached=True)
+        cpu.run_instructions(1)
+        self.assertIsNone(bus.write_pages[0x80])
+        bus.write(0x80F0, 0x00)
+        self.assertIsNotNone(bus.write_pages[0x80])
+
+    def test_load_invalidates(self):
+        cpu, bus = make_cached_cpu(cached=True)
+        cpu.run_instructions(1)
+        bus.load(0x8000, b'\xEA')
+        self.assertIsNone(cpu.decode_cache.entries[0x8000])
+
+    def test_internal_ram_is_not_cached(self):
+        bus = Bus()
+        cache = DecodeCache(bus)
+        self.assertIsNone(cache.decode(0x0000))
+
+    def test_instruction_crossing_a_page_is_not_cached(self):
+        bus = Bus()
+        bus.load(0x80FE, b'\x3D\x00\x00')  # AND abs,X split over two pages
+        cache = DecodeCache(bus)
+        self.assertIsNone(cache.decode(0x80FE))
+
+    def test_bank_switch_invalidates(self):
+        header = b'NES\x1a' + bytes([2, 0, 0x20, 0x00]) + bytes(8)  # UxROM, 2 PRG banks, CHR RAM
+        cartridge = Cartridge(header + b'\xEA' * 0x4000 + b'\x18' * 0x4000)
+        cpu, bus = make_cpu()
+        bus.insert_cartridge(cartridge)
+        cpu.set_decode_cache(DecodeCache(bus))
+        cpu.pc = 0x8000
+        cpu.run_instructions(1)
+        self.assertEqual(cpu.opcode, 0xEA)
+        bus.write(0xC000, 1)
+        cpu.pc = 0x8000
+        cpu.run_instructions(1)
+        self.assertEqual(cpu.opcode, 0x18)
+
+    def test_detach(self):
+        cpu, bus = make_cached_cpu(cached=True)
+        cache = cpu.decode_cache
+        cpu.run_instructions(1)
+        cpu.set_decode_cache(None)
+        self.assertNotIn(cache.invalidate_pages, bus.page_listeners)
+        self.assertIsNotNone(bus.write_pages[0x80])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+from nes_core.decode import DecodeCache
+from nes_core.fleet import Fleet
+from nes_core.nestest import nestest_cpu, OFFICIAL_END
+from nes_core.ppu import PPU
+from nes_core.tests.helpers import make_cpu
+
+# Adds up a lane specific byte at $0010 in a loop whose length and branches depend on it
+PROGRAM = bytes([
+    0xA2, 0x00,        # 0200 LDX #$00
+    0xA5, 0x10,        # 0202 LDA $10
+    0x4A,              # 0204 LSR A
+    0x90, 0x03,        # 0205 BCC $020A
+    0xEE, 0x00, 0x03,  # 0207 INC $0300
+    0x18,              # 020A CLC
+    0x7D, 0xF0, 0x02,  # 020B ADC $02F0,X     crosses a page for X >= $10
+    0x9D, 0x00, 0x0B,  # 020E STA $0B00,X     lands on the $0300 mirror
+    0x48,              # 0211 PHA
+    0x20, 0x30, 0x02,  # 0212 JSR $0230
+    0x68,              # 0215 PLA
+    0xE8,              # 0216 INX
+    0xE4, 0x10,        # 0217 CPX $10
+    0xD0, 0xF0,        # 0219 BNE $020B
+    0x00, 0x00,        # 021B BRK
+])
+SUBROUTINE = bytes([0xC6, 0x11, 0x60])  # 0230 DEC $11, RTS
+
+
+def make_lane_cpu(value):
+    cpu, bus = make_cpu(PROGRAM)
+    bus.load(0x0230, SUBROUTINE)
+    bus.load(0xFFFE, bytes([0x1B, 0x02]))  # BRK loops on itself
+    bus.write(0x0010, value)
+    cpu.stkp = 0xFD
+    return cpu
+
+
+class TestFleet(unittest.TestCase):
+    def assertLaneMatches(self, fleet, lane, cpu):
+        self.assertEqual((int(fleet.pc[lane]), int(fleet.a[lane]), int(fleet.x[lane]), int(fleet.y[lane]),
+                          int(fleet.status[lane]), int(fleet.stkp[lane]), int(fleet.total_cycles[lane])),
+                         (cpu.pc, cpu.acc_reg, cpu.x_reg, cpu.y_reg, cpu.status_reg, cpu.stkp, cpu.total_cycles))
+        self.assertEqual(fleet.memory[lane, :0x0800].tobytes(), bytes(cpu.bus.dump(0x0000, 0x0800)))
+
+    def test_nestest(self):
+        with nestest_cpu() as cpu:
+            fleet = Fleet.from_cpu(cpu, 3)
+            while cpu.pc != OFFICIAL_END:
+                cpu.run_instructions(1)
+                fleet.step()
+            for lane in range(3):
+                self.assertLaneMatches(fleet, lane, cpu)
+            self.assertFalse(fleet.device_access.any())
+
+    def test_divergent_lanes(self):
+        values = [1, 2, 7, 0x13, 0x20, 0x41, 0x80, 0xFF]
+        fleet = Fleet.from_cpu(make_lane_cpu(0), len(values))
+        fleet.memory[:, 0x0010] = values
+        fleet.run_until(3000)
+        for lane, value in enumerate(values):
+            cpu = make_lane_cpu(value)
+            cpu.run_until(cycles=3000)
+            self.assertLaneMatches(fleet, lane, cpu)
+
+    def test_masked_lanes_stay_put(self):
+        fleet = Fleet.from_cpu(make_lane_cpu(3), 2)
+        fleet.step(np.array([True, False]))
+        self.assertEqual(list(fleet.pc), [0x0202, 0x0200])
+        self.assertEqual(list(fleet.total_cycles), [2, 0])
+
+    def test_load(self):
+        fleet = Fleet(3)
+        fleet.load(0x0010, b'\x01\x02', lanes=[1])
+        self.assertEqual(fleet.memory[:, 0x0010].tolist(), [0, 1, 0])
+
+    def test_devices_and_read_only_pages(self):
+        cpu, bus = make_cpu(bytes([0x8D, 0x00, 0x80,    # STA $8000
+                                   0xAD, 0x02, 0x20]),  # LDA $2002
+                            0x0000)
+        PPU().attach(bus)
+        bus.map_memory(0x8000, 0xFFFF, bytes(0x8000), writable=False)
+        cpu.acc_reg = 0x42
+        fleet = Fleet.from_cpu(cpu, 2)
+        fleet.step()
+        self.assertEqual(fleet.memory[0, 0x8000], 0)
+        self.assertFalse(fleet.device_access.any())
+        fleet.step()
+        self.assertTrue(fleet.device_access.all())
+
+    def test_trapped_pages_stay_writable(self):
+        cpu, bus = make_cpu(bytes([0xA9, 0xEA, 0x8D, 0x10, 0x60]), 0x6000)  # 6000 LDA #$EA, STA $6010
+        cpu.set_decode_cache(DecodeCache(bus))
+        cpu.run_instructions(1)
+        self.assertIsNone(bus.write_pages[0x60])  # the cached code put a write trap on its page
+        fleet = Fleet.from_cpu(cpu, 2)
+        self.assertTrue(fleet.writable_pages[0x60])
+        fleet.step()
+        self.assertEqual(fleet.memory[:, 0x6010].tolist(), [0xEA, 0xEA])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from nes_core.jit import BlockEngine
+from nes_core.tests.helpers import make_cpu
+
+PROGRAM = bytes([
+    0x29, 0xF0,        # 8000 AND #$F0
+    0x3D, 0xFF, 0x80,  # 8002 AND $80FF,X  crosses into $8100
+    0x35, 0x10,        # 8005 AND $10,X
+    0xB8,              # 8007 CLV
+    0x18,              # 8008 CLC
+    0xD0, 0xF5,        # 8009 BNE $8000
+])
+
+
+def make_loop_cpu(program=PROGRAM):
+    cpu, bus = make_cpu(program, 0x8000)
+    bus.load(0x8100, b'\xFF')
+    bus.load(0x0010, b'\xFF\xFF')  # keeps the accumulator non-zero, so the loop never exits
+    cpu.acc_reg = 0xFF
+    cpu.x_reg = 0x01
+    return cpu, bus
+
+
+class TestBlockEngine(unittest.TestCase):
+    def assertSameState(self, cpu, other):
+        for register in ('pc', 'acc_reg', 'x_reg', 'y_reg', 'status_reg', 'cycles', 'total_cycles', 'addr_abs'):
+            self.assertEqual(getattr(cpu, register), getattr(other, register), register)
+
+    def test_matches_interpreter(self):
+        for budget in (1, 2, 7, 13, 100, 1001):
+            cpu, bus = make_loop_cpu()
+            jit_cpu, jit_bus = make_loop_cpu()
+            engine = BlockEngine(jit_cpu)
+            self.assertEqual(cpu.run(budget), engine.run(budget))
+            self.assertSameState(cpu, jit_cpu)
+            self.assertEqual(cpu.run(budget), engine.run(budget))
+            self.assertSameState(cpu, jit_cpu)
+
+    def test_block_is_compiled_once(self):
+        cpu, bus = make_loop_cpu()
+        engine = BlockEngine(cpu)
+        engine.run(100)
+        block = engine.blocks.entries[0x8000]
+        self.assertEqual((block.start, block.end, block.length), (0x8000, 0x800B, 6))
+        self.assertEqual(block.max_cycles, 2 + 5 + 4 + 2 + 2 + 4)
+        engine.run(100)
+        self.assertIs(engine.blocks.entries[0x8000], block)
+
+    def test_unsafe_access_ends_block(self):
+        program = bytes([0x29, 0x01, 0x2D, 0x02, 0x20, 0x18])  # AND #1, AND $2002, CLC
+        cpu, bus = make_loop_cpu(program)
+        engine = BlockEngine(cpu)
+        engine.run(6)
+        block = engine.blocks.entries[0x8000]
+        self.assertEqual(block.end, 0x8005)
+
+    def test_run_until(self):
+        cpu, bus = make_loop_cpu()
+        jit_cpu, jit_bus = make_loop_cpu()
+        engine = BlockEngine(jit_cpu)
+        engine.run(50)
+        cpu.run(50)
+        self.assertEqual(cpu.run_until(pc=0x8008), engine.run_until(pc=0x8008))
+        self.assertSameState(cpu, jit_cpu)
+
+    def test_stall_in_block(self):
+        program = bytes([0x29, 0x01, 0x8D, 0x14, 0x40, 0x18, 0xD0, 0xF8])  # AND #1, STA $4014, CLC, BNE $8000
+        cpus = []
+        for _ in range(2):
+            cpu, bus = make_loop_cpu(program)
+            bus.map_device(0x4000, 0x40FF, lambda address: 0, lambda address, data, cpu=cpu: cpu.stall(513))
+            cpus.append(cpu)
+        cpu, jit_cpu = cpus
+        engine = BlockEngine(jit_cpu)
+        for budget in (3, 600, 1100):
+            self.assertEqual(cpu.run(budget), engine.run(budget))
+            self.assertSameState(cpu, jit_cpu)
+        self.assertEqual(jit_cpu.stall_cycles, cpu.stall_cycles)
+
+    def test_self_modifying_code_recompiles(self):
+        cpu, bus = make_loop_cpu()
+        engine = BlockEngine(cpu)
+        engine.run(100)
+        bus.write(0x8008, 0xEA)  # CLC -> NOP
+        self.assertIsNone(engine.blocks.entries[0x8000])
+        engine.run(100)
+        self.assertIn('NOP', engine.blocks.entries[0x8000].source)
+
+    def test_block_ends_at_its_page(self):
+        program = bytes([0xA9, 0x01,         # 60FE LDA #$01
+                         0xA2, 0x05,         # 6100 LDX #$05
+                         0x4C, 0xFE, 0x60])  # 6102 JMP $60FE
+        cpu, _ = make_cpu(program, 0x60FE)
+        jit_cpu, _ = make_cpu(program, 0x60FE)
+        engine = BlockEngine(jit_cpu)
+        self.assertEqual(cpu.run(20), engine.run(20))
+        for each_cpu in (cpu, jit_cpu):
+            each_cpu.bus.write(0x6100, 0xA0)  # LDX -> LDY
+            each_cpu.pc, each_cpu.x_reg, each_cpu.y_reg = 0x60FE, 0x00, 0x00
+        self.assertEqual(cpu.run(20), engine.run(20))
+        self.assertSameState(cpu, jit_cpu)
+        self.assertEqual((jit_cpu.x_reg, jit_cpu.y_reg), (0x00, 0x05))
+        self.assertIn('LDY', engine.blocks.entries[0x6100].source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+from nes_core.cartridge import MIRROR_VERTICAL, MIRROR_HORIZONTAL, MIRROR_SINGLE_LOWER
+from nes_core.exceptions import UnsupportedMapperError
+from nes_core.mappers import NROM, MMC1, UxROM, CNROM, MMC3
+from nes_core.tests.helpers import make_cartridge, insert
+
+
+class TestMapperSelection(unittest.TestCase):
+    def test_mapper_classes(self):
+        for mapper_id, mapper_class in ((0, NROM), (1, MMC1), (2, UxROM), (3, CNROM), (4, MMC3)):
+            bus, mapper = insert(make_cartridge(mapper_id, 2, 1))
+            self.assertIsInstance(mapper, mapper_class)
+
+    def test_unsupported_mapper(self):
+        with self.assertRaises(UnsupportedMapperError):
+            insert(make_cartridge(99, 1, 1))
+
+    def test_remove_cartridge(self):
+        bus, mapper = insert(make_cartridge(0, 2, 1))
+        bus.remove_cartridge()
+        bus.write(0x8000, 0x12)
+        self.assertEqual(bus.read(0x8000), 0x12)
+
+
+class TestNROM(unittest.TestCase):
+    def test_16k_mirrored(self):
+        bus, mapper = insert(make_cartridge(0, 1, 1))
+        self.assertEqual(bus.read(0x8000), 0)
+        self.assertEqual(bus.read(0xA000), 1)
+        self.assertEqual(bus.read(0xC000), 0)
+        self.assertEqual(bus.read(0xE000), 1)
+
+    def test_32k(self):
+        bus, mapper = insert(make_cartridge(0, 2, 1))
+        self.assertEqual(bus.read(0xC000), 2)
+        self.assertEqual(bus.read(0xFFFF), 3)
+
+    def test_chr(self):
+        bus, mapper = insert(make_cartridge(0, 1, 1))
+        self.assertEqual(mapper.ppu_read(0x1C00), 7)
+        mapper.ppu_write(0x1C00, 0x55)  # CHR ROM is not writable
+        self.assertEqual(mapper.ppu_read(0x1C00), 7)
+
+
+class TestMMC1(unittest.TestCase):
+    def write_register(self, bus, address, value):
+        for bit in range(5):
+            bus.write(address, (value >> bit) & 0x01)
+
+    def test_power_up_fixes_last_bank(self):
+        bus, mapper = insert(make_cartridge(1, 8, 2))
+        self.assertEqual(bus.read(0x8000), 0)
+        self.assertEqual(bus.read(0xC000), 14)
+
+    def test_prg_bank_switch(self):
+        bus, mapper = insert(make_cartridge(1, 8, 2))
+        self.write_register(bus, 0xE000, 3)
+        self.assertEqual(bus.read(0x8000), 6)
+        self.assertEqual(bus.read(0xC000), 14)
+
+    def test_control_and_chr(self):
+        bus, mapper = insert(make_cartridge(1, 8, 2))
+        self.write_register(bus, 0x8000, 0b10000)  # 4 KiB CHR, 32 KiB PRG, one screen
+        self.write_register(bus, 0xC000, 3)
+        self.assertEqual(mapper.mirroring, MIRROR_SINGLE_LOWER)
+        self.assertEqual(mapper.ppu_read(0x1000), 12)
+
+    def test_reset_bit(self):
+        bus, mapper = insert(make_cartridge(1, 8, 2))
+        bus.write(0xE000, 1)
+        bus.write(0xE000, 0x80)
+        self.write_register(bus, 0xE000, 1)
+        self.assertEqual(bus.read(0x8000), 2)
+
+
+class TestUxROM(unittest.TestCase):
+    def test_bank_switch(self):
+        bus, mapper = insert(make_cartridge(2, 8, 0))
+        bus.write(0x8000, 3)
+        self.assertEqual(bus.read(0x8000), 6)
+        self.assertEqual(bus.read(0xC000), 14)
+
+    def test_chr_ram(self):
+        bus, mapper = insert(make_cartridge(2, 8, 0))
+        mapper.ppu_write(0x0010, 0x55)
+        self.assertEqual(mapper.ppu_read(0x0010), 0x55)
+
+
+class TestCNROM(unittest.TestCase):
+    def test_chr_bank_switch(self):
+        bus, mapper = insert(make_cartridge(3, 2, 4))
+        bus.write(0x8000, 2)
+        self.assertEqual(mapper.ppu_read(0x0000), 16)
+        self.assertEqual(bus.read(0x8000), 0)
+
+
+class TestMMC3(unittest.TestCase):
+    def test_prg_banks(self):
+        bus, mapper = insert(make_cartridge(4, 8, 8))
+        bus.write(0x8000, 6)
+        bus.write(0x8001, 3)
+        self.assertEqual(bus.read(0x8000), 3)
+        self.assertEqual(bus.read(0xC000), 14)
+        self.assertEqual(bus.read(0xE000), 15)
+        bus.write(0x8000, 0x46)  # PRG mode 1 swaps $8000 and $C000
+        self.assertEqual(bus.read(0x8000), 14)
+        self.assertEqual(bus.read(0xC000), 3)
+
+    def test_chr_banks_and_inversion(self):
+        bus, mapper = insert(make_cartridge(4, 8, 8))
+        bus.write(0x8000, 0)
+        bus.write(0x8001, 9)  # 2 KiB bank, low bit ignored
+        self.assertEqual(mapper.ppu_read(0x0000), 8)
+        self.assertEqual(mapper.ppu_read(0x0400), 9)
+        bus.write(0x8000, 0x80)
+        self.assertEqual(mapper.ppu_read(0x1000), 8)
+
+    def test_mirroring(self):
+        bus, mapper = insert(make_cartridge(4, 8, 8))
+        bus.write(0xA000, 1)
+        self.assertEqual(mapper.mirroring, MIRROR_HORIZONTAL)
+        bus.write(0xA000, 0)
+        self.assertEqual(mapper.mirroring, MIRROR_VERTICAL)
+
+    def test_irq_counter(self):
+        bus, mapper = insert(make_cartridge(4, 8, 8))
+        bus.write(0xC000, 2)  # latch
+        bus.write(0xC001, 0)  # reload
+        bus.write(0xE001, 0)  # enable
+        mapper.scanline()
+        mapper.scanline()
+        self.assertFalse(mapper.irq)
+        mapper.scanline()
+        self.assertTrue(mapper.irq)
+        bus.write(0xE000, 0)  # disable and acknowledge
+        self.assertFalse(mapper.irq)
+
+
+if __name__ == '__main__':
+    unittest.main()
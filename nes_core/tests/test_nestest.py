@@ -0,0 +1,61 @@
+import io
+import unittest
+from nes_core.nestest import run_nestest, nestest_cpu, parse_log_line, GoldenLogComparer, OFFICIAL_END
+from nes_core.trace import FileTraceSink
+
+REFERENCE_LINE = 'C000  4C F5 C5  JMP $C5F5                       A:00 X:00 Y:00 P:24 SP:FD PPU:  0, 21 CYC:7\n'
+
+
+def make_log(instructions):
+    """Traces the first `instructions` instructions of nestest into an in-memory log"""
+    log = io.StringIO()
+    with nestest_cpu() as cpu:
+        cpu.set_trace_sink(FileTraceSink(log))
+        cpu.run_instructions(instructions)
+        return log.getvalue().splitlines(keepends=True)
+
+
+class TestNestest(unittest.TestCase):
+    def test_official_opcodes_pass(self):
+        result = run_nestest()
+        self.assertEqual(result.pc, OFFICIAL_END)
+        self.assertEqual(result.result_official, 0x00)
+        self.assertEqual(result.instructions, 5003)
+        self.assertEqual(result.cycles, 14579 - 7)  # CYC column of the reference log at $C6BD
+        self.assertTrue(result.passed)
+        self.assertGreater(result.instructions_per_second, 0)
+
+    def test_max_instructions(self):
+        result = run_nestest(max_instructions=10)
+        self.assertEqual(result.instructions, 10)
+
+    def test_rom_is_closed_after_the_block(self):
+        with nestest_cpu() as cpu:
+            cartridge = cpu.bus.cartridge
+        self.assertIsNone(cpu.bus.cartridge)
+        self.assertTrue(cartridge._mmap.closed)
+
+    def test_parse_reference_line(self):
+        self.assertEqual(parse_log_line(REFERENCE_LINE), (0xC000, 0x00, 0x00, 0x00, 0x24, 0xFD, 7))
+
+    def test_comparer_matches_own_trace(self):
+        comparer = GoldenLogComparer(make_log(200))
+        with nestest_cpu() as cpu:
+            cpu.set_trace_sink(comparer)
+            cpu.run_instructions(200)
+            self.assertIsNone(comparer.mismatch)
+            self.assertEqual(comparer.line_number, 200)
+
+    def test_comparer_reports_first_mismatch(self):
+        lines = make_log(100)
+        pc, a, x, y, p, sp, cycles = parse_log_line(lines[49])
+        lines[49] = lines[49].replace(f'A:{a:02X}', f'A:{a ^ 0xFF:02X}')
+        comparer = GoldenLogComparer(iter(lines))
+        with nestest_cpu() as cpu:
+            cpu.set_trace_sink(comparer)
+            cpu.run_instructions(100)
+            self.assertEqual(comparer.mismatch.line_number, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import unittest
+from nes_core.ppu import DOTS_PER_SCANLINE, SCANLINES_PER_FRAME, VBLANK_SCANLINE, PRE_RENDER_SCANLINE
+from nes_core.tests.helpers import make_ppu, set_address, write_data
+
+FRAME_DOTS = DOTS_PER_SCANLINE * SCANLINES_PER_FRAME
+
+
+class TestPPURegisters(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ppu, self.bus = make_ppu()
+
+    def test_data_read_is_buffered(self):
+        write_data(self.bus, 0x2000, [0x11, 0x22])
+        set_address(self.bus, 0x2000)
+        self.assertEqual(self.bus.read(0x2007), 0x00)  # stale buffer
+        self.assertEqual(self.bus.read(0x2007), 0x11)
+        self.assertEqual(self.bus.read(0x2007), 0x22)
+
+    def test_increment_32(self):
+        self.bus.write(0x2000, 0x04)
+        write_data(self.bus, 0x2000, [0x11, 0x22])
+        self.assertEqual(self.ppu.ppu_read(0x2020), 0x22)
+
+    def test_registers_are_mirrored(self):
+        self.bus.write(0x3FF8, 0x80)
+        self.assertEqual(self.ppu.ctrl, 0x80)
+
+    def test_palette_mirrors(self):
+        write_data(self.bus, 0x3F10, [0x2C])
+        self.assertEqual(self.ppu.ppu_read(0x3F00), 0x2C)
+        set_address(self.bus, 0x3F00)
+        self.assertEqual(self.bus.read(0x2007), 0x2C)  # palette reads aren't buffered
+
+    def test_horizontal_mirroring(self):
+        write_data(self.bus, 0x2000, [0x42])
+        self.assertEqual(self.ppu.ppu_read(0x2400), 0x42)
+        self.assertEqual(self.ppu.ppu_read(0x2800), 0x00)
+
+    def test_vertical_mirroring(self):
+        ppu, bus = make_ppu(flags6=0x01)
+        write_data(bus, 0x2000, [0x42])
+        self.assertEqual(ppu.ppu_read(0x2800), 0x42)
+        self.assertEqual(ppu.ppu_read(0x2400), 0x00)
+
+    def test_scroll_writes(self):
+        self.bus.write(0x2005, 0x7D)  # coarse x 15, fine x 5
+        self.bus.write(0x2005, 0x5E)  # coarse y 11, fine y 6
+        self.assertEqual(self.ppu.fine_x, 5)
+        self.assertEqual(self.ppu.t, (6 << 12) | (11 << 5) | 15)
+
+    def test_chr_ram_write(self):
+        write_data(self.bus, 0x0010, [0xAB])
+        self.assertEqual(self.ppu.ppu_read(0x0010), 0xAB)
+        self.assertEqual(list(self.ppu.tile_cache.update(self.ppu.mapper)[1, 0]), [1, 0, 1, 0, 1, 0, 1, 1])
+
+
+class TestPPUTiming(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ppu, self.bus = make_ppu()
+
+    def run_to(self, scanline, dot):
+        ppu = self.ppu
+        dots = ((scanline - ppu.scanline) * DOTS_PER_SCANLINE + dot - ppu.dot) % FRAME_DOTS
+        ppu.run(dots)
+        self.assertEqual((ppu.scanline, ppu.dot), (scanline, dot))
+
+    def test_vblank_starts_on_dot_1_of_line_241(self):
+        self.run_to(VBLANK_SCANLINE, 1)
+        self.assertFalse(self.ppu.status & 0x80)
+        self.ppu.clock()
+        self.assertTrue(self.ppu.status & 0x80)
+        self.assertEqual(self.bus.read(0x2002) & 0x80, 0x80)
+        self.assertEqual(self.bus.read(0x2002) & 0x80, 0x00)  # reading clears it
+
+    def test_vblank_ends_on_pre_render_line(self):
+        self.run_to(PRE_RENDER_SCANLINE, 1)
+        self.assertTrue(self.ppu.status & 0x80)
+        self.ppu.clock()
+        self.assertFalse(self.ppu.status & 0x80)
+
+    def test_nmi(self):
+        self.bus.write(0x2000, 0x80)
+        self.run_to(VBLANK_SCANLINE, 2)
+        self.assertTrue(self.ppu.nmi)
+
+    def test_enabling_nmi_during_vblank(self):
+        self.run_to(VBLANK_SCANLINE, 10)
+        self.assertFalse(self.ppu.nmi)
+        self.bus.write(0x2000, 0x80)
+        self.assertTrue(self.ppu.nmi)
+
+    def test_read_just_before_vblank_suppresses_it(self):
+        self.bus.write(0x2000, 0x80)
+        self.run_to(VBLANK_SCANLINE, 1)
+        self.bus.read(0x2002)
+        self.ppu.clock()
+        self.assertFalse(self.ppu.status & 0x80)
+        self.assertFalse(self.ppu.nmi)
+
+    def test_odd_frames_are_one_dot_shorter_when_rendering(self):
+        self.bus.write(0x2001, 0x08)
+        self.ppu.run(FRAME_DOTS)
+        self.assertEqual((self.ppu.frame, self.ppu.scanline, self.ppu.dot), (1, 0, 0))
+        self.ppu.run(FRAME_DOTS - 1)
+        self.assertEqual((self.ppu.frame, self.ppu.scanline, self.ppu.dot), (2, 0, 0))
+
+    def test_run_matches_clock(self):
+        other, other_bus = make_ppu()
+        for ppu, bus in ((self.ppu, self.bus), (other, other_bus)):
+            bus.write(0x2001, 0x18)
+            bus.write(0x2000, 0x80)
+        self.ppu.run(FRAME_DOTS + 1234)
+        for _ in range(FRAME_DOTS + 1234):
+            other.clock()
+        for name in ('scanline', 'dot', 'frame', 'v', 'status', 'nmi'):
+            self.assertEqual(getattr(self.ppu, name), getattr(other, name), name)
+
+
+class TestPPURendering(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ppu, self.bus = make_ppu()
+        write_data(self.bus, 0x0010, [0xFF] * 8 + [0x00] * 8)  # tile 1, colour 1 everywhere
+        write_data(self.bus, 0x3F00, [0x0F, 0x21, 0x22, 0x23, 0x0F, 0x31])
+        write_data(self.bus, 0x3F11, [0x16])
+
+    def render_frame(self):
+        set_address(self.bus, 0x0000)  # leaves v at the top left corner
+        self.ppu.run(FRAME_DOTS)
+
+    def test_backdrop_when_rendering_is_off(self):
+        self.render_frame()
+        self.assertTrue((self.ppu.framebuffer == 0x0F).all())
+
+    def test_background_tile(self):
+        write_data(self.bus, 0x2000, [0x01])
+        write_data(self.bus, 0x23C0, [0x01])  # top left 16x16 area uses palette 1
+        self.bus.write(0x2001, 0x0A)
+        self.render_frame()
+        framebuffer = self.ppu.framebuffer
+        self.assertTrue((framebuffer[0:8, 0:8] == 0x31).all())
+        self.assertTrue((framebuffer[0:8, 8:16] == 0x0F).all())
+        self.assertTrue((framebuffer[8:16, 0:8] == 0x0F).all())
+
+    def test_fine_x_scroll(self):
+        write_data(self.bus, 0x2000, [0x00, 0x01])
+        self.bus.write(0x2001, 0x0A)
+        self.bus.write(0x2005, 0x03)
+        self.bus.write(0x2005, 0x00)
+        self.ppu.run(FRAME_DOTS)  # the pre-render line loads the scroll into v
+        self.ppu.run(FRAME_DOTS)
+        self.assertTrue((self.ppu.framebuffer[0, 5:13] == 0x21).all())
+        self.assertEqual(self.ppu.framebuffer[0, 4], 0x0F)
+
+    def test_sprite_and_sprite_zero_hit(self):
+        write_data(self.bus, 0x2000, [0x01] * 128)
+        self.ppu.oam[0:4] = bytes([9, 0x01, 0x00, 20])  # top on line 10 at x 20
+        self.bus.write(0x2001, 0x1E)
+        self.render_frame()
+        self.assertTrue((self.ppu.framebuffer[10:18, 20:28] == 0x16).all())
+        self.assertEqual(self.ppu.framebuffer[9, 20], 0x21)
+
+        # the flag goes up on the dot after the overlapping pixel, and is cleared on the pre-render line
+        self.ppu.run(10 * DOTS_PER_SCANLINE + 20)
+        self.assertEqual((self.ppu.scanline, self.ppu.dot), (10, 20))
+        self.assertFalse(self.ppu.status & 0x40)
+        self.ppu.clock()
+        self.assertFalse(self.ppu.status & 0x40)
+        self.ppu.clock()
+        self.assertTrue(self.ppu.status & 0x40)
+
+    def test_sprite_behind_background(self):
+        write_data(self.bus, 0x2000, [0x01] * 128)
+        self.ppu.oam[4:8] = bytes([9, 0x01, 0x20, 20])
+        self.bus.write(0x2001, 0x1E)
+        self.render_frame()
+        self.assertEqual(self.ppu.framebuffer[10, 20], 0x21)
+
+    def test_timing_without_drawing(self):
+        write_data(self.bus, 0x2000, [0x01] * 128)
+        self.ppu.oam[0:4] = bytes([9, 0x01, 0x00, 20])
+        for sprite in range(1, 10):
+            self.ppu.oam[sprite * 4:sprite * 4 + 4] = bytes([100, 0x01, 0x00, sprite * 8])
+        self.bus.write(0x2001, 0x1E)
+        self.ppu.draw = False
+        self.render_frame()
+        self.assertFalse(self.ppu.framebuffer.any())
+        self.ppu.run(10 * DOTS_PER_SCANLINE + 21)
+        self.assertFalse(self.ppu.status & 0x40)
+        self.ppu.clock()
+        self.assertTrue(self.ppu.status & 0x40)
+        self.ppu.run(92 * DOTS_PER_SCANLINE)
+        self.assertTrue(self.ppu.status & 0x20)  # sprite overflow
+
+    def test_frame_rgb(self):
+        self.render_frame()
+        self.assertEqual(self.ppu.frame_rgb().shape, (240, 256, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import unittest
+from nes_core.nestest import nestest_cpu, OFFICIAL_END
+from nes_core.profiler import Profiler
+from nes_core.trace import ListTraceSink
+from nes_core.tests.helpers import make_cpu
+
+
+class TestProfiler(unittest.TestCase):
+    def test_penalties(self):
+        cpu, _ = make_cpu(bytes([0xA2, 0x20,        # LDX #$20
+                                 0xBD, 0xF0, 0x02,  # LDA $02F0,X  page crossed
+                                 0xBD, 0x00, 0x02,  # LDA $0200,X
+                                 0xF0, 0x80]))      # BEQ -$80     taken, back to the previous page
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.run_instructions(4)
+        profiler.detach()
+        rows = {row[0]: row[3:] for row in profiler.opcode_rows()}
+        self.assertEqual(rows[0xBD], (2, 9, 1))
+        self.assertEqual(rows[0xF0], (1, 4, 2))
+        self.assertEqual(profiler.pc_cycles[0x0202], 5)
+        self.assertEqual(dict((row[0], row[1:]) for row in profiler.mode_rows())['ABX'], (2, 9, 1))
+        self.assertIsNone(cpu.trace_sink)
+
+    def test_interrupts_are_counted_apart(self):
+        cpu, _ = make_cpu(bytes([0xEA] * 4))
+        cpu.bus.load(0xFFFA, bytes([0x02, 0x02]))
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.nmi()
+        cpu.run_instructions(4)
+        profiler.detach()
+        self.assertEqual((profiler.interrupts, profiler.interrupt_cycles), (1, 7))
+        self.assertEqual(sum(profiler.cycles), cpu.total_cycles - 7)
+        self.assertEqual(sum(profiler.penalty_cycles), 0)
+
+    def test_stalls_are_counted_apart(self):
+        cpu, _ = make_cpu(bytes([0x8D, 0x14, 0x40, 0xEA]))  # STA $4014, NOP
+        cpu.bus.map_device(0x4000, 0x40FF, lambda address: 0, lambda address, data: cpu.stall(514))
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.run_instructions(2)
+        profiler.detach()
+        self.assertEqual(profiler.stall_cycles, 514)
+        self.assertEqual(profiler.interrupts, 0)
+        self.assertEqual(profiler.cycles[0x8D], 4)
+
+    def test_stall_and_interrupt_after_one_instruction(self):
+        cpu, _ = make_cpu(bytes([0x8D, 0x14, 0x40, 0xEA]))  # STA $4014, NOP
+        cpu.bus.map_device(0x4000, 0x40FF, lambda address: 0, lambda address, data: cpu.stall(513))
+        cpu.bus.load(0xFFFA, bytes([0x03, 0x02]))
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.nmi()
+        cpu.run_instructions(2)
+        profiler.detach()
+        self.assertEqual((profiler.stall_cycles, profiler.interrupts, profiler.interrupt_cycles), (513, 1, 7))
+        self.assertEqual((profiler.cycles[0x8D], profiler.penalty_cycles[0x8D]), (4, 0))
+
+    def test_needs_attach(self):
+        cpu, _ = make_cpu(bytes([0xEA]))
+        cpu.set_trace_sink(Profiler())
+        with self.assertRaises(RuntimeError):
+            cpu.run_instructions(1)
+
+    def test_nestest_totals(self):
+        with nestest_cpu() as cpu:
+            start = cpu.total_cycles
+            profiler = Profiler()
+            profiler.attach(cpu)
+            executed = 0
+            while cpu.pc != OFFICIAL_END:
+                cpu.run_instructions(1)
+                executed += 1
+            profiler.detach()
+            self.assertEqual(sum(profiler.executions), executed)
+            self.assertEqual(sum(profiler.cycles), cpu.total_cycles - start)
+            self.assertEqual(sum(profiler.pc_cycles), cpu.total_cycles - start)
+            hotspots = profiler.hotspots(5)
+            self.assertEqual(len(hotspots), 5)
+            self.assertEqual([row[4] for row in hotspots], sorted((row[4] for row in hotspots), reverse=True))
+
+    def test_keeps_previous_sink(self):
+        cpu, _ = make_cpu(bytes([0xEA] * 4))
+        sink = ListTraceSink()
+        cpu.set_trace_sink(sink)
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.run_instructions(2)
+        profiler.detach()
+        self.assertEqual(len(sink), 2)
+        self.assertIs(cpu.trace_sink, sink)
+
+    def test_exports(self):
+        cpu, _ = make_cpu(bytes([0xEA, 0xE8]))
+        profiler = Profiler()
+        profiler.attach(cpu)
+        cpu.run_instructions(2)
+        profiler.detach()
+        output = io.StringIO()
+        profiler.write_csv(output)
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['opcode,mnemonic,mode,executions,cycles,penalty_cycles',
+                          'E8,INX,IMP,1,2,0', 'EA,NOP,IMP,1,2,0'])
+        output = io.StringIO()
+        profiler.write_folded(output)
+        self.assertEqual(sorted(output.getvalue().splitlines()), ['IMP;INX;$0201 2', 'IMP;NOP;$0200 2'])
+        output = io.StringIO()
+        profiler.write_hotspots_csv(output)
+        self.assertEqual(output.getvalue().splitlines()[0], 'pc,opcode,mnemonic,executions,cycles')
+        profiler.clear()
+        self.assertEqual(profiler.opcode_rows(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from nes_core.console import Console
+from nes_core.rewind import RewindBuffer, xor_bytes
+from nes_core.savestate import save_state
+from nes_core.tests.helpers import make_cartridge, make_console, DMA_PROGRAM
+
+
+class TestRewindBuffer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.console, _ = make_console()
+        self.states = []
+
+    def record(self, buffer, frames):
+        for _ in range(frames):
+            self.console.run_frame()
+            buffer.capture()
+            self.states.append(save_state(self.console, compress=False, framebuffer=False))
+
+    def test_xor_bytes(self):
+        self.assertEqual(xor_bytes(b'\x0F\xF0', b'\xFF\xFF'), b'\xF0\x0F')
+
+    def test_rewind(self):
+        buffer = RewindBuffer(self.console)
+        self.record(buffer, 10)
+        self.assertEqual(len(buffer), 10)
+        self.assertEqual(buffer.rewind(3), 3)
+        self.assertEqual(save_state(self.console, compress=False, framebuffer=False), self.states[6])
+        self.assertEqual(len(buffer), 7)
+        self.assertEqual(buffer.rewind(), 1)
+        self.assertEqual(save_state(self.console, compress=False, framebuffer=False), self.states[5])
+
+    def test_rewind_past_oldest(self):
+        buffer = RewindBuffer(self.console, seconds=1, fps=4)
+        self.record(buffer, 10)
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.rewind(100), 3)
+        self.assertEqual(save_state(self.console, compress=False, framebuffer=False), self.states[6])
+        self.assertEqual(buffer.rewind(), 0)
+
+    def test_play_on_after_rewind(self):
+        buffer = RewindBuffer(self.console)
+        self.record(buffer, 5)
+        buffer.rewind(2)
+        del self.states[3:]
+        self.record(buffer, 3)
+        buffer.rewind(4)
+        self.assertEqual(save_state(self.console, compress=False, framebuffer=False), self.states[1])
+
+    def test_rewind_during_dma(self):
+        self.console, _ = make_console(DMA_PROGRAM)
+        buffer = RewindBuffer(self.console)
+        self.console.run(10)
+        buffer.capture()
+        state = save_state(self.console, compress=False, framebuffer=False)
+        self.console.run_frame()
+        buffer.capture()
+        self.assertEqual(buffer.rewind(), 1)
+        self.assertEqual(save_state(self.console, compress=False, framebuffer=False), state)
+
+    def test_memory_limit(self):
+        limit = len(save_state(self.console, compress=False, framebuffer=False)) + 2000  # the newest plus a few
+        buffer = RewindBuffer(self.console, memory_limit=limit)
+        self.record(buffer, 20)
+        self.assertLessEqual(buffer.memory_used, limit)
+        self.assertLess(len(buffer), 20)
+        self.assertGreater(len(buffer), 1)
+
+    def test_deltas_are_small(self):
+        buffer = RewindBuffer(self.console)
+        self.record(buffer, 20)
+        self.assertLess(max(map(len, buffer.deltas)), len(buffer.latest) // 20)
+
+    def test_new_cartridge_clears(self):
+        buffer = RewindBuffer(self.console)
+        self.record(buffer, 3)
+        self.console.insert_cartridge(make_cartridge(4, 2, 2))
+        buffer.capture()
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.memory_used, len(buffer.latest))
+
+    def test_empty(self):
+        self.assertEqual(RewindBuffer(Console()).rewind(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
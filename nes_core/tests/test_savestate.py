@@ -0,0 +1,113 @@
+import unittest
+from nes_core.cartridge import Cartridge
+from nes_core.console import Console
+from nes_core.exceptions import SaveStateError
+from nes_core.savestate import decode_snapshot, encode_snapshot, save_state, HEADER, MAGIC, VERSION
+from nes_core.tests.helpers import make_cartridge, make_console, make_program_rom, DMA_PROGRAM
+
+
+class TestSaveState(unittest.TestCase):
+    def setUp(self) -> None:
+        self.console, _ = make_console()
+        self.console.run(30000)
+
+    def assertSameRun(self, console, other, cycles=40000):
+        """Both consoles end up in exactly the same state after running on"""
+        console.run(cycles)
+        other.run(cycles)
+        self.assertEqual(console.save_state(compress=False), other.save_state(compress=False))
+
+    def test_round_trip(self):
+        data = self.console.save_state()
+        other, _ = make_console()
+        other.load_state(data)
+        self.assertEqual(other.cpu.get_state(), self.console.cpu.get_state())
+        self.assertEqual(other.ppu.get_state(), self.console.ppu.get_state())
+        self.assertEqual(other.apu.get_state(), self.console.apu.get_state())
+        self.assertTrue((other.ppu.framebuffer == self.console.ppu.framebuffer).all())
+        self.assertSameRun(self.console, other)
+
+    def test_uncompressed_format(self):
+        data = self.console.save_state(compress=False)
+        self.assertEqual(HEADER.unpack_from(data), (MAGIC, VERSION, 0))
+        self.assertGreater(len(data), 0x10000)
+        self.assertLess(len(self.console.save_state()), len(data) // 4)
+
+    def test_without_framebuffer(self):
+        data = save_state(self.console, framebuffer=False)
+        self.console.ppu.framebuffer[:] = 0x21
+        self.console.load_state(data)
+        self.assertTrue((self.console.ppu.framebuffer == 0x21).all())
+
+    def test_during_dma(self):
+        console, _ = make_console(DMA_PROGRAM)
+        console.run(10)
+        self.assertGreater(console.cpu.cycles, 0xFF)
+        other, _ = make_console(DMA_PROGRAM)
+        other.load_state(console.save_state())
+        self.assertEqual(other.cpu.get_state(), console.cpu.get_state())
+        self.assertSameRun(console, other)
+
+    def test_bad_states(self):
+        data = self.console.save_state()
+        with self.assertRaises(SaveStateError):
+            self.console.load_state(b'NES\x1a' + data[4:])
+        with self.assertRaises(SaveStateError):
+            self.console.load_state(data[:4] + b'\x63\x00' + data[6:])  # version 99
+        with self.assertRaises(SaveStateError):
+            self.console.load_state(data[:40])
+        other = Console()
+        other.insert_cartridge(make_cartridge(4, 2, 2))
+        with self.assertRaises(SaveStateError):
+            other.load_state(data)
+
+    def test_restore_snapshot(self):
+        snapshot = self.console.snapshot()
+        reference = self.console.save_state(compress=False)
+        self.console.run(50000)
+        self.console.restore(snapshot)
+        self.assertEqual(self.console.save_state(compress=False), reference)
+        self.console.run(50000)
+        self.console.restore(snapshot)  # snapshots are never written through
+        self.assertEqual(self.console.save_state(compress=False), reference)
+
+    def test_snapshots_share_unchanged_pages(self):
+        first = self.console.snapshot()
+        self.console.run(100)
+        second = self.console.snapshot(base=first)
+        ram_pages = len(first.regions[b'RAM '])
+        self.assertGreater(second.shared_pages(first), ram_pages - 4)
+        self.assertEqual(self.console.snapshot(base=second).shared_pages(second), second.shared_pages(second))
+
+    def test_encoded_snapshot(self):
+        snapshot = self.console.snapshot()
+        decoded = decode_snapshot(encode_snapshot(snapshot))
+        self.assertEqual(decoded.cpu, snapshot.cpu)
+        self.assertEqual(decoded.regions, snapshot.regions)
+
+    def test_mapper_banking(self):
+        console = Console()
+        console.insert_cartridge(make_cartridge(4, 4, 4))  # MMC3
+        console.bus.write(0x8000, 0x06)
+        console.bus.write(0x8001, 0x03)
+        console.bus.write(0xA000, 0x01)
+        snapshot = console.snapshot()
+        console.bus.write(0x8001, 0x05)
+        console.bus.write(0xA000, 0x00)
+        console.restore(snapshot)
+        self.assertEqual(console.bus.read(0x8000), 3)
+        self.assertEqual(console.bus.mapper.mirroring, 'horizontal')
+
+    def test_chr_ram(self):
+        console = Console()
+        console.insert_cartridge(Cartridge(make_program_rom()))
+        snapshot = console.snapshot()
+        console.ppu.ppu_write(0x0000, 0xFF)
+        console.ppu.tile_cache.update(console.bus.mapper)
+        console.restore(snapshot)
+        self.assertEqual(console.ppu.ppu_read(0x0000), 0x00)
+        self.assertEqual(console.ppu.tile_cache.update(console.bus.mapper)[0, 0].max(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+from nes_core.cartridge import Cartridge
+from nes_core.tiles import TileCache, decode_tiles
+from nes_core.tests.helpers import make_rom, make_cartridge, insert, make_ppu, write_data
+
+
+class TestTileCache(unittest.TestCase):
+    def test_decode_tiles(self):
+        tile = bytes([0x80, 0x01, 0, 0, 0, 0, 0, 0,
+                      0x80, 0x02, 0, 0, 0, 0, 0, 0])
+        tiles = decode_tiles(tile)
+        self.assertEqual(tiles.shape, (1, 8, 8))
+        self.assertEqual(list(tiles[0, 0]), [3, 0, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(list(tiles[0, 1]), [0, 0, 0, 0, 0, 0, 2, 1])
+
+    def test_tiles_follow_bank_switches(self):
+        bus, mapper = insert(make_cartridge(3, 2, 4))  # CNROM, CHR windows are filled with their chunk index
+        cache = TileCache()
+        tiles = cache.update(mapper)
+        self.assertEqual(tiles.shape, (512, 8, 8))
+        self.assertEqual(list(tiles[64, 0]), [0, 0, 0, 0, 0, 0, 0, 3])  # window 1 holds chunk 1
+        bus.write(0x8000, 0x01)  # chunks 8-15
+        self.assertEqual(list(cache.update(mapper)[64, 0]), [0, 0, 0, 0, 3, 0, 0, 3])  # chunk 9
+
+    def test_only_switched_windows_are_decoded(self):
+        bus, mapper = insert(make_cartridge(4, 2, 2))  # MMC3, 1 KiB banks at $1000-$1FFF
+        cache = TileCache()
+        cache.update(mapper)
+        bus.write(0x8000, 0x02)
+        bus.write(0x8001, 0x05)
+        with mock.patch.object(cache, 'decode_window', wraps=cache.decode_window) as decode_window:
+            cache.update(mapper)
+            cache.update(mapper)
+        decode_window.assert_called_once_with(mapper, 4)
+
+    def test_chr_ram_writes(self):
+        ppu, bus = make_ppu()
+        ppu.tile_cache.update(ppu.mapper)
+        write_data(bus, 0x1010, [0xFF])
+        self.assertEqual(ppu.tile_cache.dirty_tiles, {257})
+        self.assertEqual(list(ppu.tile_cache.update(ppu.mapper)[257, 0]), [1] * 8)
+        self.assertFalse(ppu.tile_cache.dirty_tiles)
+
+    def test_new_cartridge_invalidates(self):
+        cache = TileCache()
+        bus, mapper = insert(make_cartridge(0, 1, 1))
+        cache.update(mapper)
+        bus, other = insert(Cartridge(make_rom()))  # same banking, CHR filled with $CC
+        self.assertEqual(list(cache.update(other)[0, 0]), [3, 3, 0, 0, 3, 3, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
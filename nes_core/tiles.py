@@ -0,0 +1,67 @@
+import numpy as np
+
+TILE_COUNT = 512  # 256 tiles in each of the two pattern tables
+TILE_SIZE = 16  # bytes, two 8x8 bitplanes
+WINDOW_SIZE = 0x400  # CHR is banked in 1 KiB windows of 64 tiles
+TILES_PER_WINDOW = WINDOW_SIZE // TILE_SIZE
+
+_BIT_SHIFTS = np.arange(7, -1, -1, dtype=np.uint8)  # bit 7 is the leftmost pixel of a tile row
+
+
+def decode_tiles(data):
+    """Decodes bitplane tiles (16 bytes each) into an (n, 8, 8) array of pixel values 0-3"""
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2, 8)
+    low = (planes[:, 0, :, None] >> _BIT_SHIFTS) & 0x01
+    high = (planes[:, 1, :, None] >> _BIT_SHIFTS) & 0x01
+    return low | (high << 1)
+
+
+class TileCache:
+    """Both pattern tables decoded into `tiles`, a (512, 8, 8) array of pixel values indexed by
+    (pattern table * 256 + tile, row, column), so rendering only has to gather from it.
+    A window of 64 tiles is decoded again only when the mapper puts another CHR bank behind it, a single tile when
+    the PPU writes to CHR RAM under it."""
+    def __init__(self):
+        self.tiles = np.zeros((TILE_COUNT, 8, 8), dtype=np.uint8)
+        self.window_offsets = [None] * 8  # CHR offset each window was decoded from
+        self.mapper = None
+        self.chr_version = None  # Mapper chr_version the windows were last checked against
+        self.dirty_tiles = set()
+
+    def update(self, mapper):
+        """Brings the tiles up to date with the banks `mapper` has mapped and returns them"""
+        if mapper is None or not mapper.chr:
+            return self.tiles
+        if mapper is not self.mapper:  # another cartridge
+            self.invalidate()
+            self.mapper = mapper
+        if mapper.chr_version != self.chr_version:
+            for window, offset in enumerate(mapper.chr_offsets):
+                if offset != self.window_offsets[window]:
+                    self.decode_window(mapper, window)
+            self.chr_version = mapper.chr_version
+        if self.dirty_tiles:
+            pages = mapper.chr_pages
+            for tile in self.dirty_tiles:
+                window, first = divmod(tile * TILE_SIZE, WINDOW_SIZE)
+                self.tiles[tile] = decode_tiles(pages[window][first:first + TILE_SIZE])[0]
+            self.dirty_tiles.clear()
+        return self.tiles
+
+    def decode_window(self, mapper, window: int):
+        first = window * TILES_PER_WINDOW
+        self.tiles[first:first + TILES_PER_WINDOW] = decode_tiles(mapper.chr_pages[window])
+        self.window_offsets[window] = mapper.chr_offsets[window]
+
+    def chr_written(self, mapper, address: int):
+        """Marks the tile at PPU `address` dirty, and any other window showing the same CHR RAM bank"""
+        offset = mapper.chr_offsets[address >> 10] + (address & 0x3FF)
+        for window, window_offset in enumerate(self.window_offsets):
+            if window_offset is not None and window_offset <= offset < window_offset + WINDOW_SIZE:
+                self.dirty_tiles.add(window * TILES_PER_WINDOW + ((offset - window_offset) >> 4))
+
+    def invalidate(self):
+        self.mapper = None
+        self.window_offsets = [None] * 8
+        self.chr_version = None
+        self.dirty_tiles.clear()
@@ -0,0 +1,51 @@
+import logging
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# CPU state captured right before an instruction executes.
+# `cycles` is the instruction's base cycle count, `total_cycles` the CPU cycle counter when it started
+TraceRecord = namedtuple('TraceRecord', ['pc', 'opcode', 'mnemonic', 'a', 'x', 'y', 'p', 'sp', 'cycles',
+                                         'total_cycles'])
+
+
+def format_record(record: TraceRecord) -> str:
+    """Formats a trace record as a single nestest-style log line"""
+    return (f'{record.pc:04X}  {record.opcode:02X}  {record.mnemonic}  '
+            f'A:{record.a:02X} X:{record.x:02X} Y:{record.y:02X} P:{record.p:02X} SP:{record.sp:02X} '
+            f'CYC:{record.total_cycles}')
+
+
+class ListTraceSink:
+    """Keeps trace records in memory, optionally only the last `maxlen` of them"""
+    def __init__(self, maxlen=None):
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, record: TraceRecord):
+        self.records.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def clear(self):
+        self.records.clear()
+
+
+class LoggingTraceSink:
+    """Forwards trace records to the `nes_core.trace` logger"""
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def __call__(self, record: TraceRecord):
+        if logger.isEnabledFor(self.level):
+            logger.log(self.level, format_record(record))
+
+
+class FileTraceSink:
+    """Writes one formatted line per trace record to a text file object"""
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, record: TraceRecord):
+        self.file.write(format_record(record))
+        self.file.write('\n')